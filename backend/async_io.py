@@ -0,0 +1,121 @@
+"""
+Bounded I/O thread pool for async route handlers.
+
+Blocking filesystem (and other blocking I/O) work is handed to a small,
+dedicated pool with run_io() instead of running on the event loop, so a
+slow volume delays only the request that touches it. The pool records how
+long calls wait for a worker and how long the I/O itself takes.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+@dataclass
+class IOTimings:
+    """Aggregated timings for one kind of I/O call"""
+    calls: int = 0
+    errors: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    run_total: float = 0.0
+    run_max: float = 0.0
+
+    def record(self, wait: float, run: float, failed: bool):
+        self.calls += 1
+        self.errors += int(failed)
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.run_total += run
+        self.run_max = max(self.run_max, run)
+
+    def to_dict(self) -> Dict[str, Any]:
+        calls = self.calls or 1
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "wait_avg_ms": round(self.wait_total / calls * 1000, 3),
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "io_avg_ms": round(self.run_total / calls * 1000, 3),
+            "io_max_ms": round(self.run_max * 1000, 3)
+        }
+
+class IOPool:
+    """Fixed-size thread pool with queue-wait and I/O time metrics"""
+
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="course-io")
+        self._lock = threading.Lock()
+        self._totals = IOTimings()
+        self._by_operation: Dict[str, IOTimings] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _record(self, operation: str, wait: float, run: float, failed: bool):
+        with self._lock:
+            self._totals.record(wait, run, failed)
+            self._by_operation.setdefault(operation, IOTimings()).record(wait, run, failed)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable on the pool and await its result"""
+        operation = getattr(func, "__qualname__", None) or getattr(func, "__name__", "call")
+        submitted = time.perf_counter()
+
+        def timed_call():
+            started = time.perf_counter()
+            failed = False
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                self._record(operation, started - submitted, time.perf_counter() - started, failed)
+
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed_call)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "workers": self.max_workers,
+                "in_flight": self.in_flight,
+                "queued": max(0, self.in_flight - self.max_workers),
+                "max_in_flight": self.max_in_flight
+            }
+            stats.update(self._totals.to_dict())
+            stats["operations"] = {name: timings.to_dict() for name, timings in sorted(self._by_operation.items())}
+            return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+# Global I/O pool instance
+_io_pool: Optional[IOPool] = None
+_io_pool_lock = threading.Lock()
+
+def get_io_pool() -> IOPool:
+    """Get the shared I/O pool (sized from IO_POOL_WORKERS)"""
+    global _io_pool
+    if _io_pool is None:
+        with _io_pool_lock:
+            if _io_pool is None:
+                from config import get_config
+                _io_pool = IOPool(get_config().io_pool_workers)
+    return _io_pool
+
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """Run blocking I/O on the shared pool"""
+    return await get_io_pool().run(func, *args, **kwargs)
+
+def get_io_stats() -> Dict[str, Any]:
+    return get_io_pool().get_stats()
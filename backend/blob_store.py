@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+Content-addressed version history for course files.
+
+The files in course_content/ and its topic folders hold their current
+content themselves; what the store adds is a per-folder manifest and the
+bytes of every earlier version, keyed by SHA-256:
+
+    course_content/.blobs/objects/ab/<sha256>        earlier versions (read-only)
+    course_content/.blobs/manifests/<topic>.json     filename -> current digest, size, mtime + history
+    course_content/.blobs/manifests/.root.json       same, for files in the root
+
+When a file is replaced, its outgoing version is hard-linked into
+objects/ and the new file is renamed over the old path, so keeping a
+version copies no bytes and the blob ends up as the only name of the old
+inode. A version is stored once however many files have held it. Files
+are never hard links to blobs while they are live, so a tool that edits a
+course file in place changes only that file, never a stored version (the
+edit replaces the file's current version, which lived only in the file).
+
+Storage cost: one copy of each live file plus one of each distinct
+earlier version. Two live files with the same content are two copies
+(reflinked by copy_many() where the filesystem supports it, e.g. btrfs or
+XFS); moving files between folders (move_many()) is a rename plus one
+manifest update per folder. The manifest records each file's size and
+mtime, so the digest of an unchanged file is known without reading it.
+Readers are unaffected: they keep opening the ordinary paths.
+
+Files hard-linked to blobs by earlier versions of the store are turned
+into separate files by `python blob_store.py import`.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+ROOT_MANIFEST = ".root"
+
+# Linux ioctl that makes a copy-on-write clone of a file (btrfs, XFS, ...)
+FICLONE = 0x40049409
+REFLINK_SUPPORTED = fcntl is not None and sys.platform.startswith("linux")
+
+class BlobStore:
+    """Version history and manifests for the files in course_content/"""
+
+    def __init__(self, root: str = "course_content", enabled: bool = True, history_limit: int = 20,
+                 fsync: bool = True):
+        self.root = Path(root)
+        self.enabled = enabled
+        self.history_limit = history_limit
+        self.fsync = fsync
+        self.blob_dir = self.root / ".blobs"
+        self.objects_dir = self.blob_dir / "objects"
+        self.manifests_dir = self.blob_dir / "manifests"
+        self._locks: Dict[str, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+
+    # Paths
+
+    def key_for(self, path: Path) -> Optional[Tuple[str, str]]:
+        """(topic folder, filename) for a course file, "" as the folder for root files"""
+        try:
+            relative = Path(path).resolve().relative_to(self.root.resolve())
+        except ValueError:
+            return None
+        if len(relative.parts) == 1:
+            return ("", relative.parts[0])
+        if len(relative.parts) == 2 and not relative.parts[0].startswith("."):
+            return (relative.parts[0], relative.parts[1])
+        return None
+
+    def blob_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def _manifest_path(self, topic_folder: str) -> Path:
+        return self.manifests_dir / f"{topic_folder or ROOT_MANIFEST}.json"
+
+    def _lock_for(self, topic_folder: str) -> threading.RLock:
+        with self._locks_guard:
+            return self._locks.setdefault(topic_folder, threading.RLock())
+
+    @contextmanager
+    def topic_lock(self, topic_folder: str):
+        """Serialize writers to one topic folder, across threads and (with fcntl) processes"""
+        with self._lock_for(topic_folder):
+            if fcntl is None:
+                yield
+                return
+            self.manifests_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.manifests_dir / f".{topic_folder or ROOT_MANIFEST}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _temp_for(path: Path) -> Path:
+        return path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+
+    @staticmethod
+    def _fsync_path(path: Path):
+        """fsync a file or directory by path (directories are skipped where unsupported)"""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _replace_atomic(self, path: Path, data: bytes, mode: Optional[int] = None):
+        temp = self._temp_for(path)
+        with open(temp, "wb") as f:
+            f.write(data)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(temp, mode)
+        os.replace(temp, path)
+
+    @staticmethod
+    def _copy(source: Path, destination: Path):
+        """Create destination as a reflink of source, or else a byte copy"""
+        with open(destination, "wb") as dst:
+            if REFLINK_SUPPORTED:
+                try:
+                    with open(source, "rb") as src:
+                        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                    return
+                except OSError:
+                    pass
+            with open(source, "rb") as src:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    # Manifests
+
+    def load_manifest(self, topic_folder: str) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path(topic_folder), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"topic_folder": topic_folder, "files": {}}
+
+    def _save_manifest(self, topic_folder: str, manifest: Dict[str, Any]):
+        self.manifests_dir.mkdir(parents=True, exist_ok=True)
+        self._replace_atomic(self._manifest_path(topic_folder),
+                             json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+
+    def _apply(self, manifest: Dict[str, Any], filename: str, digest: Optional[str],
+               size: int = 0, mtime_ns: Optional[int] = None):
+        """Point a manifest entry at a digest (None marks the file deleted) and append to its history
+
+        size and mtime_ns describe the file as written, so later calls can
+        tell whether it has been changed outside the store.
+        """
+        record = manifest["files"].setdefault(filename, {"current": None, "size": 0, "versions": []})
+        new_version = record["current"] != digest
+        record["current"] = digest
+        record["size"] = size
+        record["mtime_ns"] = mtime_ns
+        if digest is not None and new_version:
+            versions = [v for v in record["versions"] if v["hash"] != digest]
+            versions.append({"hash": digest, "size": size, "saved_at": time.time()})
+            record["versions"] = versions[-self.history_limit:]
+
+    @staticmethod
+    def _unchanged_digest(record: Optional[Dict[str, Any]], stat: os.stat_result) -> Optional[str]:
+        """The record's digest if the file is still as the store wrote it
+
+        Files sharing their inode (hard links left by earlier versions of
+        the store) never count as unchanged, so they get rewritten.
+        """
+        if not record or not record.get("current"):
+            return None
+        if stat.st_nlink == 1 and stat.st_size == record.get("size") and stat.st_mtime_ns == record.get("mtime_ns"):
+            return record["current"]
+        return None
+
+    # Blobs
+
+    def put(self, data: bytes) -> str:
+        """Store bytes once and return their digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._replace_atomic(path, data, mode=0o444)
+        return digest
+
+    def _retire(self, manifest: Dict[str, Any], filename: str, path: Path,
+                digest: Optional[str]) -> Optional[Path]:
+        """Keep the version of path that is about to be replaced (caller holds the topic lock)
+
+        The file is hard-linked into objects/ (copied where links fail);
+        once path is replaced the blob is the old inode's only name, so no
+        bytes are copied. A file changed outside the store is hashed and
+        added to the history first; the version it overwrote in place is
+        gone, so it is dropped from the history unless another copy is
+        stored. Returns the new blob, to be made read-only after the
+        replace, or None if nothing had to be kept.
+        """
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        record = manifest["files"].get(filename)
+        previous = self._unchanged_digest(record, stat)
+        if previous is None:
+            if record and record.get("current") and not self.blob_path(record["current"]).exists():
+                record["versions"] = [v for v in record["versions"] if v["hash"] != record["current"]]
+            previous = hashlib.sha256(path.read_bytes()).hexdigest()
+            if previous != digest:
+                self._apply(manifest, filename, previous, stat.st_size, stat.st_mtime_ns)
+        blob = self.blob_path(previous)
+        if previous == digest or blob.exists():
+            return None
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        temp = self._temp_for(blob)
+        try:
+            os.link(path, temp)
+        except OSError:
+            self._copy(path, temp)
+        os.replace(temp, blob)
+        return blob
+
+    def _publish(self, staged: List[Tuple[Path, Optional[Tuple[str, str]], Optional[str], Path, int]]) -> set:
+        """Rename staged temp files into place, with one manifest update per topic folder
+
+        staged items are (path, key, digest, temp, size); key None means a
+        plain write. Returns the directories touched.
+        """
+        directories = set()
+        by_topic: Dict[str, list] = {}
+        for item in staged:
+            path, key, _, temp, _ = item
+            if key is None:
+                os.replace(temp, path)
+                directories.add(path.parent)
+            else:
+                by_topic.setdefault(key[0], []).append(item)
+
+        for topic_folder, group in by_topic.items():
+            with self.topic_lock(topic_folder):
+                manifest = self.load_manifest(topic_folder)
+                for path, key, digest, temp, size in group:
+                    retired = self._retire(manifest, key[1], path, digest)
+                    os.replace(temp, path)
+                    if retired is not None:
+                        os.chmod(retired, 0o444)
+                        directories.add(retired.parent)
+                    self._apply(manifest, key[1], digest, size, path.stat().st_mtime_ns)
+                    directories.add(path.parent)
+                self._save_manifest(topic_folder, manifest)
+        return directories
+
+    def _finish(self, staged, temps: List[Path]):
+        """fsync staged temp files, publish them, then fsync the directories once each"""
+        if self.fsync:
+            for temp in temps:
+                self._fsync_path(temp)
+        directories = self._publish(staged)
+        if self.fsync:
+            for directory in directories:
+                self._fsync_path(directory)
+
+    def write_many(self, items: List[Tuple[Path, bytes, bool]]) -> List[Optional[str]]:
+        """Crash-safely write several files with one group of fsyncs
+
+        items are (path, data, versioned). Versioned course files also get
+        a manifest entry, and the version they replace is kept; others (and
+        everything when the store is disabled) get a plain
+        temp-file-and-rename write. All data is written to temp files and
+        fsynced first, then published by rename under the topic lock (one
+        manifest write per topic), then each touched directory is fsynced
+        once. Returns the digest for each item (None for plain writes).
+        """
+        staged = []
+        temps: List[Path] = []
+        try:
+            for path, data, versioned in items:
+                path = Path(path)
+                key = self.key_for(path) if self.enabled and versioned else None
+                path.parent.mkdir(parents=True, exist_ok=True)
+                temp = self._temp_for(path)
+                temps.append(temp)
+                with open(temp, "wb") as f:
+                    f.write(data)
+                digest = hashlib.sha256(data).hexdigest() if key is not None else None
+                staged.append((path, key, digest, temp, len(data)))
+            self._finish(staged, temps)
+        except BaseException:
+            # Published temps are gone already; the rest would never be cleaned up (gc skips dotfiles)
+            for temp in temps:
+                temp.unlink(missing_ok=True)
+            raise
+        return [digest for _, _, digest, _, _ in staged]
+
+    def _current_digest(self, path: Path) -> Optional[str]:
+        """Digest of a stored file without reading it, if it is unchanged since the store wrote it"""
+        key = self.key_for(path)
+        if key is None:
+            return None
+        try:
+            stat = Path(path).stat()
+        except FileNotFoundError:
+            return None
+        return self._unchanged_digest(self.load_manifest(key[0])["files"].get(key[1]), stat)
+
+    # File operations
+
+    def write(self, path: Path, data: bytes) -> Optional[str]:
+        """Write a course file through the store; returns its digest
+
+        Paths outside course_content/ (or a disabled store) get a plain
+        atomic write and None.
+        """
+        return self.write_many([(Path(path), data, True)])[0]
+
+    def ingest(self, path: Path) -> Optional[str]:
+        """Track an existing file's content (unless unchanged since the store wrote it)"""
+        path = Path(path)
+        digest = self._current_digest(path)
+        if digest:
+            return digest
+        return self.write(path, path.read_bytes())
+
+    def copy_many(self, pairs: List[Tuple[Path, Path]]) -> List[Optional[str]]:
+        """Place a copy of each source's content at its destination
+
+        Costs one more copy of each file on disk unless the filesystem
+        supports reflinks. Destinations already holding the same content
+        are left alone; sources are ingested first if the store doesn't
+        know them yet.
+        """
+        if not self.enabled:
+            for source, destination in pairs:
+                shutil.copy2(source, destination)
+            return [None] * len(pairs)
+        staged, temps, results = [], [], []
+        try:
+            for source, destination in pairs:
+                source, destination = Path(source), Path(destination)
+                digest = self.ingest(source)
+                key = self.key_for(destination)
+                results.append(digest)
+                if digest is None or key is None:
+                    shutil.copy2(source, destination)
+                    continue
+                if self._current_digest(destination) == digest:
+                    continue
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                temp = self._temp_for(destination)
+                temps.append(temp)
+                self._copy(source, temp)
+                staged.append((destination, key, digest, temp, temp.stat().st_size))
+            self._finish(staged, temps)
+        except BaseException:
+            for temp in temps:
+                temp.unlink(missing_ok=True)
+            raise
+        return results
+
+    def copy(self, source: Path, destination: Path) -> Optional[str]:
+        return self.copy_many([(source, destination)])[0]
+
+    def move_many(self, pairs: List[Tuple[Path, Path]]) -> List[Optional[str]]:
+        """Rename course files and carry their stored identity along
+
+        Metadata only: one rename per file and one manifest update per
+        folder involved. A file the store doesn't know (or that was changed
+        outside it) is moved untracked; ingest() picks it up later.
+        """
+        results: List[Optional[str]] = []
+        arrivals: Dict[str, list] = {}
+        departures: Dict[str, List[str]] = {}
+        for source, destination in pairs:
+            source, destination = Path(source), Path(destination)
+            digest = self._current_digest(source) if self.enabled else None
+            results.append(digest)
+            source_key = self.key_for(source) if self.enabled else None
+            key = self.key_for(destination) if self.enabled else None
+            if key is not None:
+                arrivals.setdefault(key[0], []).append((source, destination, key[1], digest))
+            else:
+                self._rename(source, destination)
+            if source_key is not None:
+                departures.setdefault(source_key[0], []).append(source_key[1])
+
+        for topic_folder, group in arrivals.items():
+            with self.topic_lock(topic_folder):
+                manifest = self.load_manifest(topic_folder)
+                for source, destination, filename, digest in group:
+                    retired = self._retire(manifest, filename, destination, digest) if digest else None
+                    self._rename(source, destination)
+                    if retired is not None:
+                        os.chmod(retired, 0o444)
+                    if digest:
+                        # rename keeps the mtime, so the file still counts as unchanged
+                        stat = destination.stat()
+                        self._apply(manifest, filename, digest, stat.st_size, stat.st_mtime_ns)
+                    else:
+                        self._apply(manifest, filename, None)
+                self._save_manifest(topic_folder, manifest)
+        for topic_folder, filenames in departures.items():
+            self._forget_many(topic_folder, filenames)
+        return results
+
+    @staticmethod
+    def _rename(source: Path, destination: Path):
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if destination.exists() and os.path.samefile(source, destination):
+            # rename() is a no-op between two links to the same file
+            os.unlink(source)
+        else:
+            os.replace(source, destination)
+
+    def move(self, source: Path, destination: Path) -> Optional[str]:
+        return self.move_many([(source, destination)])[0]
+
+    def _forget_many(self, topic_folder: str, filenames: List[str]):
+        with self.topic_lock(topic_folder):
+            manifest = self.load_manifest(topic_folder)
+            for filename in filenames:
+                self._apply(manifest, filename, None)
+            self._save_manifest(topic_folder, manifest)
+
+    def forget(self, path: Path):
+        """Record that a file was deleted; its history is kept"""
+        key = self.key_for(path) if self.enabled else None
+        if key is not None:
+            self._forget_many(key[0], [key[1]])
+
+    def history(self, path: Path) -> List[Dict[str, Any]]:
+        """Stored versions of a file, oldest first"""
+        key = self.key_for(path)
+        if key is None:
+            return []
+        record = self.load_manifest(key[0])["files"].get(key[1], {})
+        return [dict(v, current=v["hash"] == record.get("current")) for v in record.get("versions", [])]
+
+    def _live_copy(self, digest: str) -> Optional[bytes]:
+        """Bytes of a version that is only stored as some file's current content"""
+        if not self.manifests_dir.exists():
+            return None
+        for manifest_path in self.manifests_dir.glob("*.json"):
+            topic_folder = manifest_path.stem if manifest_path.stem != ROOT_MANIFEST else ""
+            for filename, record in self.load_manifest(topic_folder)["files"].items():
+                if record.get("current") != digest:
+                    continue
+                try:
+                    data = (self.root / topic_folder / filename).read_bytes()
+                except FileNotFoundError:
+                    continue
+                if hashlib.sha256(data).hexdigest() == digest:
+                    return data
+        return None
+
+    def read_version(self, digest: str) -> bytes:
+        """Bytes of a stored version, from its blob or the file currently holding it"""
+        try:
+            return self.blob_path(digest).read_bytes()
+        except FileNotFoundError:
+            data = self._live_copy(digest)
+            if data is None:
+                raise
+            return data
+
+    def restore(self, path: Path, digest: str) -> str:
+        """Make an earlier version current again"""
+        return self.write(path, self.read_version(digest))
+
+    # Maintenance
+
+    def referenced_digests(self) -> set:
+        digests = set()
+        if self.manifests_dir.exists():
+            for manifest_path in self.manifests_dir.glob("*.json"):
+                topic_folder = manifest_path.stem if manifest_path.stem != ROOT_MANIFEST else ""
+                for record in self.load_manifest(topic_folder)["files"].values():
+                    digests.update(v["hash"] for v in record.get("versions", []))
+                    if record.get("current"):
+                        digests.add(record["current"])
+        return digests
+
+    def gc(self, dry_run: bool = False) -> Dict[str, int]:
+        """Delete blobs no manifest refers to"""
+        referenced = self.referenced_digests()
+        removed = freed = 0
+        if self.objects_dir.exists():
+            for blob in self.objects_dir.glob("*/*"):
+                if blob.name not in referenced and not blob.name.startswith("."):
+                    freed += blob.stat().st_size
+                    removed += 1
+                    if not dry_run:
+                        blob.unlink()
+        return {"removed": removed, "freed_bytes": freed}
+
+    def get_stats(self) -> Dict[str, Any]:
+        blobs = list(self.objects_dir.glob("*/*")) if self.objects_dir.exists() else []
+        return {
+            "enabled": self.enabled,
+            "blobs": len(blobs),
+            "blob_bytes": sum(b.stat().st_size for b in blobs),
+            "manifests": len(list(self.manifests_dir.glob("*.json"))) if self.manifests_dir.exists() else 0
+        }
+
+# Global blob store instance
+_blob_store: Optional[BlobStore] = None
+_blob_store_lock = threading.Lock()
+
+def get_blob_store() -> BlobStore:
+    """Get the shared blob store for course_content/"""
+    global _blob_store
+    if _blob_store is None:
+        with _blob_store_lock:
+            if _blob_store is None:
+                from config import get_config
+                config = get_config()
+                _blob_store = BlobStore("course_content", config.course_blob_store, config.course_blob_history,
+                                        config.course_write_fsync)
+    return _blob_store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the content-addressed course file store")
+    parser.add_argument("--root", default="course_content", help="Course directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Track existing course files (and turn old hard links to blobs into separate files)")
+    import_parser.add_argument("--dry-run", action="store_true")
+
+    history_parser = subparsers.add_parser("history", help="List stored versions of a file")
+    history_parser.add_argument("path")
+
+    restore_parser = subparsers.add_parser("restore", help="Make a stored version current again")
+    restore_parser.add_argument("path")
+    restore_parser.add_argument("digest")
+
+    gc_parser = subparsers.add_parser("gc", help="Delete unreferenced blobs")
+    gc_parser.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args()
+    store = BlobStore(args.root)
+
+    if args.command == "import":
+        root = Path(args.root)
+        files = sorted(list(root.glob("*.md")) + list(root.glob("*/*.md")))
+        pending = [f for f in files if not store._current_digest(f)]
+        if args.dry_run:
+            print(f"Would track {len(pending)} of {len(files)} files")
+        else:
+            # In batches, so each manifest is written once per batch rather than once per file
+            for start in range(0, len(pending), 256):
+                batch = pending[start:start + 256]
+                store.write_many([(f, f.read_bytes(), True) for f in batch])
+            print(f"✅ Tracked {len(pending)} files ({len(files) - len(pending)} were already up to date)")
+    elif args.command == "history":
+        for version in store.history(Path(args.path)):
+            marker = "*" if version["current"] else " "
+            print(f"{marker} {version['hash']}  {version['size']:>8}  {time.ctime(version['saved_at'])}")
+    elif args.command == "restore":
+        store.restore(Path(args.path), args.digest)
+        print(f"✅ Restored {args.path} to {args.digest[:12]}")
+    else:
+        result = store.gc(args.dry_run)
+        print(f"{'Would remove' if args.dry_run else 'Removed'} {result['removed']} blobs ({result['freed_bytes']} bytes)")
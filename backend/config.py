@@ -80,6 +80,70 @@ class ConfigManager:
         self.search_engine_id = os.getenv("SEARCH_ENGINE_ID", "")
         self.youtube_api_key = os.getenv("YOUTUBE_API_KEY", "")
         
+        # Media backend: "google" (search APIs), "local" (curated catalog) or
+        # "auto" (local catalog when the Google keys are missing)
+        self.media_backend = os.getenv("MEDIA_BACKEND", "google").lower()
+        self.media_catalog_path = os.getenv("MEDIA_CATALOG_PATH", "media_catalog.db")
+        
+        # Image proxy cache (local copies of embedded images)
+        self.image_cache_dir = os.getenv("IMAGE_CACHE_DIR", "media_cache")
+        self.image_cache_max_dimension = int(os.getenv("IMAGE_CACHE_MAX_DIMENSION", "1280"))
+        self.image_cache_max_mb = int(os.getenv("IMAGE_CACHE_MAX_MB", "1024"))
+        self.image_proxy_rewrite = os.getenv("IMAGE_PROXY_REWRITE", "false").lower() == "true"
+        self.image_proxy_base_url = os.getenv("IMAGE_PROXY_BASE_URL", "http://localhost:8000")
+        self.image_proxy_allow_private = os.getenv("IMAGE_PROXY_ALLOW_PRIVATE", "false").lower() == "true"
+        
+        # Media HTTP client configuration
+        self.media_pool_connections = int(os.getenv("MEDIA_POOL_CONNECTIONS", "4"))
+        self.media_pool_maxsize = int(os.getenv("MEDIA_POOL_MAXSIZE", "8"))
+        # Seconds to wait for a free pooled connection before failing the request
+        self.media_pool_timeout = float(os.getenv("MEDIA_POOL_TIMEOUT", "10"))
+        self.media_connect_timeout = float(os.getenv("MEDIA_CONNECT_TIMEOUT", "3.05"))
+        self.media_read_timeout = float(os.getenv("MEDIA_READ_TIMEOUT", "10"))
+        self.media_max_retries = int(os.getenv("MEDIA_MAX_RETRIES", "2"))
+        self.media_dns_cache_ttl = int(os.getenv("MEDIA_DNS_CACHE_TTL", "300"))
+        self.media_warm_pool = os.getenv("MEDIA_WARM_POOL", "true").lower() == "true"
+        
+        # Thread pool for blocking file I/O in API routes
+        self.io_pool_workers = int(os.getenv("IO_POOL_WORKERS", "8"))
+        
+        # Course catalog: seconds between mtime checks of course_content/
+        self.course_catalog_poll_interval = float(os.getenv("COURSE_CATALOG_POLL_INTERVAL", "5"))
+        
+        # Content-addressed version store for course files (course_content/.blobs)
+        self.course_blob_store = os.getenv("COURSE_BLOB_STORE", "true").lower() == "true"
+        self.course_blob_history = int(os.getenv("COURSE_BLOB_HISTORY", "20"))
+        
+        # Write-behind course file writer: batch window and whether writes are fsynced
+        self.course_write_batch_ms = float(os.getenv("COURSE_WRITE_BATCH_MS", "5"))
+        self.course_write_fsync = os.getenv("COURSE_WRITE_FSYNC", "true").lower() == "true"
+        
+        # Course store: "files" (course_content/ only) or "sqlite" (also mirrored into COURSE_DB_PATH)
+        self.course_store_backend = os.getenv("COURSE_STORE_BACKEND", "files").lower()
+        self.course_db_path = os.getenv("COURSE_DB_PATH", "course_store.db")
+        
+        # Progress events: per-session replay buffer, sessions kept, optional spill directory
+        self.progress_buffer_size = int(os.getenv("PROGRESS_BUFFER_SIZE", "256"))
+        self.progress_max_sessions = int(os.getenv("PROGRESS_MAX_SESSIONS", "200"))
+        self.progress_spill_dir = os.getenv("PROGRESS_SPILL_DIR", "")
+        self.progress_send_queue = int(os.getenv("PROGRESS_SEND_QUEUE", "64"))
+        self.progress_ws_deflate = os.getenv("PROGRESS_WS_DEFLATE", "true").lower() == "true"
+        self.progress_sse_heartbeat = float(os.getenv("PROGRESS_SSE_HEARTBEAT", "15"))
+        self.progress_sse_retry_ms = int(os.getenv("PROGRESS_SSE_RETRY_MS", "3000"))
+        
+        # Relay progress events between uvicorn workers over Unix datagram sockets
+        self.progress_relay = os.getenv("PROGRESS_RELAY", "false").lower() == "true"
+        self.progress_relay_dir = os.getenv("PROGRESS_RELAY_DIR", "/tmp/course-progress-relay")
+        
+        # Course creation sessions: idle TTL, maximum kept in memory,
+        # "memory" or "sqlite" (persisted to SESSION_DB_PATH), and how often
+        # expired sessions are pruned
+        self.session_ttl = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+        self.session_max = int(os.getenv("SESSION_MAX", "500"))
+        self.session_store_backend = os.getenv("SESSION_STORE_BACKEND", "memory").lower()
+        self.session_db_path = os.getenv("SESSION_DB_PATH", "sessions.db")
+        self.session_prune_interval = float(os.getenv("SESSION_PRUNE_INTERVAL", "3600"))
+        
         # Rate limiting configuration
         self.rate_limit_per_minute = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
         
@@ -126,6 +190,15 @@ class ConfigManager:
         if not providers_configured:
             errors.append("No AI provider API keys configured. Please set at least one of: OPENROUTER_API_KEY, OPENAI_API_KEY, ANTHROPIC_API_KEY, GEMINI_API_KEY")
         
+        if self.media_backend not in ("google", "local", "auto"):
+            warnings.append(f"Unknown MEDIA_BACKEND '{self.media_backend}' - expected google, local or auto")
+        
+        if self.course_store_backend not in ("files", "sqlite"):
+            warnings.append(f"Unknown COURSE_STORE_BACKEND '{self.course_store_backend}' - expected files or sqlite")
+        
+        if self.media_backend in ("local", "auto") and not Path(self.media_catalog_path).exists():
+            warnings.append(f"Local media catalog not found at {self.media_catalog_path} - import one with 'python media_catalog.py import <file>'")
+        
         # Check Google API configuration
         if not self.google_api_key:
             warnings.append("Google API key not configured - image search will be disabled")
@@ -184,12 +257,23 @@ class ConfigManager:
         }
         return provider_map.get(provider_name.lower())
     
+    def get_media_backend(self, kind: str = "image") -> str:
+        """Resolve which media backend serves searches of the given kind"""
+        if self.media_backend == "auto":
+            google_ready = bool(self.google_api_key and self.search_engine_id) if kind == "image" else bool(self.youtube_api_key)
+            return "google" if google_ready else "local"
+        return self.media_backend
+    
     def is_media_search_enabled(self) -> bool:
         """Check if media search is properly configured"""
+        if self.get_media_backend("image") == "local":
+            return Path(self.media_catalog_path).exists()
         return bool(self.google_api_key and self.search_engine_id)
     
     def is_youtube_search_enabled(self) -> bool:
         """Check if YouTube search is properly configured"""
+        if self.get_media_backend("video") == "local":
+            return Path(self.media_catalog_path).exists()
         return bool(self.youtube_api_key)
     
     def get_setup_instructions(self) -> str:
@@ -255,6 +339,7 @@ class ConfigManager:
         print("\n🎬 Media APIs:")
         print(f"  Google Images: {'✅ Configured' if self.google_api_key else '❌ Not configured'}")
         print(f"  YouTube: {'✅ Configured' if self.youtube_api_key else '❌ Not configured'}")
+        print(f"  Backend: {self.media_backend} (catalog: {self.media_catalog_path})")
         
         # Validation results
         if self.validation_result.errors:
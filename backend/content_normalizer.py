@@ -0,0 +1,183 @@
+"""
+Write-time normalization of generated course modules.
+
+Modules are cleaned once when they are saved and a sidecar metadata record
+is written next to them (01_intro.md -> 01_intro.md.meta.json), so read
+paths can serve the stored bytes as-is. Larger modules also get gzip and
+brotli siblings for the raw markdown endpoint.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bump when normalize_markdown changes so older sidecars are regenerated
+NORMALIZER_VERSION = 1
+
+WORDS_PER_MINUTE = 200
+
+# Precompressed siblings (01_intro.md -> 01_intro.md.gz / .md.br) are only
+# written for modules at least this large
+MIN_PRECOMPRESS_BYTES = 1024
+
+PRECOMPRESSED_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+_HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+_FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+
+def clean_course_markdown(content: str) -> str:
+    """Strip the ```markdown fences the LLM tends to wrap modules in"""
+    # Remove ```markdown prefix and suffix if present
+    if content.startswith('```markdown'):
+        content = content.replace('```markdown\n', '', 1)
+        if content.endswith('```'):
+            content = content[:-3]
+    # Remove any triple backticks at the beginning or end of the content
+    content = re.sub(r'^```\s*\n', '', content)
+    content = re.sub(r'\n```\s*$', '', content)
+    return content
+
+def extract_title(content: str, fallback: str) -> str:
+    """Title of a module: its first line without heading markers"""
+    return content.split('\n')[0].replace('#', '').strip() if content else fallback
+
+def normalize_markdown(content: str) -> str:
+    """Canonical stored form of a module (idempotent)"""
+    content = content.replace('\r\n', '\n').lstrip('\ufeff')
+    content = clean_course_markdown(content)
+    return content.rstrip() + '\n' if content.strip() else ''
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def build_metadata(content: str, filename: str) -> Dict[str, Any]:
+    """Metadata record for a normalized module"""
+    headings = []
+    in_code_block = False
+    for line in content.split('\n'):
+        if _FENCE_PATTERN.match(line):
+            in_code_block = not in_code_block
+            continue
+        if in_code_block:
+            continue
+        match = _HEADING_PATTERN.match(line)
+        if match:
+            headings.append({"level": len(match.group(1)), "text": match.group(2).strip()})
+
+    word_count = len(re.findall(r'\w+', content))
+    return {
+        "filename": filename,
+        "title": extract_title(content, Path(filename).stem),
+        "word_count": word_count,
+        "reading_time_minutes": max(1, round(word_count / WORDS_PER_MINUTE)) if word_count else 0,
+        "headings": headings,
+        "size": len(content.encode('utf-8')),
+        "content_hash": content_hash(content.encode('utf-8')),
+        "normalizer_version": NORMALIZER_VERSION
+    }
+
+def sidecar_path(path: Path) -> Path:
+    """Location of a module's metadata record"""
+    path = Path(path)
+    return path.with_name(path.name + '.meta.json')
+
+def _write_atomic(target: Path, data: bytes):
+    # Written beside the target and renamed so readers never see a partial
+    # file; the temp name is unique so concurrent rebuilds don't collide
+    temp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, target)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+
+def write_sidecar(path: Path, metadata: Dict[str, Any]):
+    _write_atomic(sidecar_path(path), json.dumps(metadata, ensure_ascii=False, indent=2).encode('utf-8'))
+
+def read_sidecar(path: Path, expected_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Sidecar metadata, or None if missing, stale or written by an older normalizer"""
+    try:
+        with open(sidecar_path(path), 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if metadata.get("normalizer_version") != NORMALIZER_VERSION:
+        return None
+    if expected_hash is not None and metadata.get("content_hash") != expected_hash:
+        return None
+    return metadata
+
+def precompressed_path(path: Path, encoding: str) -> Path:
+    """Location of a module's gzip or brotli sibling"""
+    path = Path(path)
+    return path.with_name(path.name + PRECOMPRESSED_SUFFIXES[encoding])
+
+def is_precompressed_fresh(path: Path, encoding: str) -> bool:
+    """True if the sibling exists and was written after the module itself"""
+    try:
+        return precompressed_path(path, encoding).stat().st_mtime_ns >= Path(path).stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def write_precompressed(path: Path, data: Optional[bytes] = None):
+    """Write .gz (and .br when brotli is installed) siblings of a module
+
+    Small modules get no siblings, and any left from a larger version are removed.
+    """
+    path = Path(path)
+    if data is None:
+        data = path.read_bytes()
+    for encoding in PRECOMPRESSED_SUFFIXES:
+        target = precompressed_path(path, encoding)
+        if len(data) < MIN_PRECOMPRESS_BYTES or (encoding == "br" and brotli is None):
+            target.unlink(missing_ok=True)
+            continue
+        compressed = gzip.compress(data, compresslevel=9, mtime=0) if encoding == "gzip" else brotli.compress(data, quality=11)
+        _write_atomic(target, compressed)
+
+def remove_derived_files(path: Path):
+    """Delete a module's sidecar and precompressed siblings"""
+    sidecar_path(path).unlink(missing_ok=True)
+    for encoding in PRECOMPRESSED_SUFFIXES:
+        precompressed_path(path, encoding).unlink(missing_ok=True)
+
+def move_derived_files(source: Path, destination: Path):
+    """Rename a module's sidecar and precompressed siblings along with it"""
+    siblings = [(sidecar_path(source), sidecar_path(destination))]
+    siblings.extend((precompressed_path(source, encoding), precompressed_path(destination, encoding))
+                    for encoding in PRECOMPRESSED_SUFFIXES)
+    for old, new in siblings:
+        try:
+            os.replace(old, new)
+        except FileNotFoundError:
+            new.unlink(missing_ok=True)
+
+def normalize_file(path: Path, dry_run: bool = False) -> bool:
+    """Normalize a module file in place and (re)write its sidecar; returns True if anything changed"""
+    path = Path(path)
+    raw = path.read_bytes()
+    if read_sidecar(path, content_hash(raw)):
+        return False
+
+    content = normalize_markdown(raw.decode('utf-8', errors='replace'))
+    if dry_run:
+        return True
+
+    if content.encode('utf-8') != raw:
+        # Write through the store so the change is recorded as a new version
+        from blob_store import get_blob_store
+        get_blob_store().write(path, content.encode('utf-8'))
+    write_sidecar(path, build_metadata(content, path.name))
+    write_precompressed(path, content.encode('utf-8'))
+    return True
@@ -0,0 +1,365 @@
+"""
+In-memory catalog of generated course files.
+
+The catalog is built once at startup and kept current incrementally: our
+own writes and deletes notify it directly, a watchdog observer (when the
+package is installed) reports external changes, and a background poller
+compares (size, mtime) of every file as a fallback. Listing courses is then
+a walk over the in-memory entries with no disk reads. Entries hold metadata
+only; module content is read from disk on demand (read_content).
+"""
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
+
+from content_normalizer import clean_course_markdown, extract_title, read_sidecar
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+
+@dataclass
+class CourseEntry:
+    """Metadata for one course module file"""
+    filename: str
+    topic_folder: Optional[str]
+    title: str
+    size: int
+    mtime: float
+    mtime_ns: int
+    content_hash: str
+    # True if the file was normalized at write time (has a matching sidecar)
+    normalized: bool = False
+
+    @property
+    def etag(self) -> str:
+        """Strong validator for this file's representation"""
+        return f"{self.content_hash[:40]}-{self.mtime_ns:x}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "filename": self.filename,
+            "title": self.title,
+            "created_at": self.mtime,
+            "topic_folder": self.topic_folder,
+            "size": self.size,
+            "content_hash": self.content_hash
+        }
+
+CatalogKey = Tuple[Optional[str], str]
+
+class CourseCatalog:
+    """Incrementally maintained index of course_content/"""
+
+    def __init__(self, root: str = "course_content", poll_interval: float = 5.0):
+        self.root = Path(root)
+        self.poll_interval = poll_interval
+        self._entries: Dict[CatalogKey, CourseEntry] = {}
+        # filename -> {topic_folder: entry}, kept in step with _entries
+        self._by_filename: Dict[str, Dict[Optional[str], CourseEntry]] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+        self._observer = None
+        self.version = 0
+        self.built_at: Optional[float] = None
+        self._sorted: List[CourseEntry] = []
+        self._sorted_version = -1
+        self._etag = ""
+        self._etag_version = -1
+
+    # Keys and paths
+
+    def key_for(self, path: Path) -> Optional[CatalogKey]:
+        """Catalog key for a file under the root, or None if it is not a course file"""
+        path = Path(path)
+        if path.suffix != ".md":
+            return None
+        try:
+            relative = path.resolve().relative_to(self.root.resolve())
+        except ValueError:
+            return None
+        if len(relative.parts) == 1:
+            return (None, relative.parts[0])
+        if len(relative.parts) == 2:
+            return (relative.parts[0], relative.parts[1])
+        return None
+
+    def path_for(self, key: CatalogKey) -> Path:
+        topic_folder, filename = key
+        return self.root / topic_folder / filename if topic_folder else self.root / filename
+
+    # Loading
+
+    def _load(self, key: CatalogKey, path: Path) -> Optional[CourseEntry]:
+        try:
+            stat = path.stat()
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        digest = hashlib.sha256(raw).hexdigest()
+        
+        # Files normalized at write time carry a sidecar whose hash matches the
+        # bytes on disk; anything else is cleaned here as before
+        metadata = read_sidecar(path, digest)
+        if metadata:
+            title = metadata["title"]
+        else:
+            content = clean_course_markdown(raw.decode('utf-8', errors='replace'))
+            title = extract_title(content, path.stem)
+        
+        return CourseEntry(
+            filename=key[1],
+            topic_folder=key[0],
+            title=title,
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            mtime_ns=stat.st_mtime_ns,
+            content_hash=digest,
+            normalized=bool(metadata)
+        )
+
+    def read_content(self, entry: CourseEntry) -> Optional[str]:
+        """Cleaned markdown of an entry's file, read from disk (blocking)"""
+        path = self.path_for((entry.topic_folder, entry.filename))
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        content = raw.decode('utf-8', errors='replace')
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest == entry.content_hash:
+            normalized = entry.normalized
+        else:
+            # Changed since it was cataloged
+            normalized = bool(read_sidecar(path, digest))
+        return content if normalized else clean_course_markdown(content)
+
+    def _scan_paths(self) -> Dict[CatalogKey, Path]:
+        paths = {}
+        if not self.root.exists():
+            return paths
+        for md_file in self.root.glob("*.md"):
+            paths[(None, md_file.name)] = md_file
+        for folder in self.root.iterdir():
+            if folder.is_dir() and not folder.name.startswith('.'):
+                for md_file in folder.glob("*.md"):
+                    paths[(folder.name, md_file.name)] = md_file
+        return paths
+
+    def build(self):
+        """Full scan of the course directory"""
+        entries = {}
+        for key, path in self._scan_paths().items():
+            entry = self._load(key, path)
+            if entry:
+                entries[key] = entry
+        by_filename: Dict[str, Dict[Optional[str], CourseEntry]] = {}
+        for (topic_folder, filename), entry in entries.items():
+            by_filename.setdefault(filename, {})[topic_folder] = entry
+        with self._lock:
+            self._entries = entries
+            self._by_filename = by_filename
+            self.version += 1
+            self.built_at = time.time()
+        print(f"📚 Course catalog built: {len(entries)} files")
+
+    def sync(self) -> int:
+        """Re-stat every file and reload only those whose size or mtime changed"""
+        changed = 0
+        paths = self._scan_paths()
+        with self._lock:
+            known = dict(self._entries)
+
+        for key in set(known) - set(paths):
+            self._remove(key)
+            changed += 1
+
+        for key, path in paths.items():
+            entry = known.get(key)
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if entry and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+                continue
+            self.notify_changed(path)
+            changed += 1
+
+        return changed
+
+    # Incremental updates
+
+    def notify_changed(self, path: Path):
+        """Reload a single file after it was created or modified"""
+        key = self.key_for(path)
+        if key is None:
+            return
+        entry = self._load(key, Path(path))
+        with self._lock:
+            if entry:
+                self._entries[key] = entry
+                self._by_filename.setdefault(key[1], {})[key[0]] = entry
+            else:
+                self._entries.pop(key, None)
+                self._unindex(key)
+            self.version += 1
+
+    def notify_deleted(self, path: Path):
+        """Drop a single file after it was deleted"""
+        key = self.key_for(path)
+        if key is not None:
+            self._remove(key)
+
+    def notify_moved(self, source: Path, destination: Path):
+        """Track a rename or move within the course directory"""
+        self.notify_deleted(source)
+        self.notify_changed(destination)
+
+    def _remove(self, key: CatalogKey):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._unindex(key)
+                self.version += 1
+
+    def _unindex(self, key: CatalogKey):
+        locations = self._by_filename.get(key[1])
+        if locations is not None:
+            locations.pop(key[0], None)
+            if not locations:
+                del self._by_filename[key[1]]
+
+    # Queries
+
+    @staticmethod
+    def sort_key(entry: CourseEntry) -> Tuple[bool, str, str]:
+        """Listing order: topic folders by name, root files last, then filename"""
+        return (entry.topic_folder is None, entry.topic_folder or "", entry.filename)
+
+    def entries(self) -> List[CourseEntry]:
+        """Snapshot of all entries in listing order (cached until the next change)"""
+        with self._lock:
+            if self._sorted_version != self.version:
+                self._sorted = sorted(self._entries.values(), key=self.sort_key)
+                self._sorted_version = self.version
+            return self._sorted
+
+    def listing_etag(self) -> str:
+        """Digest of every entry's identity and content hash (cached per version)"""
+        with self._lock:
+            if self._etag_version != self.version:
+                digest = hashlib.sha256()
+                for entry in self.entries():
+                    digest.update(f"{entry.topic_folder}/{entry.filename}:{entry.content_hash}:{entry.mtime_ns}\n".encode("utf-8"))
+                self._etag = digest.hexdigest()
+                self._etag_version = self.version
+            return self._etag
+
+    def resolve(self, filename: str) -> List[CourseEntry]:
+        """Every location of a filename: root copy first, then topic folders by name"""
+        with self._lock:
+            locations = dict(self._by_filename.get(filename, {}))
+        return [locations[t] for t in sorted(locations, key=lambda t: (t is not None, t or ""))]
+
+    def get(self, topic_folder: Optional[str], filename: str) -> Optional[CourseEntry]:
+        with self._lock:
+            return self._entries.get((topic_folder, filename))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "topic_folders": len({k[0] for k in self._entries if k[0]}),
+                "version": self.version,
+                "built_at": self.built_at,
+                "watcher": "watchdog" if self._observer else "polling"
+            }
+
+    # Background watching
+
+    def start(self):
+        """Build the catalog and start watching for external changes"""
+        self.build()
+        self._stop.clear()
+
+        if WATCHDOG_AVAILABLE and self.root.exists():
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_CatalogEventHandler(self), str(self.root), recursive=True)
+                self._observer.daemon = True
+                self._observer.start()
+            except Exception as e:
+                print(f"⚠️ File watcher unavailable, using mtime polling only: {e}")
+                self._observer = None
+
+        self._poller = threading.Thread(target=self._poll_loop, name="course-catalog-poller", daemon=True)
+        self._poller.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._observer:
+            self._observer.stop()
+            self._observer = None
+
+    def _poll_loop(self):
+        # With a watcher the poll is only a safety net, so it runs less often
+        interval = self.poll_interval * (6 if self._observer else 1)
+        while not self._stop.wait(interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"⚠️ Course catalog sync failed: {e}")
+
+if WATCHDOG_AVAILABLE:
+    class _CatalogEventHandler(FileSystemEventHandler):
+        """Forwards file system events for .md files to the catalog"""
+
+        def __init__(self, catalog: CourseCatalog):
+            self.catalog = catalog
+
+        def on_created(self, event):
+            if not event.is_directory:
+                self.catalog.notify_changed(Path(event.src_path))
+
+        def on_modified(self, event):
+            if not event.is_directory:
+                self.catalog.notify_changed(Path(event.src_path))
+
+        def on_deleted(self, event):
+            if not event.is_directory:
+                self.catalog.notify_deleted(Path(event.src_path))
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                self.catalog.notify_moved(Path(event.src_path), Path(event.dest_path))
+
+# Global catalog instance
+_catalog: Optional[CourseCatalog] = None
+_catalog_lock = threading.Lock()
+
+def get_course_catalog() -> CourseCatalog:
+    """Get the shared course catalog (built on first use if not started)"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                catalog = CourseCatalog()
+                catalog.build()
+                _catalog = catalog
+    return _catalog
+
+def start_course_catalog(root: str = "course_content", poll_interval: float = 5.0) -> CourseCatalog:
+    """Build the shared catalog and start watching the course directory"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is not None:
+            _catalog.stop()
+        _catalog = CourseCatalog(root, poll_interval)
+        _catalog.start()
+    return _catalog
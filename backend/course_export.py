@@ -0,0 +1,196 @@
+"""
+Streaming zip / tar.gz export of a course topic folder.
+
+Archives are written into a small in-memory buffer that is drained after
+every chunk, so the response starts immediately and memory stays flat
+regardless of course size. Zip members are written in 64 KiB chunks; tar
+members are bounded by the size of the largest single file (modules and
+cached images, which are already capped in size).
+"""
+import io
+import json
+import re
+import tarfile
+import time
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Any
+
+from course_catalog import get_course_catalog
+
+CHUNK_SIZE = 64 * 1024
+
+ARCHIVE_FORMATS = {
+    "zip": ("application/zip", "zip"),
+    "tar.gz": ("application/gzip", "tar.gz")
+}
+
+_PROXIED_MEDIA_PATTERN = re.compile(r'/api/media/([0-9a-f]{64})')
+
+@dataclass
+class ArchiveMember:
+    """A file to place in the archive"""
+    path: Path
+    arcname: str
+    size: int
+    mtime: float
+
+class _StreamBuffer:
+    """Write-only, unseekable file object that collects output until drained"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def collect_course_media(contents: List[str]) -> Dict[str, Any]:
+    """Cached images referenced by module content, keyed by digest
+
+    Covers both proxied links (/api/media/<digest>) and remote image URLs
+    that already have a cached copy. Nothing is fetched.
+    """
+    from image_proxy import get_image_proxy, MARKDOWN_IMAGE_PATTERN
+
+    proxy = get_image_proxy()
+    media: Dict[str, Any] = {}
+    for content in contents:
+        for digest in _PROXIED_MEDIA_PATTERN.findall(content):
+            cached = proxy.get(digest)
+            if cached:
+                media.setdefault(digest, {"cached": cached, "urls": []})
+        for match in MARKDOWN_IMAGE_PATTERN.finditer(content):
+            url = match.group(2)
+            try:
+                cached = proxy.lookup(url)
+            except (OSError, ValueError):
+                cached = None
+            if cached:
+                media.setdefault(cached.digest, {"cached": cached, "urls": []})["urls"].append(url)
+    return media
+
+def build_export(entries, root_name: str, include_media: bool = False) -> Dict[str, Any]:
+    """Archive members and manifest for a list of catalog entries
+
+    When the topic folder has a course.json, modules follow its order and
+    the file itself is included.
+    """
+    from course_manifest import load_course_manifest, course_manifest_path
+
+    members = []
+    files = []
+    course_directory = get_course_catalog().root / root_name
+    course_manifest = load_course_manifest(course_directory)
+    if course_manifest:
+        order = {m["filename"]: m["number"] for m in course_manifest.get("modules", [])}
+        entries = sorted(entries, key=lambda e: (order.get(e.filename, len(order) + 1), e.filename))
+        path = course_manifest_path(course_directory)
+        stat = path.stat()
+        members.append(ArchiveMember(path, f"{root_name}/course.json", stat.st_size, stat.st_mtime))
+
+    for entry in entries:
+        path = get_course_catalog().path_for((entry.topic_folder, entry.filename))
+        members.append(ArchiveMember(path, f"{root_name}/{entry.filename}", entry.size, entry.mtime))
+        files.append({
+            "path": entry.filename,
+            "title": entry.title,
+            "size": entry.size,
+            "sha256": entry.content_hash,
+            "modified_at": entry.mtime
+        })
+
+    media_records = []
+    if include_media:
+        for digest, item in sorted(collect_course_media([get_course_catalog().read_content(e) or "" for e in entries]).items()):
+            cached = item["cached"]
+            arcname = f"media/{cached.path.name}"
+            members.append(ArchiveMember(cached.path, f"{root_name}/{arcname}", cached.size, cached.path.stat().st_mtime))
+            media_records.append({
+                "path": arcname,
+                "media_type": cached.media_type,
+                "size": cached.size,
+                "sha256": digest,
+                "urls": item["urls"]
+            })
+
+    manifest = {
+        "topic_folder": root_name,
+        "topic": course_manifest.get("topic") if course_manifest else None,
+        "exported_at": time.time(),
+        "modules": files,
+        "media": media_records
+    }
+    return {"members": members, "manifest": manifest}
+
+def _zip_stream(members: List[ArchiveMember], manifest: Optional[Dict[str, Any]], root_name: str) -> Iterator[bytes]:
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        if manifest is not None:
+            archive.writestr(f"{root_name}/manifest.json", json.dumps(manifest, indent=2))
+            yield buffer.drain()
+
+        for member in members:
+            info = zipfile.ZipInfo(member.arcname, date_time=time.localtime(member.mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            try:
+                with open(member.path, "rb") as source, archive.open(info, "w", force_zip64=member.size > 2 ** 31) as target:
+                    while True:
+                        chunk = source.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+            except FileNotFoundError:
+                # Deleted while the archive was being written; skip it
+                continue
+            yield buffer.drain()
+    yield buffer.drain()
+
+def _tar_stream(members: List[ArchiveMember], manifest: Optional[Dict[str, Any]], root_name: str) -> Iterator[bytes]:
+    buffer = _StreamBuffer()
+    with tarfile.open(fileobj=buffer, mode="w|gz") as archive:
+        if manifest is not None:
+            data = json.dumps(manifest, indent=2).encode("utf-8")
+            info = tarfile.TarInfo(f"{root_name}/manifest.json")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            archive.addfile(info, io.BytesIO(data))
+            yield buffer.drain()
+
+        for member in members:
+            try:
+                with open(member.path, "rb") as source:
+                    info = archive.gettarinfo(fileobj=source, arcname=member.arcname)
+                    info.uid = info.gid = 0
+                    info.uname = info.gname = ""
+                    archive.addfile(info, source)
+            except FileNotFoundError:
+                continue
+            data = buffer.drain()
+            if data:
+                yield data
+    yield buffer.drain()
+
+def stream_archive(archive_format: str, members: List[ArchiveMember],
+                   manifest: Optional[Dict[str, Any]], root_name: str) -> Iterator[bytes]:
+    """Yield the archive as it is built"""
+    if archive_format == "zip":
+        stream = _zip_stream(members, manifest, root_name)
+    elif archive_format == "tar.gz":
+        stream = _tar_stream(members, manifest, root_name)
+    else:
+        raise ValueError(f"Unknown archive format: {archive_format}")
+    return (chunk for chunk in stream if chunk)
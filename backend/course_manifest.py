@@ -0,0 +1,229 @@
+"""
+Per-course manifest (course.json) written while a course is generated.
+
+Each topic folder gets a course.json holding the course structure, the
+state, size, hash and media of every module, and generation timings. It is
+rewritten atomically after every change, so readers can get a course's
+titles, order and progress from one small file instead of parsing the
+module markdown.
+
+A generation run and a module regeneration may update the same folder's
+manifest at once. Each CourseManifest tracks which fields and modules it
+changed, and save() merges just those into the folder's latest document
+under a per-folder lock, so one writer never drops the other's updates.
+"""
+import copy
+import json
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+COURSE_MANIFEST = "course.json"
+MANIFEST_VERSION = 1
+
+def course_manifest_path(course_directory: Path) -> Path:
+    return Path(course_directory) / COURSE_MANIFEST
+
+def load_course_manifest(course_directory: Path) -> Optional[Dict[str, Any]]:
+    """The course.json of a topic folder, or None if it has none"""
+    try:
+        with open(course_manifest_path(course_directory), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+# Per-folder locks and the latest document queued for each course.json,
+# which is newer than the file while the write is still queued
+_folder_locks: Dict[Path, threading.Lock] = {}
+_latest: Dict[Path, Dict[str, Any]] = {}
+_registry_lock = threading.Lock()
+
+def _folder_lock(path: Path) -> threading.Lock:
+    with _registry_lock:
+        return _folder_locks.setdefault(path, threading.Lock())
+
+def _current_document(path: Path) -> Optional[Dict[str, Any]]:
+    """The newest version of a course.json: queued in this process, else on disk"""
+    latest = _latest.get(path)
+    if latest is not None:
+        return copy.deepcopy(latest)
+    return load_course_manifest(path.parent)
+
+def _media_summary(media_data: Optional[Dict]) -> Dict[str, List[Dict[str, str]]]:
+    """Keep only what identifies each media item"""
+    media_data = media_data or {}
+    return {
+        kind: [{"url": item.get("url", ""), "title": item.get("title", "")} for item in media_data.get(kind, [])]
+        for kind in ("images", "videos")
+    }
+
+class CourseManifest:
+    """Builds and atomically persists course.json for one topic folder"""
+
+    def __init__(self, course_directory: Path, topic: str = ""):
+        self.path = course_manifest_path(course_directory).resolve()
+        self._lock = threading.Lock()
+        # Top-level fields and module filenames this instance changed since its last save
+        self._changed_fields: set = set()
+        self._changed_modules: set = set()
+        with _folder_lock(self.path):
+            current = _current_document(self.path)
+        self.data: Dict[str, Any] = current or {
+            "version": MANIFEST_VERSION,
+            "topic": topic,
+            "topic_folder": Path(course_directory).name,
+            "created_at": time.time(),
+            "status": "pending",
+            "modules": [],
+            "timings": {}
+        }
+
+    @property
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _changed(self, *fields: str):
+        self._changed_fields.update(fields)
+
+    def begin(self, session_id: Optional[str] = None):
+        """Mark the start of a generation run"""
+        now = time.time()
+        self.data.update({"session_id": session_id, "status": "generating", "started_at": now})
+        self.data.pop("completed_at", None)
+        self.data["timings"] = {}
+        self._changed("session_id", "status", "started_at", "completed_at", "timings")
+
+    def _merge(self, current: Dict[str, Any]) -> Dict[str, Any]:
+        """current with this instance's changes applied"""
+        merged = current
+        for field in self._changed_fields:
+            if field in self.data:
+                merged[field] = copy.deepcopy(self.data[field])
+            else:
+                merged.pop(field, None)
+        if "modules" not in self._changed_fields:
+            ours = {m["filename"]: m for m in self.data["modules"] if m["filename"] in self._changed_modules}
+            modules = merged.setdefault("modules", [])
+            for index, module in enumerate(modules):
+                if module["filename"] in ours:
+                    modules[index] = copy.deepcopy(ours.pop(module["filename"]))
+            modules.extend(copy.deepcopy(module) for module in ours.values())
+        return merged
+
+    def save(self) -> Future:
+        """Queue an atomic write of course.json (temp file, fsync, rename)
+
+        This instance's changes are merged into the folder's latest
+        document, which then becomes this instance's data. Saves in quick
+        succession are merged by the course writer. The returned future
+        resolves once the file is on disk; callers that promise durability
+        wait on it, and failed writes are logged either way.
+        """
+        from course_writer import get_course_writer
+
+        with _folder_lock(self.path), self._lock:
+            current = _current_document(self.path)
+            if current is not None:
+                self.data = self._merge(current)
+            self._changed_fields.clear()
+            self._changed_modules.clear()
+            self.data["updated_at"] = time.time()
+            document = copy.deepcopy(self.data)
+            data = json.dumps(document, indent=2, ensure_ascii=False).encode("utf-8")
+            _latest[self.path] = document
+            # Submitted under the folder lock so the writer sees saves in merge order
+            future = get_course_writer().submit(self.path, data, versioned=False)
+        future.add_done_callback(lambda done: self._written(document, done))
+        return future
+
+    def _written(self, document: Dict[str, Any], future: Future):
+        """Forget the queued copy once it is on disk, unless a newer save replaced it"""
+        error = future.exception()
+        if error is not None:
+            # Kept as the latest document, so the next save includes it again
+            print(f"❌ Failed to write {self.path}: {error}")
+            return
+        with _registry_lock:
+            if _latest.get(self.path) is document:
+                del _latest[self.path]
+
+    # Updates
+
+    def set_structure(self, course_structure: Dict[str, Any], parse_error: Optional[str] = None):
+        """Record the course structure and reset module states to pending
+
+        parse_error is set when the generated structure could not be used
+        and the default structure was substituted.
+        """
+        modules = []
+        for number, module_info in enumerate(course_structure.get("modules", []), 1):
+            modules.append({
+                "number": number,
+                "filename": module_info.get("filename", f"module_{number:02d}.md"),
+                "title": module_info.get("title", f"Module {number}"),
+                "subtopics": module_info.get("subtopics", []),
+                "objectives": module_info.get("objectives", []),
+                "difficulty": module_info.get("difficulty"),
+                "status": "pending"
+            })
+        self.data["structure"] = {k: v for k, v in course_structure.items() if k != "modules"}
+        self.data["structure_source"] = "default" if parse_error else "generated"
+        if parse_error:
+            self.data["structure_parse_error"] = parse_error
+        else:
+            self.data.pop("structure_parse_error", None)
+        self.data["modules"] = modules
+        self._changed("structure", "structure_source", "structure_parse_error", "modules")
+
+    def _module(self, number: Optional[int] = None, filename: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        for module in self.data["modules"]:
+            if module["number"] == number or (filename and module["filename"] == filename):
+                return module
+        return None
+
+    def get_module(self, number: Optional[int] = None, filename: Optional[str] = None) -> Dict[str, Any]:
+        """A copy of a module's record (empty if the module is not listed)"""
+        return dict(self._module(number, filename) or {})
+
+    def module_started(self, number: int):
+        module = self._module(number)
+        if module:
+            module.update({"status": "generating", "started_at": time.time()})
+            module.pop("error", None)
+            self._changed_modules.add(module["filename"])
+
+    def module_completed(self, number: Optional[int], filename: str, size: int, content_hash: str,
+                         media_data: Optional[Dict] = None):
+        module = self._module(number, filename)
+        if module is None:
+            return
+        now = time.time()
+        if module["status"] == "generating":
+            module["duration_seconds"] = round(now - module.get("started_at", now), 3)
+        module.update({
+            "status": "completed",
+            "size": size,
+            "content_hash": content_hash,
+            "completed_at": now
+        })
+        if media_data is not None:
+            module["media"] = _media_summary(media_data)
+        self._changed_modules.add(module["filename"])
+
+    def module_failed(self, number: int, error: str):
+        module = self._module(number)
+        if module:
+            module.update({"status": "failed", "error": error, "completed_at": time.time()})
+            self._changed_modules.add(module["filename"])
+
+    def set_timing(self, name: str, seconds: float):
+        self.data["timings"][name] = round(seconds, 3)
+        self._changed("timings")
+
+    def finish(self, status: str = "completed"):
+        self.data["status"] = status
+        self.data["completed_at"] = time.time()
+        self.data["timings"]["total_seconds"] = round(self.data["completed_at"] - self.data.get("started_at", self.data["created_at"]), 3)
+        self._changed("status", "completed_at", "timings")
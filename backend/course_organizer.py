@@ -0,0 +1,164 @@
+"""
+Incremental organizer that sorts root-level course files into topic folders.
+
+Files are classified in a single pass over their names, and every file
+placed in a topic folder is recorded in course_content/.organized.json
+together with the size and mtime it had. Later runs only act on root files
+that are new or changed since then, so re-organizing a large, already
+organized corpus is a directory listing plus a manifest read.
+
+Files are renamed into their topic folder (with their sidecar and
+precompressed siblings), which touches no file data; the catalog still
+finds them under their legacy root filename. With move=False they are
+copied instead and the root copy is kept, for clients that read
+course_content/ directly; that costs a second copy of every file unless
+the filesystem supports reflinks.
+"""
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+
+from blob_store import BlobStore, get_blob_store
+from content_normalizer import move_derived_files
+
+ORGANIZED_MANIFEST = ".organized.json"
+
+# Extract topic from filename (e.g., "matlab_module" from "02_matlab_module_2.md")
+TOPIC_PATTERN = re.compile(r'(\d+)_([a-zA-Z0-9_]+)_')
+
+ROADMAP_MARKERS = ("introduction_roadmap", "expert_roadmap")
+
+def classify(filenames: List[str]) -> Dict[str, str]:
+    """Map each filename to its topic folder in one pass
+
+    Names matching TOPIC_PATTERN use the captured topic. Roadmap files
+    without a topic in their name go with the first topic found (in sorted
+    filename order), and everything else goes to "general".
+    """
+    assignments: Dict[str, Optional[str]] = {}
+    first_topic = None
+    for name in sorted(filenames):
+        match = TOPIC_PATTERN.search(name)
+        if match:
+            assignments[name] = match.group(2)
+            first_topic = first_topic or match.group(2)
+        elif any(marker in name for marker in ROADMAP_MARKERS):
+            assignments[name] = None
+        else:
+            assignments[name] = "general"
+    return {name: topic or first_topic or "general" for name, topic in assignments.items()}
+
+class CourseOrganizer:
+    """Places root-level course files into topic folders, remembering what it did"""
+
+    def __init__(self, root: str = "course_content", blob_store: Optional[BlobStore] = None, move: bool = True):
+        self.root = Path(root)
+        self.blob_store = blob_store or get_blob_store()
+        self.move = move
+        self.manifest_path = self.root / ORGANIZED_MANIFEST
+
+    def load_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"files": {}}
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        temp = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp, self.manifest_path)
+
+    def _root_files(self) -> Dict[str, os.stat_result]:
+        """Root-level markdown files and their stat results, from one directory scan"""
+        files = {}
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name.endswith(".md") and entry.is_file():
+                    files[entry.name] = entry.stat()
+        return files
+
+    def plan(self, full: bool = False) -> Dict[str, Any]:
+        """Work out which root files need placing (all of them when full=True)"""
+        manifest = self.load_manifest()
+        root_files = self._root_files()
+        topics = classify(list(root_files))
+
+        pending: Dict[str, str] = {}
+        for name, stat in root_files.items():
+            record = manifest["files"].get(name)
+            unchanged = (
+                record is not None
+                and record["topic"] == topics[name]
+                and record["size"] == stat.st_size
+                and record["mtime_ns"] == stat.st_mtime_ns
+            )
+            # In move mode every file still in the root needs placing
+            if full or self.move or not unchanged:
+                pending[name] = topics[name]
+
+        return {"manifest": manifest, "topics": topics, "pending": pending}
+
+    def organize(self, dry_run: bool = False, full: bool = False) -> Dict[str, Any]:
+        """Place new and changed root files into their topic folders"""
+        if not self.root.exists():
+            return {"status": "error", "message": "Course directory not found"}
+
+        plan = self.plan(full)
+        pending = plan["pending"]
+        moved_topics = sorted(set(pending.values()))
+
+        if dry_run:
+            return {
+                "status": "dry_run",
+                "message": f"Would organize {len(pending)} files into {len(moved_topics)} topic folders",
+                "topics": moved_topics,
+                "pending": pending,
+                "skipped": len(plan["topics"]) - len(pending)
+            }
+
+        manifest = plan["manifest"]
+        changes: List[Tuple[Path, Path]] = []
+        for name, topic in sorted(pending.items()):
+            changes.append((self.root / name, self.root / topic / name))
+            (self.root / topic).mkdir(exist_ok=True)
+
+        # One manifest update per topic folder for the whole batch
+        if self.move:
+            self.blob_store.move_many(changes)
+            for source, target in changes:
+                move_derived_files(source, target)
+                manifest["files"].pop(source.name, None)
+        else:
+            self.blob_store.copy_many(changes)
+            now = time.time()
+            for source, target in changes:
+                # Recorded after copying: ingesting a file may bump its mtime
+                stat = source.stat()
+                manifest["files"][source.name] = {
+                    "topic": target.parent.name,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "organized_at": now
+                }
+
+        # Forget files that have since been removed from the root
+        removed = set(manifest["files"]) - set(plan["topics"])
+        for name in removed:
+            del manifest["files"][name]
+
+        if changes or removed:
+            self._save_manifest(manifest)
+
+        return {
+            "status": "success",
+            "message": f"Organized {len(changes)} files into {len(moved_topics)} topic folders",
+            "topics": moved_topics,
+            "organized": len(changes),
+            "skipped": len(plan["topics"]) - len(changes),
+            "changes": [(str(source), str(target)) for source, target in changes]
+        }
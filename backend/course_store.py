@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed course store with full-text search.
+
+Keeps modules, course structure JSON, media records and module metadata in
+a single SQLite database (WAL mode) with an FTS5 index over module titles
+and content. The markdown folder layout under course_content/ remains the
+primary format: this store can be filled from it (import) and written back
+to it (export).
+"""
+import argparse
+import html
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+from content_normalizer import clean_course_markdown, extract_title, build_metadata, content_hash
+from course_manifest import CourseManifest, load_course_manifest
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    topic_folder TEXT PRIMARY KEY,
+    topic TEXT NOT NULL DEFAULT '',
+    structure TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS modules (
+    id INTEGER PRIMARY KEY,
+    topic_folder TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    word_count INTEGER NOT NULL DEFAULT 0,
+    metadata TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE(topic_folder, filename)
+);
+
+CREATE TABLE IF NOT EXISTS media (
+    id INTEGER PRIMARY KEY,
+    topic_folder TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    UNIQUE(topic_folder, filename, kind, url)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS module_fts USING fts5(
+    title, content,
+    content='modules', content_rowid='id',
+    tokenize='porter unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS modules_ai AFTER INSERT ON modules BEGIN
+    INSERT INTO module_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS modules_ad AFTER DELETE ON modules BEGIN
+    INSERT INTO module_fts(module_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS modules_au AFTER UPDATE ON modules BEGIN
+    INSERT INTO module_fts(module_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    INSERT INTO module_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+END;
+"""
+
+# Root-level files (not in a topic folder) are stored under this folder name
+ROOT_FOLDER = ""
+
+# Snippet highlight markers: control characters that can't occur in the
+# indexed markdown, swapped for <mark> tags once the text is escaped
+_MARK_START, _MARK_END = "\x02", "\x03"
+
+def _highlight(snippet: str) -> str:
+    """Snippet as HTML: module text escaped, matched terms in <mark> tags"""
+    return html.escape(snippet or "").replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+class CourseStore:
+    """SQLite storage engine for generated courses"""
+
+    def __init__(self, db_path: str = "course_store.db"):
+        self.db_path = str(db_path)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        with self._lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    # Writes
+
+    def _touch_course(self, topic_folder: str, topic: str = ""):
+        now = time.time()
+        self.conn.execute(
+            """INSERT INTO courses(topic_folder, topic, created_at, updated_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(topic_folder) DO UPDATE SET updated_at=excluded.updated_at,
+               topic=CASE WHEN excluded.topic != '' THEN excluded.topic ELSE courses.topic END""",
+            (topic_folder, topic, now, now)
+        )
+
+    def save_structure(self, topic_folder: str, structure: Dict[str, Any], topic: str = ""):
+        """Store the course structure JSON for a topic folder"""
+        with self._lock, self.conn:
+            self._touch_course(topic_folder, topic)
+            self.conn.execute("UPDATE courses SET structure = ? WHERE topic_folder = ?",
+                              (json.dumps(structure), topic_folder))
+
+    def upsert_module(self, topic_folder: Optional[str], filename: str, content: str,
+                      metadata: Optional[Dict[str, Any]] = None):
+        """Insert or update a module's content and metadata"""
+        topic_folder = topic_folder or ROOT_FOLDER
+        metadata = metadata or build_metadata(content, filename)
+        data = content.encode("utf-8")
+        with self._lock, self.conn:
+            self._touch_course(topic_folder)
+            self.conn.execute(
+                """INSERT INTO modules(topic_folder, filename, title, content, content_hash, size, word_count, metadata, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(topic_folder, filename) DO UPDATE SET title=excluded.title, content=excluded.content,
+                   content_hash=excluded.content_hash, size=excluded.size, word_count=excluded.word_count,
+                   metadata=excluded.metadata, updated_at=excluded.updated_at
+                   WHERE modules.content_hash != excluded.content_hash""",
+                (topic_folder, filename, metadata.get("title") or extract_title(content, Path(filename).stem),
+                 content, content_hash(data), len(data), metadata.get("word_count", 0),
+                 json.dumps(metadata), time.time())
+            )
+
+    def save_media(self, topic_folder: Optional[str], filename: str, media_data: Dict[str, Any]):
+        """Replace the media records attached to a module"""
+        topic_folder = topic_folder or ROOT_FOLDER
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM media WHERE topic_folder = ? AND filename = ?", (topic_folder, filename))
+            for kind in ("images", "videos"):
+                for item in media_data.get(kind, []):
+                    if not item.get("url"):
+                        continue
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO media(topic_folder, filename, kind, url, title, data) VALUES (?, ?, ?, ?, ?, ?)",
+                        (topic_folder, filename, kind.rstrip("s"), item["url"], item.get("title", ""), json.dumps(item))
+                    )
+
+    def delete_module(self, topic_folder: Optional[str], filename: str):
+        topic_folder = topic_folder or ROOT_FOLDER
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM modules WHERE topic_folder = ? AND filename = ?", (topic_folder, filename))
+            self.conn.execute("DELETE FROM media WHERE topic_folder = ? AND filename = ?", (topic_folder, filename))
+
+    # Reads
+
+    @staticmethod
+    def _match_expression(query: str, operator: str) -> str:
+        tokens = re.findall(r"\w+", query.lower())
+        return f" {operator} ".join(f'"{t}"' for t in tokens)
+
+    def search(self, query: str, limit: int = 20, topic_folder: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Ranked full-text search over module titles and content
+
+        All terms must match; if nothing does, any-term matches are returned.
+        """
+        results: List[Dict[str, Any]] = []
+        for operator in ("AND", "OR"):
+            match = self._match_expression(query, operator)
+            if not match:
+                return []
+            sql = """
+                SELECT m.topic_folder, m.filename, m.title, m.size, m.updated_at,
+                       snippet(module_fts, 1, ?, ?, '…', 16) AS snippet,
+                       bm25(module_fts, 5.0, 1.0) AS score
+                FROM module_fts JOIN modules m ON m.id = module_fts.rowid
+                WHERE module_fts MATCH ?
+            """
+            params: List[Any] = [_MARK_START, _MARK_END, match]
+            if topic_folder is not None:
+                sql += " AND m.topic_folder = ?"
+                params.append(topic_folder)
+            sql += " ORDER BY score LIMIT ?"
+            params.append(limit)
+
+            with self._lock:
+                rows = self.conn.execute(sql, params).fetchall()
+            results = [
+                {
+                    "topic_folder": row["topic_folder"] or None,
+                    "filename": row["filename"],
+                    "title": row["title"],
+                    "snippet": _highlight(row["snippet"]),
+                    "score": round(-row["score"], 4),
+                    "size": row["size"],
+                    "updated_at": row["updated_at"]
+                }
+                for row in rows
+            ]
+            if results:
+                break
+        return results
+
+    def get_module(self, topic_folder: Optional[str], filename: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM modules WHERE topic_folder = ? AND filename = ?",
+                                    (topic_folder or ROOT_FOLDER, filename)).fetchone()
+        return dict(row) if row else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "courses": self.conn.execute("SELECT COUNT(*) FROM courses").fetchone()[0],
+                "modules": self.conn.execute("SELECT COUNT(*) FROM modules").fetchone()[0],
+                "media": self.conn.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+            }
+
+    # Import / export
+
+    def import_folder(self, root: str = "course_content", prune: bool = False) -> Dict[str, int]:
+        """Load every module from the markdown folder layout
+
+        With prune=True, modules no longer present on disk are removed, so
+        the store follows files that were moved or deleted.
+        """
+        root = Path(root)
+        counts = {"modules": 0, "structures": 0, "pruned": 0}
+        seen = set()
+        md_files = list(root.glob("*.md")) + list(root.glob("*/*.md"))
+        for md_file in md_files:
+            topic_folder = md_file.parent.name if md_file.parent != root else ROOT_FOLDER
+            content = clean_course_markdown(md_file.read_text(encoding="utf-8", errors="replace"))
+            self.upsert_module(topic_folder, md_file.name, content)
+            seen.add((topic_folder, md_file.name))
+            counts["modules"] += 1
+
+        if prune:
+            with self._lock:
+                rows = self.conn.execute("SELECT topic_folder, filename FROM modules").fetchall()
+            for row in rows:
+                if (row["topic_folder"], row["filename"]) not in seen:
+                    self.delete_module(row["topic_folder"], row["filename"])
+                    counts["pruned"] += 1
+
+        for manifest_file in root.glob("*/course.json"):
+            manifest = load_course_manifest(manifest_file.parent)
+            if not manifest or "structure" not in manifest:
+                continue
+            structure = dict(manifest["structure"], modules=[
+                {key: module[key] for key in ("filename", "title", "subtopics", "objectives", "difficulty") if key in module}
+                for module in manifest.get("modules", [])
+            ])
+            self.save_structure(manifest_file.parent.name, structure, manifest.get("topic", ""))
+            counts["structures"] += 1
+
+        return counts
+
+    def export_folder(self, root: str) -> Dict[str, int]:
+        """Write the store back out in the course_content/ folder layout
+
+        Course structures go into each topic folder's course.json (see
+        course_manifest.py), with the exported modules marked completed.
+        """
+        root = Path(root)
+        counts = {"modules": 0, "structures": 0}
+        with self._lock:
+            modules = self.conn.execute(
+                "SELECT topic_folder, filename, content, content_hash, size FROM modules").fetchall()
+            structures = self.conn.execute(
+                "SELECT topic_folder, topic, structure FROM courses WHERE structure IS NOT NULL").fetchall()
+            media = self.conn.execute("SELECT topic_folder, filename, kind, data FROM media ORDER BY id").fetchall()
+
+        for row in modules:
+            folder = root / row["topic_folder"] if row["topic_folder"] else root
+            folder.mkdir(parents=True, exist_ok=True)
+            with open(folder / row["filename"], "w", encoding="utf-8") as f:
+                f.write(row["content"])
+            counts["modules"] += 1
+
+        media_by_module: Dict[tuple, Dict[str, List[Dict[str, Any]]]] = {}
+        for row in media:
+            module_media = media_by_module.setdefault((row["topic_folder"], row["filename"]), {"images": [], "videos": []})
+            module_media[f"{row['kind']}s"].append(json.loads(row["data"]))
+
+        saves = []
+        for row in structures:
+            if not row["topic_folder"]:
+                continue
+            folder = root / row["topic_folder"]
+            folder.mkdir(parents=True, exist_ok=True)
+            manifest = CourseManifest(folder, row["topic"])
+            manifest.set_structure(json.loads(row["structure"]))
+            for module in modules:
+                if module["topic_folder"] == row["topic_folder"]:
+                    manifest.module_completed(None, module["filename"], module["size"], module["content_hash"],
+                                              media_by_module.get((module["topic_folder"], module["filename"])))
+            manifest.finish()
+            saves.append(manifest.save())
+            counts["structures"] += 1
+        for future in saves:
+            future.result()
+
+        return counts
+
+# Global store instance (opened on first use)
+_store: Optional[CourseStore] = None
+_store_lock = threading.Lock()
+
+def get_course_store() -> Optional[CourseStore]:
+    """The SQLite course store, or None when COURSE_STORE is not 'sqlite'"""
+    global _store
+    from config import get_config
+    config = get_config()
+    if config.course_store_backend != "sqlite":
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CourseStore(config.course_db_path)
+    return _store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the SQLite course store")
+    parser.add_argument("--db", help="Database path (default: COURSE_DB_PATH)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Import the course_content/ folder layout")
+    import_parser.add_argument("--root", default="course_content")
+
+    export_parser = subparsers.add_parser("export", help="Export the store as a course_content/ folder layout")
+    export_parser.add_argument("--out", required=True)
+
+    search_parser = subparsers.add_parser("search", help="Full-text search")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=10)
+
+    args = parser.parse_args()
+    if args.db is None:
+        from config import get_config
+        args.db = get_config().course_db_path
+    store = CourseStore(args.db)
+
+    if args.command == "import":
+        counts = store.import_folder(args.root)
+        print(f"✅ Imported {counts['modules']} modules and {counts['structures']} course structures from {args.root}")
+    elif args.command == "export":
+        counts = store.export_folder(args.out)
+        print(f"✅ Exported {counts['modules']} modules and {counts['structures']} course structures to {args.out}")
+    else:
+        for result in store.search(args.query, args.limit):
+            print(f"[{result['score']}] {result['topic_folder'] or '(root)'}/{result['filename']}: {result['title']}")
+            print(f"    {result['snippet']}")
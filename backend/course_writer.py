@@ -0,0 +1,145 @@
+"""
+Write-behind writer for course files.
+
+Module saves are queued and written by one background thread in small
+batches: every file in a batch goes to a temp file, the batch is fsynced
+together, then the files are renamed into place under their topic lock
+(see BlobStore.write_many). A write to a path that is still queued replaces
+the queued bytes instead of adding a second write, so rapid re-saves of the
+same module cost one disk write.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from blob_store import BlobStore, get_blob_store
+
+class CourseFileWriter:
+    """Queues course file writes and flushes them in fsync-grouped batches"""
+
+    def __init__(self, blob_store: Optional[BlobStore] = None, batch_window: float = 0.005, max_batch: int = 64):
+        self.blob_store = blob_store or get_blob_store()
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._pending: "OrderedDict[Path, Tuple[bytes, bool, Future]]" = OrderedDict()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._busy = False
+        self._stats = {"submitted": 0, "written": 0, "coalesced": 0, "batches": 0, "errors": 0, "max_batch": 0}
+        self._thread = threading.Thread(target=self._run, name="course-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: Path, data: bytes, versioned: bool = True) -> Future:
+        """Queue a write; the returned future resolves to the blob digest (or None)"""
+        path = Path(path)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Course writer is closed")
+            self._stats["submitted"] += 1
+            queued = self._pending.get(path)
+            if queued is not None:
+                # Not started yet: the newer bytes win and both callers share one write
+                self._pending[path] = (data, versioned or queued[1], queued[2])
+                self._stats["coalesced"] += 1
+                return queued[2]
+            future: Future = Future()
+            self._pending[path] = (data, versioned, future)
+            self._condition.notify()
+            return future
+
+    def write(self, path: Path, data: bytes, versioned: bool = True, timeout: Optional[float] = None) -> Optional[str]:
+        """Queue a write and wait until it is durable"""
+        return self.submit(path, data, versioned).result(timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far has been written"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._pending or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Write what is queued and stop the writer thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _take_batch(self) -> List[Tuple[Path, bytes, bool, Future]]:
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if not self._pending:
+                return []
+            # Give closely spaced writes a moment to join the batch
+            if len(self._pending) < self.max_batch and not self._closed:
+                self._condition.wait(self.batch_window)
+            batch = []
+            while self._pending and len(batch) < self.max_batch:
+                path, (data, versioned, future) = self._pending.popitem(last=False)
+                batch.append((path, data, versioned, future))
+            self._busy = True
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            futures = [item[3] for item in batch]
+            try:
+                results = self.blob_store.write_many([(path, data, versioned) for path, data, versioned, _ in batch])
+            except Exception as e:
+                print(f"❌ Course write batch failed: {e}")
+                results = None
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            with self._condition:
+                self._busy = False
+                self._stats["batches"] += 1
+                self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+                if results is None:
+                    self._stats["errors"] += len(batch)
+                else:
+                    self._stats["written"] += len(batch)
+                self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        stats["fsync"] = self.blob_store.fsync
+        stats["batch_window_ms"] = self.batch_window * 1000
+        return stats
+
+# Global writer instance
+_course_writer: Optional[CourseFileWriter] = None
+_course_writer_lock = threading.Lock()
+
+def get_course_writer() -> CourseFileWriter:
+    """Get the shared course file writer (batching from COURSE_WRITE_BATCH_MS)"""
+    global _course_writer
+    if _course_writer is None:
+        with _course_writer_lock:
+            if _course_writer is None:
+                from config import get_config
+                _course_writer = CourseFileWriter(batch_window=get_config().course_write_batch_ms / 1000)
+    return _course_writer
+
+def close_course_writer():
+    """Flush and stop the shared writer, if it was started"""
+    global _course_writer
+    with _course_writer_lock:
+        if _course_writer is not None:
+            _course_writer.close()
+            _course_writer = None
@@ -0,0 +1,201 @@
+"""
+HTTP caching helpers: ETags, conditional requests, byte ranges and compression
+"""
+import gzip
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, HTTPException
+from fastapi.responses import Response, FileResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+def quote_etag(value: str) -> str:
+    """Format a strong ETag header value"""
+    return value if value.startswith('"') else f'"{value}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match covers this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    etag = quote_etag(etag)
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": quote_etag(etag), "Cache-Control": cache_control})
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range 'bytes=' header into an inclusive (start, end)
+
+    Returns None when the header is absent or not a single byte range, and
+    raises 416 when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text == "":
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+def cached_file_response(request: Request, path: Path, media_type: str, etag: str,
+                         cache_control: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serve a file with ETag, Cache-Control, 304 and single-range support"""
+    response_headers = {
+        "ETag": quote_etag(etag),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes"
+    }
+    response_headers.update(headers or {})
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=response_headers)
+
+    size = os.stat(path).st_size
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == quote_etag(etag):
+        byte_range = parse_range(request.headers.get("range"), size)
+
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=response_headers)
+
+    start, end = byte_range
+    with open(path, "rb") as f:
+        f.seek(start)
+        body = f.read(end - start + 1)
+    response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(content=body, status_code=206, media_type=media_type, headers=response_headers)
+
+def negotiate_encoding(request: Request) -> Optional[str]:
+    """Pick br or gzip from Accept-Encoding (br only when brotli is installed)"""
+    header = request.headers.get("accept-encoding", "")
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """Distinct strong ETag per content coding, e.g. "abc-gzip" """
+    etag = etag.strip('"')
+    return quote_etag(f"{etag}-{encoding}" if encoding else etag)
+
+def json_response(request: Request, payload: Any, etag: str, cache_control: str = "no-cache",
+                  encoded_cache: Optional[Dict[Tuple[str, Optional[str]], Tuple[Optional[str], bytes]]] = None) -> Response:
+    """JSON response with a strong ETag, 304 support and gzip/brotli negotiation
+
+    payload may be a zero-argument callable so it is only built on a cache
+    miss. encoded_cache, when given, memoizes bodies by (etag, negotiated
+    encoding) so large unchanged payloads are only serialized and compressed
+    once. Each value records the coding actually applied, which is none for
+    bodies below the compression threshold.
+    """
+    encoding = negotiate_encoding(request)
+    base_etag = etag.strip('"')
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+    # A cached copy under any coding of the same representation is still fresh
+    if any(etag_matches(request, encoded_etag(base_etag, e)) for e in (None, "gzip", "br")):
+        headers["ETag"] = encoded_etag(base_etag, encoding)
+        return Response(status_code=304, headers=headers)
+
+    cache_key = (base_etag, encoding)
+    cached = encoded_cache.get(cache_key) if encoded_cache is not None else None
+    if cached is not None:
+        encoding, body = cached
+    else:
+        if callable(payload):
+            payload = payload()
+        raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(raw) < MIN_COMPRESS_BYTES:
+            encoding = None
+        body = compress(raw, encoding)
+        if encoded_cache is not None:
+            if len(encoded_cache) >= 8:
+                encoded_cache.clear()
+            encoded_cache[cache_key] = (encoding, body)
+
+    headers["ETag"] = encoded_etag(base_etag, encoding)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def precompressed_file_response(request: Request, path: Path, media_type: str, etag: str,
+                                cache_control: str) -> Response:
+    """Serve a file, or its precompressed .gz/.br sibling when the client accepts it
+
+    Siblings that are missing or older than the file are rebuilt first, so
+    callers should run this off the event loop. Each coding has its own
+    ETag, and Range requests apply to the coded bytes being sent.
+    """
+    from content_normalizer import is_precompressed_fresh, precompressed_path, write_precompressed, MIN_PRECOMPRESS_BYTES
+
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(request)
+
+    # A cached copy under any coding of the same content is still fresh
+    if any(etag_matches(request, encoded_etag(etag, e)) for e in (None, "gzip", "br")):
+        headers.update({"ETag": encoded_etag(etag, encoding), "Cache-Control": cache_control})
+        return Response(status_code=304, headers=headers)
+
+    if encoding and os.stat(path).st_size >= MIN_PRECOMPRESS_BYTES:
+        if not is_precompressed_fresh(path, encoding):
+            write_precompressed(path)
+        sibling = precompressed_path(path, encoding)
+        if sibling.exists():
+            headers["Content-Encoding"] = encoding
+            return cached_file_response(request, sibling, media_type, encoded_etag(etag, encoding),
+                                        cache_control, headers)
+
+    return cached_file_response(request, path, media_type, etag, cache_control, headers)
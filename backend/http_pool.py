@@ -0,0 +1,264 @@
+"""
+Pooled HTTP client for media search and downloads
+"""
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterable, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, EmptyPoolError, NewConnectionError
+from urllib3.util.retry import Retry
+
+from config import get_config
+
+# Hosts used by the media tools. DNS answers for these are cached and the
+# pool is warmed against them at startup.
+MEDIA_HOSTS = ("www.googleapis.com",)
+
+class DNSCache:
+    """TTL cache of DNS answers for a fixed set of hosts, used by the media pool's connections only
+
+    Also lets a thread pin a host to addresses it has already checked (see
+    pinned()), so a connection can't be pointed elsewhere by a second lookup.
+    """
+
+    def __init__(self, ttl: int = 300, hosts: Iterable[str] = MEDIA_HOSTS):
+        self.ttl = ttl
+        self.hosts = set(hosts)
+        self._entries: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._lock = threading.Lock()
+        self._pins = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def addresses(self, host: str, port: int) -> Optional[List[str]]:
+        """Addresses to connect to, or None to let the connection resolve host itself"""
+        pins = getattr(self._pins, "hosts", None)
+        if pins and host in pins:
+            return pins[host]
+        if host not in self.hosts or self.ttl <= 0:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((host, port))
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        result = list(dict.fromkeys(info[4][0] for info in infos))
+        with self._lock:
+            self.misses += 1
+            self._entries[(host, port)] = (now + self.ttl, result)
+        return result
+
+    @contextmanager
+    def pinned(self, host: str, addresses: List[str]):
+        """Resolve host to these addresses only, in this thread, while inside the block"""
+        previous = getattr(self._pins, "hosts", None)
+        self._pins.hosts = dict(previous or {}, **{host: list(addresses)})
+        try:
+            yield
+        finally:
+            self._pins.hosts = previous
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "ttl": self.ttl,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+class _CachedDNSConnection:
+    """Connection mixin that connects to the DNS cache's addresses for its host
+
+    The host name itself is kept for the Host header, SNI and certificate
+    checks; only the address the socket connects to comes from the cache.
+    """
+    dns_cache: DNSCache
+
+    def _new_conn(self):
+        host = self._dns_host
+        addresses = self.dns_cache.addresses(host, self.port)
+        if not addresses:
+            return super()._new_conn()
+        error = None
+        for address in addresses:
+            self._dns_host = address
+            try:
+                return super()._new_conn()
+            except (ConnectTimeoutError, NewConnectionError) as e:
+                error = e
+            finally:
+                self._dns_host = host
+        raise error
+
+class _BoundedWaitPool:
+    """Connection pool mixin: wait at most pool_timeout seconds for a free connection
+
+    With a blocking pool and no limit, a connection that is never returned
+    would make every later request to that host wait forever.
+    """
+    pool_timeout: Optional[float] = None
+
+    def _get_conn(self, timeout: Optional[float] = None):
+        return super()._get_conn(self.pool_timeout if timeout is None else timeout)
+
+class MediaHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools use the client's DNS cache and a bounded wait for connections"""
+
+    def __init__(self, dns_cache: DNSCache, pool_timeout: Optional[float] = None, **kwargs):
+        mixins = {"dns_cache": dns_cache}
+        connection_classes = {
+            "http": type("MediaHTTPConnection", (_CachedDNSConnection, HTTPConnection), mixins),
+            "https": type("MediaHTTPSConnection", (_CachedDNSConnection, HTTPSConnection), mixins)
+        }
+        self.pool_classes = {
+            scheme: type(f"Media{base.__name__}", (_BoundedWaitPool, base),
+                         {"ConnectionCls": connection_classes[scheme], "pool_timeout": pool_timeout})
+            for scheme, base in (("http", HTTPConnectionPool), ("https", HTTPSConnectionPool))
+        }
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.pool_classes
+
+class MediaHTTPClient:
+    """Shared keep-alive session with per-host connection limits"""
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 8,
+                 connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 max_retries: int = 2, dns_cache_ttl: int = 300, pool_timeout: float = 10.0):
+        self.timeout = (connect_timeout, read_timeout)
+        self.dns_cache = DNSCache(ttl=dns_cache_ttl)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.3,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+            raise_on_status=False
+        )
+        # pool_maxsize is enforced per host; pool_block makes callers wait (up
+        # to pool_timeout seconds) for a free connection instead of opening
+        # (and then discarding) extra ones.
+        self.adapter = MediaHTTPAdapter(
+            self.dns_cache,
+            pool_timeout,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+            max_retries=retry
+        )
+
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
+
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.errors = 0
+        self.warmed = False
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the shared pool"""
+        kwargs.setdefault("timeout", self.timeout)
+        with self._lock:
+            self.requests_sent += 1
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.errors += 1
+            raise
+        except EmptyPoolError as e:
+            # Every connection to the host stayed busy for pool_timeout seconds
+            with self._lock:
+                self.errors += 1
+            raise requests.ConnectionError(e) from e
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def warm(self, hosts: Iterable[str] = MEDIA_HOSTS):
+        """Open a connection to each media host so the first search skips the TLS handshake"""
+        for host in hosts:
+            try:
+                self.request("HEAD", f"https://{host}/", allow_redirects=False)
+            except requests.RequestException as e:
+                print(f"⚠️ Could not warm connection to {host}: {e}")
+        self.warmed = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Connection reuse statistics per host pool"""
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            connections = pool.num_connections
+            requests_made = pool.num_requests
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": connections,
+                "requests": requests_made,
+                "reused": max(requests_made - connections, 0),
+                "idle": sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool is not None else 0
+            }
+
+        total_connections = sum(h["connections_opened"] for h in hosts.values())
+        total_requests = sum(h["requests"] for h in hosts.values())
+        return {
+            "warmed": self.warmed,
+            "requests_sent": self.requests_sent,
+            "errors": self.errors,
+            "connections_opened": total_connections,
+            "reuse_ratio": round(1 - total_connections / total_requests, 3) if total_requests else 0.0,
+            "timeout": {"connect": self.timeout[0], "read": self.timeout[1], "pool": self.adapter.pool_classes["https"].pool_timeout},
+            "hosts": hosts,
+            "dns_cache": self.dns_cache.get_stats()
+        }
+
+    def close(self):
+        self.session.close()
+
+# Global media client instance (created on first use)
+_media_client: Optional[MediaHTTPClient] = None
+_media_client_lock = threading.Lock()
+
+# Convenience functions
+def get_media_client() -> MediaHTTPClient:
+    """Get the shared media HTTP client"""
+    global _media_client
+    if _media_client is None:
+        with _media_client_lock:
+            if _media_client is None:
+                config = get_config()
+                _media_client = MediaHTTPClient(
+                    pool_connections=config.media_pool_connections,
+                    pool_maxsize=config.media_pool_maxsize,
+                    connect_timeout=config.media_connect_timeout,
+                    read_timeout=config.media_read_timeout,
+                    max_retries=config.media_max_retries,
+                    dns_cache_ttl=config.media_dns_cache_ttl,
+                    pool_timeout=config.media_pool_timeout
+                )
+    return _media_client
+
+def warm_media_client():
+    """Warm the shared media pool (safe to call from a worker thread)"""
+    get_media_client().warm()
+
+def get_media_client_stats() -> Dict[str, Any]:
+    """Connection reuse statistics for the shared media pool"""
+    return get_media_client().get_stats()
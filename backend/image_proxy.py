@@ -0,0 +1,349 @@
+"""
+Local image proxy cache for media embedded in generated courses.
+
+Each remote image is fetched once, resized and re-encoded (when Pillow is
+installed) and stored under media_cache/ in a content-addressed layout:
+
+    media_cache/objects/ab/cd/<sha256>.<ext>   image bytes
+    media_cache/urls/<sha256(url)>             digest and type of the cached copy
+    media_cache/sources/ab/<sha256>            URL an object was fetched from
+
+Only public hosts are fetched: every redirect hop is checked, and the
+connection is pinned to the addresses that were checked so a second DNS
+answer can't send it to a private one. When the objects outgrow the size
+limit, the least recently used ones are deleted; their source records are
+kept, so links rewritten to /api/media/<digest> can be refetched (see
+refetch()).
+"""
+import hashlib
+import io
+import ipaddress
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+from http_pool import get_media_client
+
+try:
+    from PIL import Image
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+MEDIA_TYPES = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "image/svg+xml": "svg"
+}
+
+MARKDOWN_IMAGE_PATTERN = re.compile(r'(!\[[^\]]*\]\()(https?://[^)\s]+)((?:\s+"[^"]*")?\))')
+
+MAX_REDIRECTS = 5
+
+class UnsafeURLError(ValueError):
+    """The URL is not http(s) or its host resolves to a non-public address"""
+
+def public_addresses(url: str) -> List[str]:
+    """Addresses of the URL's host; raises UnsafeURLError unless all of them are public"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise UnsafeURLError(f"Not an http(s) URL: {url}")
+    default_port = 443 if parsed.scheme == "https" else 80
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, parsed.port or default_port)}
+    except socket.gaierror:
+        raise UnsafeURLError(f"Cannot resolve {parsed.hostname}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if not ip.is_global or ip.is_multicast:
+            raise UnsafeURLError(f"{parsed.hostname} resolves to a non-public address")
+    return sorted(addresses)
+
+def is_public_url(url: str) -> bool:
+    """True for http(s) URLs whose host does not resolve to a private address"""
+    try:
+        public_addresses(url)
+        return True
+    except UnsafeURLError:
+        return False
+
+@dataclass
+class CachedImage:
+    """A cached image on disk"""
+    digest: str
+    media_type: str
+    path: Path
+    size: int
+
+class ImageProxyCache:
+    """Fetches remote images once and keeps a resized copy on disk"""
+
+    def __init__(self, cache_dir: str = "media_cache", max_dimension: int = 1280,
+                 jpeg_quality: int = 82, max_download_bytes: int = 15 * 1024 * 1024,
+                 max_cache_bytes: int = 1024 * 1024 * 1024, allow_private: bool = False):
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / "objects"
+        self.urls_dir = self.cache_dir / "urls"
+        self.sources_dir = self.cache_dir / "sources"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.urls_dir.mkdir(parents=True, exist_ok=True)
+        self.sources_dir.mkdir(parents=True, exist_ok=True)
+        self.max_dimension = max_dimension
+        self.jpeg_quality = jpeg_quality
+        self.max_download_bytes = max_download_bytes
+        self.max_cache_bytes = max_cache_bytes
+        self.allow_private = allow_private
+        self._url_locks: Dict[str, list] = {}
+        self._locks_guard = threading.Lock()
+        self._cache_bytes: Optional[int] = None
+        self._size_lock = threading.Lock()
+        self.evicted = 0
+
+    def _object_path(self, digest: str, media_type: str) -> Path:
+        ext = MEDIA_TYPES.get(media_type, "bin")
+        return self.objects_dir / digest[:2] / digest[2:4] / f"{digest}.{ext}"
+
+    def _url_record_path(self, url: str) -> Path:
+        return self.urls_dir / hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _source_record_path(self, digest: str) -> Path:
+        return self.sources_dir / digest[:2] / digest
+
+    def _write_atomic(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    @contextmanager
+    def _url_lock(self, url: str):
+        """Serialize fetches of one URL; the lock is dropped once nobody holds or waits for it"""
+        with self._locks_guard:
+            entry = self._url_locks.get(url)
+            if entry is None:
+                entry = self._url_locks[url] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._url_locks[url]
+
+    # Size limit
+
+    def _object_files(self) -> List[Path]:
+        return [path for path in self.objects_dir.glob("*/*/*") if not path.name.startswith(".tmp-")]
+
+    def _account(self, size: int):
+        """Count a newly stored object and evict if the cache is over its limit"""
+        with self._size_lock:
+            if self._cache_bytes is None:
+                self._cache_bytes = sum(path.stat().st_size for path in self._object_files())
+            else:
+                self._cache_bytes += size
+            if self._cache_bytes > self.max_cache_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Delete least recently used objects down to 90% of the limit (caller holds _size_lock)"""
+        objects = []
+        for path in self._object_files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            objects.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in objects)
+        target = self.max_cache_bytes * 0.9
+        removed = 0
+        for _, size, path in sorted(objects, key=lambda o: o[0]):
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        self._cache_bytes = total
+        self.evicted += removed
+        if removed:
+            # URL records pointing at deleted objects (source records stay for refetch())
+            for record_path in self.urls_dir.iterdir():
+                try:
+                    record = json.loads(record_path.read_text())
+                except (OSError, ValueError):
+                    record_path.unlink(missing_ok=True)
+                    continue
+                if not self._object_path(record["digest"], record["media_type"]).exists():
+                    record_path.unlink(missing_ok=True)
+            print(f"🧹 Image cache over {self.max_cache_bytes // (1024 * 1024)} MB: evicted {removed} images")
+
+    def reencode(self, data: bytes, media_type: str):
+        """Downscale and recompress raster images; other types pass through"""
+        if not PILLOW_AVAILABLE or media_type in ("image/svg+xml", "image/gif"):
+            return data, media_type
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.thumbnail((self.max_dimension, self.max_dimension))
+            output = io.BytesIO()
+            if image.mode in ("RGBA", "LA", "P"):
+                image.save(output, format="PNG", optimize=True)
+                encoded, encoded_type = output.getvalue(), "image/png"
+            else:
+                image.convert("RGB").save(output, format="JPEG", quality=self.jpeg_quality, optimize=True, progressive=True)
+                encoded, encoded_type = output.getvalue(), "image/jpeg"
+            # Keep the original if re-encoding made it bigger
+            if len(encoded) < len(data):
+                return encoded, encoded_type
+            return data, media_type
+        except Exception as e:
+            print(f"⚠️ Could not re-encode image, storing original: {e}")
+            return data, media_type
+
+    def lookup(self, url: str) -> Optional[CachedImage]:
+        """Return the cached copy of a URL without fetching"""
+        try:
+            record = json.loads(self._url_record_path(url).read_text())
+        except FileNotFoundError:
+            return None
+        return self.get(record["digest"], record["media_type"])
+
+    def get(self, digest: str, media_type: Optional[str] = None) -> Optional[CachedImage]:
+        """Return a cached object by digest"""
+        if not re.fullmatch(r"[0-9a-f]{64}", digest):
+            return None
+        if media_type:
+            candidates = [self._object_path(digest, media_type)]
+        else:
+            candidates = list((self.objects_dir / digest[:2] / digest[2:4]).glob(f"{digest}.*"))
+        for path in candidates:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            # Recently used objects are evicted last (touched at most hourly)
+            if stat.st_mtime < time.time() - 3600:
+                os.utime(path)
+            ext = path.suffix.lstrip(".")
+            media_type = next((t for t, e in MEDIA_TYPES.items() if e == ext), "application/octet-stream")
+            return CachedImage(digest=digest, media_type=media_type, path=path, size=stat.st_size)
+        return None
+
+    def _open(self, url: str):
+        """GET the URL, following redirects by hand so every hop is checked
+
+        Raises UnsafeURLError for a non-public hop unless allow_private is set.
+        """
+        client = get_media_client()
+        for _ in range(MAX_REDIRECTS + 1):
+            kwargs = {"stream": True, "allow_redirects": False, "headers": {"Accept": "image/*"}}
+            if self.allow_private:
+                response = client.get(url, **kwargs)
+            else:
+                addresses = public_addresses(url)
+                with client.dns_cache.pinned(urlparse(url).hostname, addresses):
+                    response = client.get(url, **kwargs)
+            if not response.is_redirect:
+                return response
+            location = response.headers["Location"]
+            response.close()
+            url = urljoin(url, location)
+        raise ValueError(f"More than {MAX_REDIRECTS} redirects")
+
+    def fetch(self, url: str) -> CachedImage:
+        """Return the cached copy of a URL, fetching and storing it on first use"""
+        with self._url_lock(url):
+            cached = self.lookup(url)
+            if cached:
+                return cached
+
+            # Closed on every path, or the pooled connection is never returned
+            with self._open(url) as response:
+                response.raise_for_status()
+                media_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                if not media_type.startswith("image/"):
+                    raise ValueError(f"URL did not return an image ({media_type or 'unknown type'})")
+
+                chunks, total = [], 0
+                for chunk in response.iter_content(64 * 1024):
+                    total += len(chunk)
+                    if total > self.max_download_bytes:
+                        raise ValueError("Image exceeds maximum download size")
+                    chunks.append(chunk)
+
+            data, media_type = self.reencode(b"".join(chunks), media_type)
+            digest = hashlib.sha256(data).hexdigest()
+            path = self._object_path(digest, media_type)
+            if not path.exists():
+                self._write_atomic(path, data)
+                self._account(len(data))
+            record = json.dumps({"url": url, "digest": digest, "media_type": media_type}).encode("utf-8")
+            self._write_atomic(self._url_record_path(url), record)
+            self._write_atomic(self._source_record_path(digest), record)
+
+            return CachedImage(digest=digest, media_type=media_type, path=path, size=len(data))
+
+    def refetch(self, digest: str) -> Optional[CachedImage]:
+        """Fetch an evicted object again from the URL it came from
+
+        Returns None if the digest was never cached. The image at the URL
+        may have changed since, so the result can have a different digest.
+        """
+        if not re.fullmatch(r"[0-9a-f]{64}", digest):
+            return None
+        try:
+            record = json.loads(self._source_record_path(digest).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        return self.fetch(record["url"])
+
+    def rewrite_markdown(self, content: str, base_url: str = "") -> str:
+        """Point markdown image links at the local proxy, caching each image"""
+        def replace(match):
+            url = match.group(2)
+            try:
+                cached = self.fetch(url)
+            except Exception as e:
+                print(f"⚠️ Keeping remote image link {url}: {e}")
+                return match.group(0)
+            return f"{match.group(1)}{base_url.rstrip('/')}/api/media/{cached.digest}{match.group(3)}"
+
+        return MARKDOWN_IMAGE_PATTERN.sub(replace, content)
+
+# Global proxy cache instance (created on first use)
+_image_proxy: Optional[ImageProxyCache] = None
+_image_proxy_lock = threading.Lock()
+
+def get_image_proxy() -> ImageProxyCache:
+    """Get the shared image proxy cache"""
+    global _image_proxy
+    if _image_proxy is None:
+        with _image_proxy_lock:
+            if _image_proxy is None:
+                from config import get_config
+                config = get_config()
+                _image_proxy = ImageProxyCache(
+                    config.image_cache_dir,
+                    config.image_cache_max_dimension,
+                    max_cache_bytes=config.image_cache_max_mb * 1024 * 1024,
+                    allow_private=config.image_proxy_allow_private
+                )
+    return _image_proxy
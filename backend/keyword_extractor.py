@@ -0,0 +1,132 @@
+"""
+Local keyword extraction for media search.
+
+A small RAKE (Rapid Automatic Keyword Extraction) scorer over the module
+title, subtopics, objectives and content headings, plus phrase templates
+that turn the top phrases into image and video search queries. Produces the
+same {"image_keywords": [...], "video_keywords": [...]} shape as the
+keyword agent without an LLM round-trip.
+"""
+import re
+from typing import Dict, List, Any, Optional
+
+STOPWORDS = frozenset("""
+a about above after again all also an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having
+how i if in into is it its itself just let like make more most must my no nor not now of off on once
+only or other our out over own same should so some such than that the their them then there these
+they this those through to too under until up using use very was we were what when where which while
+who why will with within without would you your yours
+introduction overview basics fundamentals understanding understand learn learning module part chapter
+section lesson course guide tutorial getting started key concepts concept practical exercises summary
+takeaways references further reading next steps advanced beginner intermediate expert roadmap topic
+goals objectives prerequisites path paths resources career
+""".split())
+
+IMAGE_TEMPLATES = ("{phrase} diagram", "{phrase} illustration", "{phrase} infographic", "{phrase}")
+VIDEO_TEMPLATES = ("{phrase} tutorial", "{phrase} explained", "{phrase} demonstration", "{phrase}")
+
+_SPLIT_PATTERN = re.compile(r"[^\w\s+#.-]|\s[-.]\s|\n")
+_WORD_PATTERN = re.compile(r"[\w+#][\w+#.-]*")
+_HEADING_PATTERN = re.compile(r"^#{1,4}\s+(.+)$", re.MULTILINE)
+_PLACEHOLDER_PATTERN = re.compile(r"^\[?(images|videos|topic \d+(\.\d+)?)\]?$", re.IGNORECASE)
+
+def _candidate_phrases(text: str, max_words: int) -> List[List[str]]:
+    """Split text into runs of non-stopwords (RAKE candidates)"""
+    phrases = []
+    for fragment in _SPLIT_PATTERN.split(text.lower()):
+        current = []
+        for word in _WORD_PATTERN.findall(fragment):
+            word = word.strip(".-")
+            if not word or word in STOPWORDS or word.isdigit():
+                if current:
+                    phrases.append(current)
+                current = []
+            else:
+                current.append(word)
+        if current:
+            phrases.append(current)
+
+    # Long runs are split so each query stays short once a template is applied
+    result = []
+    for phrase in phrases:
+        for start in range(0, len(phrase), max_words):
+            result.append(phrase[start:start + max_words])
+    return result
+
+def rank_phrases(weighted_texts: List[tuple], max_words: int = 3) -> List[str]:
+    """Rank candidate phrases across (text, weight) pairs by RAKE score"""
+    candidates = []
+    frequency: Dict[str, float] = {}
+    degree: Dict[str, float] = {}
+
+    for text, weight in weighted_texts:
+        for phrase in _candidate_phrases(text, max_words):
+            candidates.append((phrase, weight))
+            for word in phrase:
+                frequency[word] = frequency.get(word, 0) + weight
+                degree[word] = degree.get(word, 0) + weight * len(phrase)
+
+    scores: Dict[str, float] = {}
+    for phrase, weight in candidates:
+        key = " ".join(phrase)
+        score = sum(degree[w] / frequency[w] for w in phrase) * weight
+        scores[key] = max(scores.get(key, 0.0), score) + 0.1 * weight
+
+    ranked = sorted(scores, key=lambda p: (-scores[p], p))
+
+    # Drop phrases fully contained in a higher-ranked phrase
+    selected: List[str] = []
+    for phrase in ranked:
+        if not any(f" {phrase} " in f" {kept} " for kept in selected):
+            selected.append(phrase)
+    return selected
+
+def extract_headings(content: str, limit: int = 20) -> List[str]:
+    """Markdown headings from generated content"""
+    return [h.strip(" #*") for h in _HEADING_PATTERN.findall(content or "")][:limit]
+
+def _expand(phrases: List[str], templates: tuple, count: int) -> List[str]:
+    """Pair the top phrases with templates, one distinct query per phrase where possible"""
+    keywords: List[str] = []
+    seen = set()
+    attempts = len(phrases) * len(templates)
+    for i in range(attempts):
+        if len(keywords) >= count:
+            break
+        phrase = phrases[i % len(phrases)]
+        template = templates[(i + i // len(phrases)) % len(templates)]
+        keyword = template.format(phrase=phrase).strip()
+        if keyword not in seen and 2 <= len(keyword.split()) <= 4:
+            seen.add(keyword)
+            keywords.append(keyword)
+    return keywords
+
+def generate_keywords(module_info: Dict[str, Any], images: int = 2, videos: int = 2,
+                      content: Optional[str] = None, course_topic: Optional[str] = None) -> Dict[str, List[str]]:
+    """Generate image and video search keywords for a module without an LLM"""
+    title = module_info.get("title", "")
+    subtopics = [s for s in module_info.get("subtopics", []) if not _PLACEHOLDER_PATTERN.match(s.strip())]
+    objectives = module_info.get("objectives", [])
+
+    weighted_texts = [(title, 5.0)]
+    weighted_texts += [(s, 2.0) for s in subtopics]
+    weighted_texts += [(o, 1.0) for o in objectives]
+    weighted_texts += [(h, 1.0) for h in extract_headings(content)]
+    if course_topic:
+        weighted_texts.append((course_topic, 0.5))
+
+    phrases = rank_phrases(weighted_texts)
+    if not phrases:
+        phrases = [title.lower() or "course"]
+
+    # Single-word phrases are too vague on their own, so prefix them with the
+    # course topic when there is one
+    topic_phrases = rank_phrases([(course_topic, 1.0)], max_words=2) if course_topic else []
+    anchor = topic_phrases[0] if topic_phrases else None
+    anchored = [f"{anchor} {p}" if anchor and len(p.split()) == 1 and p not in anchor.split() else p for p in phrases]
+
+    return {
+        "image_keywords": _expand(anchored, IMAGE_TEMPLATES, images),
+        "video_keywords": _expand(anchored, VIDEO_TEMPLATES, videos)
+    }
@@ -0,0 +1,297 @@
+"""
+JSON extraction from LLM output.
+
+Model replies wrap the JSON we ask for in prose, code fences or reasoning
+(<think>...</think>), any of which may contain braces of its own. Instead
+of a greedy regex, a single string-aware pass finds every balanced
+top-level {...} / [...] span; candidates are tried in order (fenced blocks
+first), lightly repaired when they don't parse (trailing commas), and
+validated against a pydantic schema, so the first candidate with the
+expected shape wins. The scanner keeps its state between calls, so it can
+also pick complete objects out of streamed output as they close.
+
+Failures raise JSONExtractionError with the reason for every candidate.
+"""
+import json
+import re
+import threading
+from typing import Dict, List, Any, Optional, Tuple, Type
+
+from pydantic import BaseModel, ConfigDict, Field, AliasChoices, ValidationError, field_validator, model_validator
+
+_THINK_PATTERN = re.compile(r"<think>.*?(</think>|$)", re.DOTALL | re.IGNORECASE)
+_FENCE_PATTERN = re.compile(r"```(?:json|JSON)?[ \t]*\n(.*?)```", re.DOTALL)
+
+_OPENERS = {"{": "}", "[": "]"}
+
+# Schemas
+
+class ModuleSpec(BaseModel):
+    """One module of a generated course structure"""
+    model_config = ConfigDict(extra="allow", populate_by_name=True)
+
+    filename: Optional[str] = Field(None, validation_alias=AliasChoices("filename", "file_name", "file"))
+    title: Optional[str] = Field(None, validation_alias=AliasChoices("title", "topic", "main_topic", "name"))
+    subtopics: List[str] = Field(default_factory=list, validation_alias=AliasChoices("subtopics", "key_subtopics"))
+    objectives: List[str] = Field(default_factory=list, validation_alias=AliasChoices("objectives", "learning_objectives"))
+    difficulty: Optional[str] = Field(None, validation_alias=AliasChoices("difficulty", "difficulty_level"))
+    estimated_time: Optional[str] = Field(None, validation_alias=AliasChoices("estimated_time", "estimated_reading_time", "reading_time"))
+
+    @field_validator("subtopics", "objectives", mode="before")
+    @classmethod
+    def _as_list(cls, value):
+        if isinstance(value, str):
+            return [value]
+        return value
+
+    @field_validator("difficulty", "estimated_time", mode="before")
+    @classmethod
+    def _as_text(cls, value):
+        return None if value is None else str(value)
+
+class CourseStructureSpec(BaseModel):
+    """The course planner's reply"""
+    model_config = ConfigDict(extra="allow", populate_by_name=True)
+
+    modules: List[ModuleSpec] = Field(..., min_length=1, validation_alias=AliasChoices("modules", "files", "course_modules"))
+
+class KeywordSpec(BaseModel):
+    """The keyword generator's reply"""
+    model_config = ConfigDict(extra="allow")
+
+    image_keywords: List[str] = Field(default_factory=list)
+    video_keywords: List[str] = Field(default_factory=list)
+
+    @model_validator(mode="after")
+    def _not_empty(self):
+        # After validation, so it also runs when either list is left out
+        if not self.image_keywords and not self.video_keywords:
+            raise ValueError("no image or video keywords")
+        return self
+
+# Scanning
+
+class JSONExtractionError(ValueError):
+    """No candidate in the text parsed and validated"""
+
+    def __init__(self, message: str, errors: Optional[List[str]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+class JSONScanner:
+    """Finds balanced JSON spans in text, fed all at once or in chunks
+
+    Braces and brackets inside JSON strings are ignored and each character
+    is looked at once, so scanning is linear in the length of the text.
+    feed() returns complete top-level spans. Spans nested inside a bracket
+    that never closes (a stray "{" in prose) or closes with the wrong
+    bracket are kept too and returned by finish(). If the text ends inside
+    a string, one of the quotes was prose, so finish() scans again from
+    after the outermost open bracket with the string state reset.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._offset = 0
+        self._position = 0
+        self._stack: List[Tuple[str, int]] = []
+        self._in_string = False
+        self._escaped = False
+        self._orphans: List[Tuple[int, str]] = []
+
+    def feed(self, chunk: str) -> List[str]:
+        """Add text; return the top-level spans completed by it"""
+        self.buffer += chunk
+        completed = []
+        buffer = self.buffer
+        for index in range(self._position, len(buffer)):
+            char = buffer[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char in _OPENERS:
+                self._stack.append((_OPENERS[char], index))
+            elif not self._stack:
+                continue
+            elif char == '"':
+                self._in_string = True
+            elif char in "}]":
+                closer, start = self._stack.pop()
+                if char != closer:
+                    # Not JSON after all; whatever closed inside it stays available
+                    self._stack = []
+                    continue
+                span = buffer[start:index + 1]
+                if self._stack:
+                    self._orphans.append((self._offset + start, span))
+                else:
+                    completed.append(span)
+                    # Its parts are not candidates of their own (they were added last)
+                    while self._orphans and self._orphans[-1][0] >= self._offset + start:
+                        self._orphans.pop()
+        self._position = len(buffer)
+        if not self._stack:
+            # Nothing open: the text so far is no longer needed
+            self._offset += len(buffer)
+            self.buffer = ""
+            self._position = 0
+        return completed
+
+    def finish(self) -> List[str]:
+        """Spans that closed inside brackets that never matched up, in order
+
+        Also the spans found by rescanning after an unterminated string,
+        which a lone quote inside a stray "{" would otherwise hide. Each
+        rescan starts past the previous one's outermost open bracket, so
+        the extra work grows with the number of brackets left open.
+        """
+        spans = []
+        scanner = self
+        while True:
+            spans.extend(span for _, span in sorted(scanner._orphans, key=lambda o: o[0]))
+            if not scanner._in_string:
+                return spans
+            rest = scanner.buffer[scanner._stack[0][1] + 1:]
+            scanner = JSONScanner()
+            spans.extend(scanner.feed(rest))
+
+def strip_reasoning(text: str) -> str:
+    """Drop <think>...</think> blocks (an unterminated one runs to the end)"""
+    return _THINK_PATTERN.sub("", text)
+
+def _scan(text: str) -> List[str]:
+    scanner = JSONScanner()
+    spans = scanner.feed(text)
+    return spans + scanner.finish()
+
+def json_candidates(text: str) -> List[str]:
+    """Balanced JSON spans: those inside code fences first, then the rest, in order"""
+    candidates = []
+    for fenced in _FENCE_PATTERN.findall(text):
+        candidates.extend(_scan(fenced))
+    seen = set(candidates)
+    for span in _scan(text):
+        if span not in seen:
+            seen.add(span)
+            candidates.append(span)
+    return candidates
+
+def repair_json(span: str) -> str:
+    """Remove trailing commas before } or ], outside strings"""
+    out = []
+    in_string = escaped = False
+    pending_comma = None
+    for char in span:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if pending_comma is not None:
+            if char.isspace():
+                pending_comma += char
+                continue
+            if char not in "}]":
+                out.append(pending_comma)
+            else:
+                out.append(pending_comma[1:])
+            pending_comma = None
+        if char == ",":
+            pending_comma = char
+            continue
+        out.append(char)
+        if char == '"':
+            in_string = True
+    if pending_comma is not None:
+        out.append(pending_comma)
+    return "".join(out)
+
+def _parse(span: str) -> Tuple[Any, bool]:
+    """Parsed value and whether repair was needed"""
+    try:
+        return json.loads(span), False
+    except json.JSONDecodeError:
+        return json.loads(repair_json(span)), True
+
+# Failure reporting
+
+_stats = {"parsed": 0, "repaired": 0, "failed": 0}
+_recent_failures: List[Dict[str, Any]] = []
+_stats_lock = threading.Lock()
+
+def _record(outcome: str, schema: Optional[Type[BaseModel]] = None, error: Optional[str] = None):
+    with _stats_lock:
+        _stats[outcome] += 1
+        if outcome == "failed":
+            _recent_failures.append({"schema": schema.__name__ if schema else None, "error": error})
+            del _recent_failures[:-10]
+
+def get_parse_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return dict(_stats, recent_failures=list(_recent_failures))
+
+# Extraction
+
+def extract_json(text: str, schema: Optional[Type[BaseModel]] = None) -> Dict[str, Any]:
+    """The first JSON object in text that parses (and validates against schema)
+
+    A top-level list is accepted as {"modules": [...]} for
+    CourseStructureSpec. Returns the validated data as a plain dict.
+    """
+    errors = []
+    for span in json_candidates(strip_reasoning(text)):
+        try:
+            value, repaired = _parse(span)
+        except json.JSONDecodeError as e:
+            errors.append(f"invalid JSON at char {e.pos}: {e.msg}")
+            continue
+        if isinstance(value, list) and schema is CourseStructureSpec:
+            value = {"modules": value}
+        if not isinstance(value, dict):
+            errors.append("not a JSON object")
+            continue
+        if schema is not None:
+            try:
+                value = schema.model_validate(value).model_dump(exclude_none=True)
+            except ValidationError as e:
+                errors.append(f"{schema.__name__}: {e.error_count()} validation error(s), first: {e.errors()[0]['msg']}")
+                continue
+        _record("repaired" if repaired else "parsed")
+        return value
+
+    message = "no JSON object found" if not errors else f"{len(errors)} candidate(s) rejected: {'; '.join(errors[:3])}"
+    _record("failed", schema, message)
+    raise JSONExtractionError(message, errors)
+
+def extract_course_structure(text: str) -> Dict[str, Any]:
+    """Validated course structure, with each module's filename and title filled in"""
+    structure = extract_json(text, CourseStructureSpec)
+    for number, module in enumerate(structure["modules"], 1):
+        module.setdefault("filename", f"module_{number:02d}.md")
+        module.setdefault("title", f"Module {number}")
+    return structure
+
+class StreamingJSONExtractor:
+    """Yields validated objects from streamed model output as soon as each one closes"""
+
+    def __init__(self, schema: Optional[Type[BaseModel]] = None):
+        self.schema = schema
+        self.scanner = JSONScanner()
+        self.errors: List[str] = []
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        results = []
+        for span in self.scanner.feed(chunk):
+            try:
+                results.append(extract_json(span, self.schema))
+            except JSONExtractionError as e:
+                self.errors.extend(e.errors)
+        return results
@@ -1,18 +1,27 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import asyncio
 import json
-import os
 import time
 import re
-import shutil
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Literal
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 import uuid
+import base64
+import bisect
+import hashlib
+
+from async_io import run_io
+from course_manifest import CourseManifest
+from progress_events import get_event_bus, is_final_event
+from progress_protocol import ProgressProtocol
+from session_store import get_session_store
+from llm_json import JSONExtractionError, KeywordSpec, extract_json, extract_course_structure
+from progress_relay import get_progress_relay
 
 # Import your existing course creation system
 try:
@@ -38,6 +47,7 @@ class CourseRequest(BaseModel):
     topic: str
     images_per_module: int = 1
     videos_per_module: int = 1
+    keyword_mode: Literal["llm", "local"] = "llm"
 
 class ProgressUpdate(BaseModel):
     session_id: str
@@ -50,36 +60,186 @@ class ProgressUpdate(BaseModel):
 
 # Global variables
 active_connections: Dict[str, WebSocket] = {}
-course_sessions: Dict[str, Dict] = {}
 executor = ThreadPoolExecutor(max_workers=2)
 
 class WebSocketManager:
+    """Fans progress events out to any number of sockets per session
+    
+    Events are logged on the event bus, which hands them to one bounded
+    queue per socket; a sender task per socket drains its queue, so a slow
+    client never holds up course generation or the other clients.
+    """
+
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+        self.active_connections: Dict[str, Dict[WebSocket, Any]] = {}
+        self.sender_tasks: Dict[WebSocket, asyncio.Task] = {}
+        self._progress_locks: Dict[str, threading.Lock] = {}
+        self._progress_locks_guard = threading.Lock()
 
-    async def connect(self, websocket: WebSocket, session_id: str):
+    async def connect(self, websocket: WebSocket, session_id: str, last_seq: int = 0,
+                      protocol: Optional[ProgressProtocol] = None):
+        """Accept the socket and stream every logged event after last_seq, then live ones"""
+        from config import get_config
+        
         await websocket.accept()
-        self.active_connections[session_id] = websocket
+        # The backlog may come from the spill file
+        subscription = await run_io(get_event_bus().subscribe, session_id, last_seq,
+                                    get_config().progress_send_queue, asyncio.get_running_loop())
+        self.active_connections.setdefault(session_id, {})[websocket] = subscription
+        self.sender_tasks[websocket] = asyncio.create_task(
+            self._sender(websocket, subscription, protocol or ProgressProtocol()))
 
-    def disconnect(self, session_id: str):
-        if session_id in self.active_connections:
-            del self.active_connections[session_id]
+    async def _sender(self, websocket: WebSocket, subscription, protocol: ProgressProtocol):
+        try:
+            while True:
+                event = await subscription.get()
+                if event is None:
+                    break
+                if protocol.needs_io(event):
+                    payload = await run_io(protocol.render, event)
+                else:
+                    payload = protocol.render(event)
+                if isinstance(payload, bytes):
+                    await websocket.send_bytes(payload)
+                else:
+                    await websocket.send_text(payload)
+        except Exception as e:
+            print(f"⚠️ Progress delivery to {subscription.session_id} stopped: {e}")
+        if subscription.overflowed:
+            # Too far behind; the client reconnects with the last seq it saw
+            try:
+                await websocket.close(code=1013)
+            except Exception:
+                pass
+
+    async def resume(self, session_id: str, websocket: WebSocket, last_seq: int):
+        """Restart a socket's stream from the event after last_seq"""
+        subscription = self.active_connections.get(session_id, {}).get(websocket)
+        if subscription is not None:
+            await run_io(get_event_bus().rewind, subscription, last_seq)
+
+    def disconnect(self, session_id: str, websocket: WebSocket):
+        subscription = self.active_connections.get(session_id, {}).pop(websocket, None)
+        if subscription is not None:
+            get_event_bus().unsubscribe(subscription)
+        if not self.active_connections.get(session_id):
+            self.active_connections.pop(session_id, None)
+        task = self.sender_tasks.pop(websocket, None)
+        if task is not None:
+            task.cancel()
 
     async def send_progress(self, session_id: str, progress_data: Dict):
-        if session_id in self.active_connections:
-            try:
-                await self.active_connections[session_id].send_text(json.dumps(progress_data))
-            except:
-                self.disconnect(session_id)
+        """Log the event and queue it for every connected socket (never waits on a socket)
+        
+        The spill file append and the session store write run on the I/O pool.
+        """
+        event = await run_io(self._log_progress, session_id, progress_data)
+        relay = get_progress_relay()
+        if relay is not None:
+            relay.broadcast(session_id, event)
+
+    def _log_progress(self, session_id: str, progress_data: Dict) -> Dict:
+        """Number, log and record one event (blocking)
+        
+        One event per session at a time, so the session record folds them
+        in seq order even when two I/O threads log for the same session.
+        """
+        with self._progress_locks_guard:
+            lock = self._progress_locks.setdefault(session_id, threading.Lock())
+        with lock:
+            event = get_event_bus().publish(session_id, progress_data)
+            get_session_store().record_event(session_id, event)
+        if is_final_event(event):
+            with self._progress_locks_guard:
+                self._progress_locks.pop(session_id, None)
+        return event
+    
+    def get_stats(self) -> Dict[str, Any]:
+        connections = [subscription.get_stats() for sockets in self.active_connections.values()
+                       for subscription in sockets.values()]
+        return {
+            "sessions": len(self.active_connections),
+            "connections": len(connections),
+            "queued": sum(c["queued"] for c in connections),
+            "coalesced": sum(c["coalesced"] for c in connections),
+            "overflowed": sum(c["overflowed"] for c in connections)
+        }
 
 manager = WebSocketManager()
 
+@app.on_event("startup")
+async def start_catalog():
+    """Index course_content/ once so listings are served from memory"""
+    from config import get_config
+    from course_catalog import start_course_catalog
+    
+    await run_io(start_course_catalog, "course_content", get_config().course_catalog_poll_interval)
+
+@app.on_event("shutdown")
+async def stop_catalog():
+    from course_catalog import get_course_catalog
+    get_course_catalog().stop()
+
+@app.on_event("startup")
+async def start_session_pruning():
+    """Drop expired sessions periodically, not only when the store opens"""
+    sessions = await run_io(get_session_store)
+    sessions.start()
+
+@app.on_event("shutdown")
+async def stop_session_pruning():
+    get_session_store().stop()
+
+@app.on_event("startup")
+async def start_relay():
+    """Share progress events with the other workers (PROGRESS_RELAY=true)"""
+    from progress_relay import start_progress_relay
+    start_progress_relay(asyncio.get_running_loop())
+
+@app.on_event("shutdown")
+async def stop_relay():
+    from progress_relay import stop_progress_relay
+    stop_progress_relay()
+
+@app.on_event("shutdown")
+async def stop_course_writer():
+    """Write out queued course files before exiting"""
+    from course_writer import close_course_writer
+    await run_io(close_course_writer)
+
+@app.on_event("startup")
+async def warm_media_pool():
+    """Open keep-alive connections to the media APIs before the first search"""
+    try:
+        from config import get_config
+        from http_pool import warm_media_client
+
+        if get_config().media_warm_pool:
+            asyncio.get_running_loop().run_in_executor(executor, warm_media_client)
+    except Exception as e:
+        print(f"⚠️ Media pool warm-up skipped: {e}")
+
+async def save_manifest(manifest: CourseManifest, durable: bool = False):
+    """Queue a course.json write; with durable, wait until it is on disk
+    
+    Failed writes are logged by CourseManifest.save; a durable save also
+    raises them.
+    """
+    future = await run_io(manifest.save)
+    if durable:
+        await asyncio.wrap_future(future)
+
 class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
-    def __init__(self, session_id: str, topic: str, images_per_module: int = 1, videos_per_module: int = 1):
+    def __init__(self, session_id: str, topic: str, images_per_module: int = 1, videos_per_module: int = 1, keyword_mode: str = "llm"):
         super().__init__(images_per_module, videos_per_module)
         self.session_id = session_id
         self.topic = topic
         
+        # "llm" asks the keyword agent, "local" uses the deterministic extractor
+        if keyword_mode not in ("llm", "local"):
+            raise ValueError(f"Unknown keyword mode: {keyword_mode}")
+        self.keyword_mode = keyword_mode
+        
         # Create a sanitized folder name from the topic
         self.folder_name = self.sanitize_folder_name(topic)
         
@@ -87,6 +247,91 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
         self.base_directory = Path("course_content")
         self.course_directory = self.base_directory / self.folder_name
         self.course_directory.mkdir(exist_ok=True, parents=True)
+        
+        # Search depth used when collecting candidates for the course-wide media plan
+        self.media_candidates_per_keyword = 3
+        
+        # Media used by each module (by filename), recorded in course.json
+        self.module_media: Dict[str, Dict] = {}
+    
+    def content_saved(self, filename: str, content: str):
+        """After a module is on disk: derived files, course catalog and course store (when enabled)"""
+        super().content_saved(filename, content)
+        
+        from course_catalog import get_course_catalog
+        from course_store import get_course_store
+        
+        catalog = get_course_catalog()
+        catalog.notify_changed(self.course_directory / filename)
+        
+        store = get_course_store()
+        entry = catalog.get(self.folder_name, filename)
+        if store and entry:
+            try:
+                store.upsert_module(self.folder_name, filename, catalog.read_content(entry) or "")
+            except Exception as e:
+                print(f"⚠️ Course store update failed for {filename}: {e}")
+    
+    async def save_module(self, filename: str, content: str):
+        """Save a module through the write-behind writer
+        
+        The write joins the writer's next batch; no I/O thread is held
+        while it waits. Returns once the file is durable, so the catalog
+        and events that follow refer to bytes on disk.
+        """
+        from course_writer import get_course_writer
+        
+        content = await run_io(self.prepare_content, content)
+        await asyncio.wrap_future(get_course_writer().submit(self.course_directory / filename, content.encode('utf-8')))
+        await run_io(self.content_saved, filename, content)
+    
+    def record_module_in_manifest(self, manifest: "CourseManifest", module_number: Optional[int],
+                                  filename: str) -> Optional[Future]:
+        """Mark a saved module completed in course.json with its size, hash and media (blocking)
+        
+        Returns the save's future (None if the module is not cataloged).
+        """
+        from course_catalog import get_course_catalog
+        
+        entry = get_course_catalog().get(self.folder_name, filename)
+        if entry:
+            manifest.module_completed(module_number, filename, entry.size, entry.content_hash,
+                                      self.module_media.get(filename))
+            return manifest.save()
+        return None
+    
+    def module_reference(self, manifest: "CourseManifest", module_number: int, filename: str, title: str) -> Dict:
+        """module_complete event data: where to fetch the module, not its content"""
+        from course_catalog import get_course_catalog
+        
+        data = {
+            "filename": filename,
+            "module_number": module_number,
+            "title": title,
+            "completed": True,
+            "topic_folder": self.folder_name
+        }
+        entry = get_course_catalog().get(self.folder_name, filename)
+        if entry:
+            record = manifest.get_module(module_number, filename)
+            data.update({
+                "content_hash": entry.content_hash,
+                "size": entry.size,
+                "duration_seconds": record.get("duration_seconds"),
+                "raw_url": raw_course_url(entry)
+            })
+        return data
+    
+    def save_course_structure(self, course_structure: Dict):
+        """Record the course structure in the course store, when enabled"""
+        from course_store import get_course_store
+        
+        store = get_course_store()
+        if store:
+            try:
+                store.save_structure(self.folder_name, course_structure, self.topic)
+            except Exception as e:
+                print(f"⚠️ Course store update failed for course structure: {e}")
     
     def sanitize_folder_name(self, name: str) -> str:
         """Convert a topic name to a valid folder name"""
@@ -118,23 +363,20 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
             process=Process.sequential
         )
     
-    def parse_json_from_text(self, text: str) -> Dict:
-        """Parse JSON from text with error handling"""
+    def parse_json_from_text(self, text: str, schema=None) -> Dict:
+        """First JSON object in model output matching schema, or {} (reason logged)"""
         try:
-            # Try to find JSON in the text
-            json_match = re.search(r'\{.*\}', text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                return json.loads(json_str)
-            else:
-                # If no JSON found, return empty dict
-                return {}
-        except Exception as e:
-            print(f"JSON parsing error: {e}")
+            return extract_json(text, schema)
+        except JSONExtractionError as e:
+            print(f"⚠️ JSON parsing failed: {e}")
             return {}
     
-    async def create_single_module_content(self, module_info: Dict, module_number: int, total_modules: int) -> str:
-        """Create content for a single module"""
+    async def create_single_module_content(self, module_info: Dict, module_number: int, total_modules: int, media_data: Optional[Dict] = None) -> str:
+        """Create content for a single module
+        
+        When media_data is given (from the course-level media plan) the keyword
+        and search steps are skipped.
+        """
         
         # Create agents
         _, content_creator, keyword_generator, _, content_enhancer = self.create_agents()
@@ -148,28 +390,18 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
         content_result = content_crew.kickoff()
         basic_content = str(content_result.raw)
         
-        # Step 2: Generate keywords for this module
-        progress = int(15 + (module_number - 1) * 80 / total_modules)
-        await self.send_progress("keywords", progress, f"Generating search keywords for module {module_number}", module_number, total_modules)
-        
-        keywords_task = self.create_single_module_keyword_task(module_info, keyword_generator)
-        keywords_crew = self.create_crew([keyword_generator], [keywords_task])
-        keywords_result = keywords_crew.kickoff()
-        
-        # Parse keywords
-        keywords_data = self.parse_json_from_text(str(keywords_result.raw))
-        if not keywords_data:
-            # Create default keywords if parsing fails
-            keywords_data = {
-                "image_keywords": [f"{module_info.get('title', '')} tutorial", f"{module_info.get('title', '')} guide"],
-                "video_keywords": [f"{module_info.get('title', '')} tutorial", f"{module_info.get('title', '')} explanation"]
-            }
-        
-        # Step 3: Search for media
-        progress = int(20 + (module_number - 1) * 80 / total_modules)
-        await self.send_progress("media", progress, f"Searching for images and videos for module {module_number}", module_number, total_modules)
-        
-        media_data = await self.search_media_for_module(keywords_data, module_info.get('filename', ''))
+        if media_data is None:
+            # Step 2: Generate keywords for this module
+            progress = int(15 + (module_number - 1) * 80 / total_modules)
+            await self.send_progress("keywords", progress, f"Generating search keywords for module {module_number}", module_number, total_modules)
+            
+            keywords_data = self.generate_module_keywords(module_info, keyword_generator, basic_content)
+            
+            # Step 3: Search for media
+            progress = int(20 + (module_number - 1) * 80 / total_modules)
+            await self.send_progress("media", progress, f"Searching for images and videos for module {module_number}", module_number, total_modules)
+            
+            media_data = await self.search_media_for_module(keywords_data, module_info.get('filename', ''))
         
         # Step 4: Enhance content with media
         progress = int(25 + (module_number - 1) * 80 / total_modules)
@@ -188,8 +420,44 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
         else:
             final_content = basic_content
         
+        self.module_media[module_info.get('filename', '')] = media_data
+        
+        from course_store import get_course_store
+        store = get_course_store()
+        if store:
+            try:
+                await run_io(store.save_media, self.folder_name, module_info.get('filename', ''), media_data)
+            except Exception as e:
+                print(f"⚠️ Course store media update failed: {e}")
+        
         return final_content
     
+    def generate_module_keywords(self, module_info: Dict, keyword_generator, content: Optional[str] = None) -> Dict:
+        """Generate image and video search keywords for a module"""
+        if self.keyword_mode == "local":
+            from keyword_extractor import generate_keywords
+            return generate_keywords(
+                module_info,
+                images=self.images_per_module * 2,
+                videos=self.videos_per_module * 2,
+                content=content,
+                course_topic=self.topic
+            )
+        
+        keywords_task = self.create_single_module_keyword_task(module_info, keyword_generator)
+        keywords_crew = self.create_crew([keyword_generator], [keywords_task])
+        keywords_result = keywords_crew.kickoff()
+        
+        # Parse keywords
+        keywords_data = self.parse_json_from_text(str(keywords_result.raw), KeywordSpec)
+        if not keywords_data:
+            # Create default keywords if parsing fails
+            keywords_data = {
+                "image_keywords": [f"{module_info.get('title', '')} tutorial", f"{module_info.get('title', '')} guide"],
+                "video_keywords": [f"{module_info.get('title', '')} tutorial", f"{module_info.get('title', '')} explanation"]
+            }
+        return keywords_data
+    
     def create_single_content_task(self, module_info: Dict, agent):
         """Create content task for a single module"""
         from crewai import Task
@@ -258,18 +526,22 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
         
         return task
     
-    async def search_media_for_module(self, keywords_data: Dict, filename: str) -> Dict:
+    async def search_media_for_module(self, keywords_data: Dict, filename: str, results_per_keyword: int = 1, image_keyword_count: int = None, video_keyword_count: int = None) -> Dict:
         """Search media for a single module"""
         module_results = {
             "filename": filename,
             "images": [],
             "videos": []
         }
+        if image_keyword_count is None:
+            image_keyword_count = self.images_per_module
+        if video_keyword_count is None:
+            video_keyword_count = self.videos_per_module
         
         # Search images
-        for keyword in keywords_data.get('image_keywords', [])[:self.images_per_module]:
+        for keyword in keywords_data.get('image_keywords', [])[:image_keyword_count]:
             try:
-                result = self.image_search_tool._run(keyword, 1)
+                result = self.image_search_tool._run(keyword, results_per_keyword)
                 if result and not result.startswith("Error") and not result.startswith("No images"):
                     images = json.loads(result)
                     module_results["images"].extend(images)
@@ -278,9 +550,9 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
                 print(f"Error searching images for '{keyword}': {e}")
         
         # Search videos
-        for keyword in keywords_data.get('video_keywords', [])[:self.videos_per_module]:
+        for keyword in keywords_data.get('video_keywords', [])[:video_keyword_count]:
             try:
-                result = self.youtube_search_tool._run(keyword, 1)
+                result = self.youtube_search_tool._run(keyword, results_per_keyword)
                 if result and not result.startswith("Error") and not result.startswith("No videos"):
                     videos = json.loads(result)
                     module_results["videos"].extend(videos)
@@ -290,6 +562,67 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
         
         return module_results
     
+    async def plan_course_media(self, modules: List[Dict]) -> Dict[int, Dict]:
+        """Gather media for all modules, de-duplicate it and assign each item to one module
+        
+        Returns media_data dicts keyed by 1-based module number. Modules that
+        come up short after the global assignment are searched again with
+        their unused keywords and deeper result pages.
+        """
+        from media_assignment import CourseMediaAssigner
+        
+        _, _, keyword_generator, _, _ = self.create_agents()
+        assigner = CourseMediaAssigner(self.images_per_module, self.videos_per_module)
+        keywords_by_module = {}
+        total_modules = len(modules)
+        
+        for i, module_info in enumerate(modules, 1):
+            await self.send_progress("keywords", 10, f"Generating search keywords for module {i}", i, total_modules)
+            keywords_data = self.generate_module_keywords(module_info, keyword_generator)
+            keywords_by_module[i] = keywords_data
+            assigner.add_module(i, module_info, keywords_data)
+            
+            await self.send_progress("media", 10, f"Collecting candidate media for module {i}", i, total_modules)
+            candidates = await self.search_media_for_module(
+                keywords_data, module_info.get('filename', ''),
+                results_per_keyword=self.media_candidates_per_keyword
+            )
+            assigner.add_candidates(i, "images", candidates["images"])
+            assigner.add_candidates(i, "videos", candidates["videos"])
+        
+        assigner.assign()
+        
+        # Refetch only for modules that are still missing media
+        for i, missing in assigner.shortfall().items():
+            keywords_data = keywords_by_module[i]
+            refetch_keywords = {
+                "image_keywords": keywords_data.get('image_keywords', [])[self.images_per_module:] if missing["images"] else [],
+                "video_keywords": keywords_data.get('video_keywords', [])[self.videos_per_module:] if missing["videos"] else []
+            }
+            if not refetch_keywords["image_keywords"] and not refetch_keywords["video_keywords"]:
+                continue
+            candidates = await self.search_media_for_module(
+                refetch_keywords, modules[i - 1].get('filename', ''),
+                results_per_keyword=self.media_candidates_per_keyword * 2,
+                image_keyword_count=len(refetch_keywords["image_keywords"]),
+                video_keyword_count=len(refetch_keywords["video_keywords"])
+            )
+            assigner.add_candidates(i, "images", candidates["images"])
+            assigner.add_candidates(i, "videos", candidates["videos"])
+        
+        assignments = assigner.assign()
+        stats = assigner.get_stats()
+        print(f"🎯 Media plan: {stats['assigned']} items assigned, {stats['duplicate_hits']} duplicates removed, {stats['short_modules']} modules short")
+        
+        return {
+            i: {
+                "filename": modules[i - 1].get('filename', ''),
+                "images": assignments[i]["images"],
+                "videos": assignments[i]["videos"]
+            }
+            for i in assignments
+        }
+    
     def create_content_enhancement_task(self, filename: str, content: str, media_data: Dict, agent):
         """Create task for enhancing content with media"""
         from crewai import Task
@@ -332,8 +665,12 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
         
         await self.send_progress("starting", 0, f"Starting sequential course creation for: {course_topic} in folder: {self.folder_name}")
         
+        manifest = CourseManifest(self.course_directory, course_topic)
+        manifest.begin(self.session_id)
+        
         # Step 1: Create course structure
         await self.send_progress("structure", 5, "Creating course structure...")
+        stage_started = time.time()
         course_planner, _, _, _, _ = self.create_agents()
         
         structure_task = self.create_structure_task(course_topic, course_planner)
@@ -341,20 +678,42 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
         structure_result = structure_crew.kickoff()
         
         # Parse structure result
+        structure_data = {}
         try:
-            course_structure = self.parse_json_from_text(str(structure_result.raw))
-            if not course_structure or 'modules' not in course_structure:
+            try:
+                course_structure = extract_course_structure(str(structure_result.raw))
+                message = f"Course structure created: {len(course_structure['modules'])} modules"
+            except JSONExtractionError as e:
+                # Reported, not silent: the generated structure is being thrown away
+                print(f"⚠️ Course structure could not be parsed, using the default structure: {e}")
                 course_structure = self.create_default_structure(course_topic)
+                message = f"Could not parse the generated course structure; using the default {len(course_structure['modules'])} modules"
+                structure_data = {"structure_source": "default", "parse_error": str(e)}
             
             total_modules = len(course_structure.get('modules', []))
-            await self.send_progress("structure", 10, f"Course structure created: {total_modules} modules", data={"course_structure": course_structure})
+            await self.send_progress("structure", 10, message, data={"course_structure": course_structure, **structure_data})
             
         except Exception as e:
             await self.send_progress("error", 10, f"Structure creation failed: {str(e)}")
             course_structure = self.create_default_structure(course_topic)
             total_modules = len(course_structure.get('modules', []))
         
-        # Step 2: Process each module sequentially
+        await run_io(self.save_course_structure, course_structure)
+        manifest.set_structure(course_structure, structure_data.get("parse_error"))
+        manifest.set_timing("structure_seconds", time.time() - stage_started)
+        await save_manifest(manifest)
+        
+        # Step 2: Plan media for the whole course so no item is embedded twice
+        await self.send_progress("media_planning", 10, "Collecting and assigning media across all modules...")
+        stage_started = time.time()
+        try:
+            media_plan = await self.plan_course_media(course_structure.get('modules', []))
+        except Exception as e:
+            print(f"⚠️ Course media planning failed, falling back to per-module search: {e}")
+            media_plan = {}
+        manifest.set_timing("media_planning_seconds", time.time() - stage_started)
+        
+        # Step 3: Process each module sequentially
         for i, module_info in enumerate(course_structure.get('modules', []), 1):
             try:
                 filename = module_info.get('filename', f'module_{i:02d}.md')
@@ -364,21 +723,19 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
                                        f"Processing module {i}/{total_modules}: {module_info.get('title', '')}", 
                                        i, total_modules)
                 
+                manifest.module_started(i)
+                await save_manifest(manifest)
+                
                 # Create complete content for this module
-                final_content = await self.create_single_module_content(module_info, i, total_modules)
+                final_content = await self.create_single_module_content(module_info, i, total_modules, media_plan.get(i))
                 
                 # Save the file
-                self.save_content_to_file(filename, final_content)
+                await self.save_module(filename, final_content)
+                await run_io(self.record_module_in_manifest, manifest, i, filename)
                 
-                # Send the completed module data to frontend
-                module_data = {
-                    "filename": filename,
-                    "content": final_content,
-                    "module_number": i,
-                    "title": module_info.get('title', f'Module {i}'),
-                    "completed": True,
-                    "topic_folder": self.folder_name  # Add topic folder information
-                }
+                # Send a reference to the completed module; v1 clients get the
+                # content filled in when the event is sent (see progress_protocol.py)
+                module_data = self.module_reference(manifest, i, filename, module_info.get('title', f'Module {i}'))
                 
                 progress = int(10 + ((i) * 80) / total_modules)
                 await self.send_progress("module_complete", 
@@ -399,7 +756,14 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
                 # Create fallback content
                 fallback_content = f"# {module_info.get('title', f'Module {i}')}\n\n[Content generation failed. Please regenerate.]\n"
                 filename = module_info.get('filename', f'module_{i:02d}.md')
-                self.save_content_to_file(filename, fallback_content)
+                await self.save_module(filename, fallback_content)
+                manifest.module_failed(i, str(e))
+                await save_manifest(manifest)
+        
+        failed = any(m["status"] == "failed" for m in manifest.data["modules"])
+        manifest.finish("completed_with_errors" if failed else "completed")
+        # The complete event below promises a finished course.json
+        await save_manifest(manifest, durable=True)
         
         # Final completion
         await self.send_progress("complete", 100, "Sequential course creation completed!", None, None, {
@@ -412,76 +776,16 @@ class SequentialCourseCreationSystemWithFolders(EnhancedCourseCreationSystem):
         return course_structure
 
 # Helper function to organize courses into folders
-def organize_courses_into_folders():
-    """Organize existing courses into topic folders based on filename patterns"""
-    course_dir = Path("course_content")
-    
-    if not course_dir.exists():
-        return {"status": "error", "message": "Course directory not found"}
-    
-    # Find all markdown files in the root directory
-    md_files = list(course_dir.glob("*.md"))
-    
-    # Group files by topic
-    topic_groups = {}
-    for md_file in md_files:
-        # Extract topic from filename (e.g., "matlab" from "02_matlab_module_2.md")
-        match = re.search(r'(\d+)_([a-zA-Z0-9_]+)_', md_file.name)
-        if match:
-            topic = match.group(2)
-            if topic not in topic_groups:
-                topic_groups[topic] = []
-            topic_groups[topic].append(md_file)
-        else:
-            # Handle files that don't match the pattern (like introduction_roadmap)
-            if "introduction_roadmap" in md_file.name:
-                # Try to find which topic it belongs to based on other files
-                for topic in topic_groups:
-                    if any(f"_{topic}_" in file.name for file in md_files):
-                        if topic not in topic_groups:
-                            topic_groups[topic] = []
-                        topic_groups[topic].append(md_file)
-                        break
-                else:
-                    # If no match, put in "general" folder
-                    if "general" not in topic_groups:
-                        topic_groups["general"] = []
-                    topic_groups["general"].append(md_file)
-            elif "expert_roadmap" in md_file.name:
-                # Similar logic for expert_roadmap
-                for topic in topic_groups:
-                    if any(f"_{topic}_" in file.name for file in md_files):
-                        if topic not in topic_groups:
-                            topic_groups[topic] = []
-                        topic_groups[topic].append(md_file)
-                        break
-                else:
-                    if "general" not in topic_groups:
-                        topic_groups["general"] = []
-                    topic_groups["general"].append(md_file)
-            else:
-                # For any other files that don't match
-                if "general" not in topic_groups:
-                    topic_groups["general"] = []
-                topic_groups["general"].append(md_file)
-    
-    # Move files to their respective topic folders
-    for topic, files in topic_groups.items():
-        topic_dir = course_dir / topic
-        topic_dir.mkdir(exist_ok=True)
-        
-        for file in files:
-            # Only move if the file is in the root directory
-            if file.parent == course_dir:
-                target_path = topic_dir / file.name
-                # Copy instead of move to avoid issues with files in use
-                shutil.copy2(file, target_path)
+def organize_courses_into_folders(full: bool = False) -> Dict:
+    """Organize root-level courses into topic folders based on filename patterns
     
-    return {
-        "status": "success", 
-        "message": f"Organized {sum(len(files) for files in topic_groups.values())} files into {len(topic_groups)} topic folders",
-        "topics": list(topic_groups.keys())
-    }
+    Incremental: only root files that are new or changed since the last run
+    are placed (see course_organizer.py); full=True re-places every file.
+    Files are renamed, so no file data is copied.
+    """
+    from course_organizer import CourseOrganizer
+    
+    return CourseOrganizer("course_content").organize(full=full)
 
 # API Routes
 @app.post("/api/create-course")
@@ -490,14 +794,15 @@ async def create_course(request: CourseRequest):
     session_id = str(uuid.uuid4())
     
     # Store session info
-    course_sessions[session_id] = {
-        "topic": request.topic,
-        "images_per_module": request.images_per_module,
-        "videos_per_module": request.videos_per_module,
-        "status": "starting",
-        "created_at": time.time(),
-        "completed_modules": []
-    }
+    sessions = await run_io(get_session_store)
+    await run_io(
+        sessions.create,
+        session_id,
+        topic=request.topic,
+        images_per_module=request.images_per_module,
+        videos_per_module=request.videos_per_module,
+        keyword_mode=request.keyword_mode
+    )
     
     # Start course creation in background
     async def create_course_task():
@@ -506,92 +811,45 @@ async def create_course(request: CourseRequest):
                 session_id, 
                 request.topic,
                 request.images_per_module, 
-                request.videos_per_module
+                request.videos_per_module,
+                request.keyword_mode
             )
             await system.run_sequential_course_creation(request.topic)
-            course_sessions[session_id]["status"] = "completed"
+            await run_io(sessions.update, session_id, status="completed")
         except Exception as e:
             await manager.send_progress(session_id, {
                 "session_id": session_id,
                 "stage": "error",
                 "progress": 0,
                 "message": f"Course creation failed: {str(e)}",
-                "timestamp": time.time()
+                "timestamp": time.time(),
+                "final": True
             })
-            course_sessions[session_id]["status"] = "failed"
+            await run_io(sessions.update, session_id, status="failed", error=str(e))
     
     # Run in background
     asyncio.create_task(create_course_task())
     
     return {"session_id": session_id, "message": "Sequential course creation started"}
 
-@app.get("/api/courses")
-async def get_courses():
-    """Get all available courses organized by topic folders"""
-    topic_folders = {}
-    course_dir = Path("course_content")
+# Encoded /api/courses bodies keyed by (catalog ETag, content coding)
+courses_response_cache: Dict = {}
+
+def build_courses_listing() -> Dict:
+    """Legacy listing payload: every module with content, flat and by topic folder (blocking)"""
+    from course_catalog import get_course_catalog
     
-    if course_dir.exists():
-        # First, check for topic folders
-        for folder in [d for d in course_dir.iterdir() if d.is_dir()]:
-            topic_name = folder.name
-            topic_courses = []
-            
-            for md_file in folder.glob("*.md"):
-                try:
-                    with open(md_file, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        # Remove ```markdown prefix and suffix if present
-                        if content.startswith('```markdown'):
-                            content = content.replace('```markdown\n', '', 1)
-                            if content.endswith('```'):
-                                content = content[:-3]
-                        # Remove any triple backticks at the beginning or end of the content
-                        content = re.sub(r'^```\s*\n', '', content)
-                        content = re.sub(r'\n```\s*$', '', content)
-                        title = content.split('\n')[0].replace('#', '').strip() if content else md_file.stem
-                        
-                    topic_courses.append({
-                        "filename": md_file.name,
-                        "title": title,
-                        "content": content,
-                        "created_at": md_file.stat().st_mtime,
-                        "topic_folder": topic_name
-                    })
-                except Exception as e:
-                    print(f"Error reading {md_file}: {e}")
-            
-            if topic_courses:
-                topic_folders[topic_name] = sorted(topic_courses, key=lambda x: x["filename"])
-        
-        # Then check for files in the root directory (not in any folder)
-        root_courses = []
-        for md_file in course_dir.glob("*.md"):
-            try:
-                with open(md_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # Remove ```markdown prefix and suffix if present
-                    if content.startswith('```markdown'):
-                        content = content.replace('```markdown\n', '', 1)
-                        if content.endswith('```'):
-                            content = content[:-3]
-                    # Remove any triple backticks at the beginning or end of the content
-                    content = re.sub(r'^```\s*\n', '', content)
-                    content = re.sub(r'\n```\s*$', '', content)
-                    title = content.split('\n')[0].replace('#', '').strip() if content else md_file.stem
-                    
-                root_courses.append({
-                    "filename": md_file.name,
-                    "title": title,
-                    "content": content,
-                    "created_at": md_file.stat().st_mtime,
-                    "topic_folder": None
-                })
-            except Exception as e:
-                print(f"Error reading {md_file}: {e}")
-        
-        if root_courses:
-            topic_folders["uncategorized"] = sorted(root_courses, key=lambda x: x["filename"])
+    catalog = get_course_catalog()
+    topic_folders = {}
+    for entry in catalog.entries():
+        topic_name = entry.topic_folder or "uncategorized"
+        topic_folders.setdefault(topic_name, []).append({
+            "filename": entry.filename,
+            "title": entry.title,
+            "content": catalog.read_content(entry),
+            "created_at": entry.mtime,
+            "topic_folder": entry.topic_folder
+        })
     
     # Flatten the structure for backward compatibility
     all_courses = []
@@ -603,146 +861,598 @@ async def get_courses():
         "topic_folders": topic_folders
     }
 
+@app.get("/api/courses")
+async def get_courses(request: Request):
+    """Get all available courses organized by topic folders"""
+    from course_catalog import get_course_catalog
+    from http_caching import json_response
+    
+    # Module content is read from disk when the cached body is stale
+    return await run_io(json_response, request, build_courses_listing, get_course_catalog().listing_etag(),
+                        encoded_cache=courses_response_cache)
+
+# Fields available to /api/v2/courses; content is opt-in
+COURSE_LISTING_FIELDS = {"filename", "title", "topic_folder", "created_at", "size", "content_hash", "content_url", "raw_url", "content"}
+DEFAULT_COURSE_LISTING_FIELDS = ["filename", "title", "topic_folder", "created_at", "size", "content_hash", "content_url", "raw_url"]
+
+def encode_listing_cursor(sort_key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(sort_key)).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_listing_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        is_root, topic_folder, filename = json.loads(base64.urlsafe_b64decode(padded))
+        return (bool(is_root), str(topic_folder), str(filename))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/api/v2/courses")
+async def list_courses_v2(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    topic_folder: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None
+):
+    """Paginated, metadata-only course listing
+    
+    - cursor: opaque value from a previous page's next_cursor
+    - fields: comma-separated projection (default: metadata without content)
+    - topic_folder: only this folder ("uncategorized" for root files)
+    - since / until: bounds on created_at (unix timestamps)
+    """
+    from course_catalog import get_course_catalog, CourseCatalog
+    
+    if not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+    
+    selected_fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else DEFAULT_COURSE_LISTING_FIELDS
+    unknown_fields = set(selected_fields) - COURSE_LISTING_FIELDS
+    if unknown_fields:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown_fields))}")
+    
+    catalog = get_course_catalog()
+    entries = catalog.entries()
+    start = 0
+    if cursor:
+        start = bisect.bisect_right(entries, decode_listing_cursor(cursor), key=CourseCatalog.sort_key)
+    
+    page = []
+    next_cursor = None
+    for entry in entries[start:]:
+        if topic_folder is not None and (entry.topic_folder or "uncategorized") != topic_folder:
+            continue
+        if since is not None and entry.mtime < since:
+            continue
+        if until is not None and entry.mtime > until:
+            continue
+        if len(page) == limit:
+            next_cursor = encode_listing_cursor(CourseCatalog.sort_key(page[-1]))
+            break
+        page.append(entry)
+    
+    contents = None
+    if "content" in selected_fields:
+        contents = await run_io(lambda: [catalog.read_content(entry) for entry in page])
+    
+    items = []
+    for index, entry in enumerate(page):
+        record = entry.to_dict()
+        if contents is not None:
+            record["content"] = contents[index]
+        record["content_url"] = (
+            f"/api/course/{entry.topic_folder}/{entry.filename}" if entry.topic_folder else f"/api/course/{entry.filename}"
+        )
+        record["raw_url"] = raw_course_url(entry)
+        items.append({field: record[field] for field in selected_fields})
+    
+    return {
+        "items": items,
+        "count": len(items),
+        "next_cursor": next_cursor
+    }
+
+def load_uncataloged_entry(topic_folder: Optional[str], filename: str):
+    """Pick up a course file the catalog has not seen yet (blocking)"""
+    from course_catalog import get_course_catalog
+    
+    catalog = get_course_catalog()
+    path = catalog.path_for((topic_folder, filename))
+    # key_for rejects paths outside course_content/
+    if catalog.key_for(path) and path.exists():
+        catalog.notify_changed(path)
+    return catalog.get(topic_folder, filename)
+
+async def lookup_course_entry(topic_folder: Optional[str], filename: str):
+    """Catalog entry for a course file, picking up files the catalog has not seen yet"""
+    from course_catalog import get_course_catalog
+    
+    entry = get_course_catalog().get(topic_folder, filename)
+    if entry is None:
+        entry = await run_io(load_uncataloged_entry, topic_folder, filename)
+    return entry
+
+def course_content_response(request: Request, entry):
+    """JSON body of one module; reads the file unless the client's copy is current (blocking)"""
+    from course_catalog import get_course_catalog
+    from http_caching import json_response
+    
+    return json_response(request, lambda: {
+        "filename": entry.filename,
+        "title": entry.title,
+        "content": get_course_catalog().read_content(entry),
+        "created_at": entry.mtime,
+        "topic_folder": entry.topic_folder
+    }, entry.etag)
+
+@app.get("/api/course/{topic_folder}/manifest")
+async def get_course_manifest(topic_folder: str, request: Request):
+    """The course.json of a topic folder: structure, module states, sizes, hashes, media and timings"""
+    from course_catalog import get_course_catalog
+    from course_manifest import course_manifest_path
+    from http_caching import json_response
+    
+    if topic_folder.startswith("."):
+        raise HTTPException(status_code=404, detail="Course manifest not found")
+    course_directory = get_course_catalog().root / topic_folder
+    
+    try:
+        data = await run_io(course_manifest_path(course_directory).read_bytes)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Course manifest not found")
+    
+    return json_response(request, lambda: json.loads(data), hashlib.sha256(data).hexdigest())
+
+@app.get("/api/course/{topic_folder}/export")
+async def export_course(topic_folder: str, format: str = "zip", manifest: bool = True, media: bool = False):
+    """Download a whole topic folder as a streamed zip or tar.gz archive
+    
+    - format: zip or tar.gz
+    - manifest: include manifest.json with module titles, sizes and hashes
+    - media: include cached images referenced by the modules
+    
+    Registered before /api/course/{topic_folder}/{filename} so "export" is
+    not taken for a filename.
+    """
+    from course_catalog import get_course_catalog
+    from course_export import ARCHIVE_FORMATS, build_export, stream_archive
+    
+    if format not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(ARCHIVE_FORMATS)}")
+    
+    entries = [e for e in get_course_catalog().entries() if (e.topic_folder or "uncategorized") == topic_folder]
+    if not entries:
+        raise HTTPException(status_code=404, detail="Topic folder not found")
+    
+    export = await run_io(build_export, entries, topic_folder, media)
+    media_type, extension = ARCHIVE_FORMATS[format]
+    return StreamingResponse(
+        stream_archive(format, export["members"], export["manifest"] if manifest else None, topic_folder),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{topic_folder}.{extension}"'}
+    )
+
+@app.get("/api/course/{topic_folder}/{filename}/history")
+async def get_course_history(topic_folder: str, filename: str):
+    """Stored versions of a module, oldest first ("uncategorized" for root files)"""
+    from course_catalog import get_course_catalog
+    from blob_store import get_blob_store
+    
+    path = get_course_catalog().path_for((None if topic_folder == "uncategorized" else topic_folder, filename))
+    versions = await run_io(get_blob_store().history, path)
+    if not versions:
+        raise HTTPException(status_code=404, detail="No stored versions for this course file")
+    return {"topic_folder": topic_folder, "filename": filename, "versions": versions}
+
+def restore_course_version(path: Path, digest: str) -> Dict:
+    """Make a stored version current and refresh everything derived from it (blocking)"""
+    from blob_store import get_blob_store
+    from course_catalog import get_course_catalog
+    from course_store import get_course_store
+    from content_normalizer import build_metadata, write_sidecar, write_precompressed
+    
+    store = get_blob_store()
+    if digest not in {v["hash"] for v in store.history(path)}:
+        raise HTTPException(status_code=404, detail="Version not found")
+    
+    store.restore(path, digest)
+    data = path.read_bytes()
+    write_sidecar(path, build_metadata(data.decode("utf-8", errors="replace"), path.name))
+    write_precompressed(path, data)
+    
+    catalog = get_course_catalog()
+    catalog.notify_changed(path)
+    key = catalog.key_for(path)
+    course_store = get_course_store()
+    if course_store and key:
+        course_store.upsert_module(key[0], key[1], catalog.read_content(catalog.get(*key)) or "")
+    return {"message": f"Restored {path.name} to version {digest[:12]}", "hash": digest}
+
+@app.post("/api/course/{topic_folder}/{filename}/restore")
+async def restore_course(topic_folder: str, filename: str, request: dict):
+    """Restore an earlier stored version of a module: {"hash": "<sha256>"}"""
+    from course_catalog import get_course_catalog
+    
+    digest = request.get("hash")
+    if not digest:
+        raise HTTPException(status_code=400, detail="Missing hash")
+    
+    path = get_course_catalog().path_for((None if topic_folder == "uncategorized" else topic_folder, filename))
+    if get_course_catalog().key_for(path) is None:
+        raise HTTPException(status_code=400, detail="Invalid course path")
+    return await run_io(restore_course_version, path, digest)
+
 @app.get("/api/course/{topic_folder}/{filename}")
-async def get_course_content_in_folder(topic_folder: str, filename: str):
+async def get_course_content_in_folder(topic_folder: str, filename: str, request: Request):
     """Get specific course content from a topic folder"""
-    course_dir = Path("course_content")
-    file_path = course_dir / topic_folder / filename
-    
-    if not file_path.exists():
+    entry = await lookup_course_entry(topic_folder, filename)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Course file not found")
     
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            # Remove ```markdown prefix and suffix if present
-            if content.startswith('```markdown'):
-                content = content.replace('```markdown\n', '', 1)
-                if content.endswith('```'):
-                    content = content[:-3]
-            # Remove any triple backticks at the beginning or end of the content
-            content = re.sub(r'^```\s*\n', '', content)
-            content = re.sub(r'\n```\s*$', '', content)
-            title = content.split('\n')[0].replace('#', '').strip() if content else filename
-            
-        return {
-            "filename": filename,
-            "title": title,
-            "content": content,
-            "created_at": file_path.stat().st_mtime,
-            "topic_folder": topic_folder
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading course file: {str(e)}")
+    return await run_io(course_content_response, request, entry)
 
 @app.get("/api/course/{filename}")
-async def get_course_content(filename: str):
+async def get_course_content(filename: str, request: Request):
     """Get specific course content (backward compatibility)"""
-    course_dir = Path("course_content")
+    from course_catalog import get_course_catalog
     
     # First try to find the file in the root directory
-    file_path = course_dir / filename
-    if file_path.exists():
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                # Remove ```markdown prefix and suffix if present
-                if content.startswith('```markdown'):
-                    content = content.replace('```markdown\n', '', 1)
-                    if content.endswith('```'):
-                        content = content[:-3]
-                # Remove any triple backticks at the beginning or end of the content
-                content = re.sub(r'^```\s*\n', '', content)
-                content = re.sub(r'\n```\s*$', '', content)
-                title = content.split('\n')[0].replace('#', '').strip() if content else filename
-                
-            return {
-                "filename": filename,
-                "title": title,
-                "content": content,
-                "created_at": file_path.stat().st_mtime,
-                "topic_folder": None
-            }
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error reading course file: {str(e)}")
+    entry = await lookup_course_entry(None, filename)
     
-    # If not found in root, search in topic folders
-    for folder in [d for d in course_dir.iterdir() if d.is_dir()]:
-        potential_path = folder / filename
-        if potential_path.exists():
-            try:
-                with open(potential_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # Remove ```markdown prefix and suffix if present
-                    if content.startswith('```markdown'):
-                        content = content.replace('```markdown\n', '', 1)
-                        if content.endswith('```'):
-                            content = content[:-3]
-                    # Remove any triple backticks at the beginning or end of the content
-                    content = re.sub(r'^```\s*\n', '', content)
-                    content = re.sub(r'\n```\s*$', '', content)
-                    title = content.split('\n')[0].replace('#', '').strip() if content else filename
-                    
-                return {
-                    "filename": filename,
-                    "title": title,
-                    "content": content,
-                    "created_at": potential_path.stat().st_mtime,
-                    "topic_folder": folder.name
-                }
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Error reading course file: {str(e)}")
+    # If not found in root, look the name up in the filename index. Names
+    # shared by several topic folders resolve to the first folder by name.
+    if entry is None:
+        candidates = get_course_catalog().resolve(filename)
+        entry = candidates[0] if candidates else None
     
     # If not found anywhere
-    raise HTTPException(status_code=404, detail="Course file not found")
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Course file not found")
+    
+    return await run_io(course_content_response, request, entry)
 
-@app.post("/api/organize-courses")
-async def organize_courses():
-    """Organize existing courses into topic folders"""
-    result = organize_courses_into_folders()
+# Length of the content-hash prefix used to version /raw URLs
+RAW_VERSION_LENGTH = 16
+
+def raw_course_url(entry) -> str:
+    """Versioned /raw URL for a catalog entry; safe to cache forever"""
+    return f"/raw/{entry.topic_folder or 'uncategorized'}/{entry.filename}?v={entry.content_hash[:RAW_VERSION_LENGTH]}"
+
+@app.get("/raw/{topic_folder}/{filename}")
+async def get_raw_course(topic_folder: str, filename: str, request: Request, v: Optional[str] = None):
+    """Serve a module's markdown as stored, without a JSON wrapper
+    
+    Uses precomputed .gz/.br siblings when the client accepts them and
+    supports Range requests. With ?v=<content hash prefix> matching the
+    current content (see raw_url in /api/v2/courses) the response is
+    cacheable forever; otherwise clients revalidate with the ETag.
+    Use "uncategorized" as topic_folder for files in the course root.
+    """
+    from course_catalog import get_course_catalog
+    from http_caching import precompressed_file_response
+    
+    entry = await lookup_course_entry(None if topic_folder == "uncategorized" else topic_folder, filename)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Course file not found")
+    
+    if v and len(v) >= 8 and entry.content_hash.startswith(v):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "no-cache"
+    
+    path = get_course_catalog().path_for((entry.topic_folder, entry.filename))
+    try:
+        return await run_io(precompressed_file_response, request, path, "text/markdown; charset=utf-8",
+                            entry.content_hash, cache_control)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Course file not found")
+
+def organize_and_sync_courses(full: bool = False) -> Dict:
+    """Organize course files, then update the catalog and course store for the files placed (blocking)"""
+    from course_catalog import get_course_catalog
+    from course_store import get_course_store
+    
+    result = organize_courses_into_folders(full)
+    
+    catalog = get_course_catalog()
+    store = get_course_store()
+    for source, target in result.get("changes", []):
+        source, target = Path(source), Path(target)
+        moved = not source.exists()
+        if moved:
+            catalog.notify_moved(source, target)
+        else:
+            catalog.notify_changed(target)
+        
+        entry = catalog.get(target.parent.name, target.name)
+        if store and entry:
+            store.upsert_module(target.parent.name, target.name, catalog.read_content(entry) or "")
+            if moved:
+                store.delete_module(None, source.name)
     return result
 
+@app.post("/api/organize-courses")
+async def organize_courses(full: bool = False):
+    """Organize existing courses into topic folders (only new or changed files unless full=true)"""
+    return await run_io(organize_and_sync_courses, full)
+
 @app.get("/api/session/{session_id}")
 async def get_session_info(session_id: str):
-    """Get session information"""
-    if session_id not in course_sessions:
+    """Snapshot of a session: status, stage, per-module status and timings"""
+    session = await run_io(get_session_store().get, session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    return course_sessions[session_id]
+    return session
 
-@app.delete("/api/course/{filename}")
-async def delete_course(filename: str):
-    """Delete a specific course file"""
-    course_dir = Path("course_content")
-    file_path = course_dir / filename
-    
-    if not file_path.exists():
-        # Check in topic folders
-        for folder in [d for d in course_dir.iterdir() if d.is_dir()]:
-            potential_path = folder / filename
-            if potential_path.exists():
-                file_path = potential_path
+def require_progress_session(session_id: str):
+    """404 unless the session exists here or still has logged events (blocking)"""
+    if get_event_bus().get_log(session_id, create=False) is None and session_id not in get_session_store():
+        raise HTTPException(status_code=404, detail="Session not found")
+
+def negotiate_http_protocol(protocol: Optional[str]) -> ProgressProtocol:
+    try:
+        return ProgressProtocol.negotiate(protocol, "json")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def prepare_event(negotiated: ProgressProtocol, event: Dict) -> Dict:
+    if negotiated.needs_io(event):
+        return await run_io(negotiated.prepare, event)
+    return negotiated.prepare(event)
+
+@app.get("/api/session/{session_id}/events")
+async def stream_session_events(session_id: str, request: Request, last_event_id: Optional[int] = None,
+                                protocol: Optional[str] = None):
+    """Progress events as a Server-Sent Events stream
+    
+    Same events (and seq numbers, sent as event ids) as /ws/{session_id}.
+    Reconnecting EventSource clients resume after their Last-Event-ID
+    header (or ?last_event_id=). The stream ends after the session's final
+    event; a reconnect after that gets 204 so the browser stops retrying.
+    """
+    from config import get_config
+    from progress_protocol import format_sse
+    
+    await run_io(require_progress_session, session_id)
+    negotiated = negotiate_http_protocol(protocol)
+    header = request.headers.get("last-event-id", "")
+    after_seq = int(header) if header.isdigit() else (last_event_id or 0)
+    
+    bus = get_event_bus()
+    if bus.is_finished(session_id, after_seq):
+        return Response(status_code=204)
+    
+    config = get_config()
+    subscription = await run_io(bus.subscribe, session_id, after_seq, config.progress_send_queue,
+                                asyncio.get_running_loop())
+    heartbeat = config.progress_sse_heartbeat or None
+    
+    async def event_stream():
+        try:
+            yield f"retry: {config.progress_sse_retry_ms}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # Comment line so idle proxies keep the connection open
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield format_sse(event, json.dumps(await prepare_event(negotiated, event)))
+                if bus.is_finished(session_id, event["seq"]):
+                    break
+        finally:
+            bus.unsubscribe(subscription)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.get("/api/session/{session_id}/poll")
+async def poll_session_events(session_id: str, after: int = 0, timeout: float = 25.0,
+                              protocol: Optional[str] = None):
+    """Long-poll fallback: events after seq `after`, waiting up to `timeout` seconds for one
+    
+    Returns at once when events are already waiting. Clients pass the
+    returned last_seq as `after` on the next request; done is true once the
+    session has ended and every event has been delivered.
+    """
+    from config import get_config
+    
+    await run_io(require_progress_session, session_id)
+    negotiated = negotiate_http_protocol(protocol)
+    bus = get_event_bus()
+    
+    subscription = await run_io(bus.subscribe, session_id, after, get_config().progress_send_queue,
+                                asyncio.get_running_loop())
+    events = []
+    try:
+        if not subscription.queue and not bus.is_finished(session_id, after):
+            try:
+                event = await asyncio.wait_for(subscription.get(), max(0.0, min(timeout, 60.0)))
+                if event is not None:
+                    events.append(event)
+            except asyncio.TimeoutError:
+                pass
+        # Whatever else is already queued goes in the same response
+        while subscription.queue:
+            event = await subscription.get()
+            if event is None:
                 break
-        else:
-            raise HTTPException(status_code=404, detail="Course file not found")
+            events.append(event)
+    finally:
+        bus.unsubscribe(subscription)
+    
+    last_seq = events[-1]["seq"] if events else after
+    return {
+        "session_id": session_id,
+        "events": [await prepare_event(negotiated, event) for event in events],
+        "last_seq": last_seq,
+        "done": bus.is_finished(session_id, last_seq)
+    }
+
+def delete_course_entry(entry) -> Dict:
+    from course_catalog import get_course_catalog
+    from content_normalizer import remove_derived_files
+    from blob_store import get_blob_store
     
+    catalog = get_course_catalog()
+    file_path = catalog.path_for((entry.topic_folder, entry.filename))
     try:
         file_path.unlink()
-        return {"message": f"Course {filename} deleted successfully"}
+        catalog.notify_deleted(file_path)
+        remove_derived_files(file_path)
+        get_blob_store().forget(file_path)
+        
+        from course_store import get_course_store
+        store = get_course_store()
+        if store:
+            store.delete_module(entry.topic_folder, entry.filename)
+        return {"message": f"Course {entry.filename} deleted successfully", "topic_folder": entry.topic_folder}
+    except FileNotFoundError:
+        catalog.notify_deleted(file_path)
+        raise HTTPException(status_code=404, detail="Course file not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting course: {str(e)}")
 
+@app.delete("/api/course/{topic_folder}/{filename}")
+async def delete_course_in_folder(topic_folder: str, filename: str):
+    """Delete a course file from a specific topic folder"""
+    entry = await lookup_course_entry(topic_folder, filename)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Course file not found")
+    
+    return await run_io(delete_course_entry, entry)
+
+@app.delete("/api/course/{filename}")
+async def delete_course(filename: str):
+    """Delete a specific course file
+    
+    Resolves the name like older clients expect after organizing: the topic
+    folder copy is deleted together with the root duplicate that a copying
+    organize run leaves behind. If the name exists in more than one topic
+    folder the request is rejected with 409 and the candidate locations, so
+    the caller can pick one through DELETE /api/course/{topic_folder}/{filename}.
+    """
+    from course_catalog import get_course_catalog
+    
+    candidates = get_course_catalog().resolve(filename)
+    if not candidates:
+        entry = await lookup_course_entry(None, filename)
+        candidates = [entry] if entry else []
+    
+    if not candidates:
+        raise HTTPException(status_code=404, detail="Course file not found")
+    
+    in_folders = [e for e in candidates if e.topic_folder]
+    if len(in_folders) > 1:
+        raise HTTPException(status_code=409, detail={
+            "message": f"Course filename {filename} is ambiguous",
+            "candidates": [
+                {"topic_folder": e.topic_folder, "filename": e.filename, "path": f"{e.topic_folder}/{e.filename}"}
+                for e in in_folders
+            ]
+        })
+    
+    result = await run_io(delete_course_entry, in_folders[0] if in_folders else candidates[0])
+    if in_folders:
+        root_copy = next((e for e in candidates if e.topic_folder is None), None)
+        if root_copy is not None:
+            try:
+                await run_io(delete_course_entry, root_copy)
+            except HTTPException as e:
+                # Already gone is fine; the course itself was deleted
+                if e.status_code != 404:
+                    raise
+    return result
+
+@app.get("/api/media/proxy")
+async def proxy_media(url: str, request: Request):
+    """Fetch a remote image once and serve the cached local copy"""
+    from image_proxy import get_image_proxy, UnsafeURLError
+    from http_caching import cached_file_response
+    
+    try:
+        cached = await run_io(get_image_proxy().fetch, url)
+    except UnsafeURLError:
+        raise HTTPException(status_code=400, detail="Only public http(s) image URLs can be proxied")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Error fetching image: {str(e)}")
+    
+    return await run_io(cached_file_response, request, cached.path, cached.media_type, cached.digest,
+                        "public, max-age=86400", {"Content-Location": f"/api/media/{cached.digest}"})
+
+@app.get("/api/media/{digest}")
+async def get_cached_media(digest: str, request: Request):
+    """Serve a cached image by content digest"""
+    from image_proxy import get_image_proxy
+    from http_caching import cached_file_response
+    
+    proxy = get_image_proxy()
+    cached = await run_io(proxy.get, digest)
+    if not cached:
+        # Evicted from the cache; course links still point here, so fetch it again
+        try:
+            cached = await run_io(proxy.refetch, digest)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Error fetching image: {str(e)}")
+        if not cached:
+            raise HTTPException(status_code=404, detail="Media not found")
+        if cached.digest != digest:
+            # The remote image changed; this URL is served as immutable, so point at the new one
+            return RedirectResponse(f"/api/media/{cached.digest}", status_code=307)
+    
+    return await run_io(cached_file_response, request, cached.path, cached.media_type, cached.digest,
+                        "public, max-age=31536000, immutable")
+
+@app.get("/api/search")
+async def search_courses(q: str, limit: int = 20, topic_folder: Optional[str] = None):
+    """Full-text search over course modules, ranked by relevance
+    
+    Requires COURSE_STORE_BACKEND=sqlite. Results carry a snippet with
+    matched terms wrapped in <mark> tags.
+    """
+    from course_store import get_course_store
+    
+    store = await run_io(get_course_store)
+    if store is None:
+        raise HTTPException(status_code=503, detail="Search requires COURSE_STORE_BACKEND=sqlite")
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    
+    limit = max(1, min(limit, 100))
+    if topic_folder == "uncategorized":
+        topic_folder = ""
+    results = await run_io(store.search, q, limit, topic_folder)
+    return {"query": q, "results": results, "count": len(results)}
+
+def course_store_stats() -> Optional[Dict]:
+    from course_store import get_course_store
+    
+    store = get_course_store()
+    return store.get_stats() if store else None
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint with configuration status"""
     try:
         from config import get_config
         from api_client import test_api_connections
+        from http_pool import get_media_client_stats
+        from course_catalog import get_course_catalog
+        from blob_store import get_blob_store
+        from course_writer import get_course_writer
+        from async_io import get_io_stats
+        from llm_json import get_parse_stats
         
         config = get_config()
         
         # Test API connections
-        api_tests = test_api_connections()
+        api_tests = await run_io(test_api_connections)
         
         # Count working providers
         working_providers = [p for p, r in api_tests.items() if r["success"]]
@@ -759,7 +1469,18 @@ async def health_check():
             "media_search": {
                 "images": config.is_media_search_enabled(),
                 "youtube": config.is_youtube_search_enabled()
-            }
+            },
+            "media_http": get_media_client_stats(),
+            "course_catalog": get_course_catalog().get_stats(),
+            "course_store": await run_io(course_store_stats),
+            "io_pool": get_io_stats(),
+            "blob_store": await run_io(get_blob_store().get_stats),
+            "course_writer": get_course_writer().get_stats(),
+            "progress_events": get_event_bus().get_stats(),
+            "websockets": manager.get_stats(),
+            "sessions": get_session_store().get_stats(),
+            "progress_relay": get_progress_relay().get_stats() if get_progress_relay() else None,
+            "llm_json": get_parse_stats()
         }
     except Exception as e:
         return {
@@ -779,8 +1500,11 @@ async def regenerate_module(request: dict):
     if not all([filename, session_id, module_info]):
         raise HTTPException(status_code=400, detail="Missing required parameters")
     
+    if request.get('keyword_mode', 'llm') not in ("llm", "local"):
+        raise HTTPException(status_code=400, detail="keyword_mode must be 'llm' or 'local'")
+    
     # Create a temporary system for regeneration
-    system = SequentialCourseCreationSystemWithFolders(session_id, topic or "general", 1, 1)
+    system = SequentialCourseCreationSystemWithFolders(session_id, topic or "general", 1, 1, request.get('keyword_mode', 'llm'))
     
     try:
         # Regenerate the module content
@@ -791,7 +1515,13 @@ async def regenerate_module(request: dict):
         )
         
         # Save the regenerated content
-        system.save_content_to_file(filename, final_content)
+        await system.save_module(filename, final_content)
+        
+        manifest = CourseManifest(system.course_directory)
+        if manifest.exists:
+            saved = await run_io(system.record_module_in_manifest, manifest, None, filename)
+            if saved is not None:
+                await asyncio.wrap_future(saved)
         
         return {
             "filename": filename,
@@ -803,28 +1533,47 @@ async def regenerate_module(request: dict):
         raise HTTPException(status_code=500, detail=f"Error regenerating module: {str(e)}")
 
 @app.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str):
-    """WebSocket endpoint for real-time progress updates"""
-    await manager.connect(websocket, session_id)
+async def websocket_endpoint(websocket: WebSocket, session_id: str, last_seq: int = 0,
+                             protocol: Optional[str] = None, encoding: Optional[str] = None):
+    """WebSocket endpoint for real-time progress updates
     
+    Every event carries a seq. On connect, events after ?last_seq= (all
+    logged events by default) are replayed first; a connected client can
+    also send {"type": "resume", "last_seq": N} to replay again.
+    
+    ?protocol=v2 sends compact events that reference module content instead
+    of including it, and ?encoding=msgpack sends binary msgpack frames (see
+    progress_protocol.py). Control messages are always JSON text.
+    """
     try:
+        negotiated = ProgressProtocol.negotiate(protocol, encoding)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    
+    await manager.connect(websocket, session_id, last_seq, negotiated)
+    
+    try:
+        # Idle until the client sends something; keep-alive pings are sent by
+        # the server's WebSocket protocol layer, not by this loop
         while True:
-            # Keep connection alive and listen for any messages
+            message = await websocket.receive_text()
             try:
-                # Wait for messages with timeout
-                message = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
-                # Handle any client messages if needed
+                request = json.loads(message)
+            except json.JSONDecodeError:
+                request = None
+            if isinstance(request, dict) and request.get("type") == "resume":
+                await manager.resume(session_id, websocket, int(request.get("last_seq", 0)))
+            else:
                 print(f"Received message from {session_id}: {message}")
-            except asyncio.TimeoutError:
-                # Send ping to keep connection alive
-                await websocket.ping()
     except WebSocketDisconnect:
-        manager.disconnect(session_id)
+        manager.disconnect(session_id, websocket)
         print(f"Client {session_id} disconnected")
     except Exception as e:
         print(f"WebSocket error for {session_id}: {e}")
-        manager.disconnect(session_id)
+        manager.disconnect(session_id, websocket)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    from config import get_config
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=get_config().progress_ws_deflate)
\ No newline at end of file
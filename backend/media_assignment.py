@@ -0,0 +1,143 @@
+"""
+Course-wide media de-duplication and assignment
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Set
+from urllib.parse import urlparse, parse_qs, urlunparse
+
+MEDIA_KINDS = ("images", "videos")
+
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "into", "your", "you", "this", "that",
+    "are", "how", "what", "why", "using", "use", "guide", "tutorial", "introduction",
+    "module", "part", "basics", "overview", "explained", "explanation", "video"
+}
+
+def tokenize(text: str) -> Set[str]:
+    """Lowercase word set used for relevance scoring"""
+    return {w for w in re.findall(r"[a-z0-9]+", (text or "").lower()) if len(w) > 2 and w not in STOPWORDS}
+
+def youtube_video_id(url: str) -> Optional[str]:
+    """Extract the video ID from a YouTube watch/short/embed URL"""
+    parsed = urlparse(url or "")
+    host = parsed.netloc.lower()
+    if host.endswith("youtu.be"):
+        return parsed.path.lstrip("/").split("/")[0] or None
+    if "youtube" in host:
+        if parsed.path == "/watch":
+            return parse_qs(parsed.query).get("v", [None])[0]
+        match = re.match(r"/(?:embed|shorts|v)/([^/?#]+)", parsed.path)
+        if match:
+            return match.group(1)
+    return None
+
+def media_key(item: Dict[str, Any], kind: str) -> str:
+    """Identity of a media item: video ID for videos, normalized URL otherwise"""
+    url = item.get("url", "")
+    if kind == "videos":
+        video_id = youtube_video_id(url)
+        if video_id:
+            return f"yt:{video_id}"
+    parsed = urlparse(url.strip())
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path, "", parsed.query, ""))
+
+@dataclass
+class MediaCandidate:
+    """A unique media item and the modules whose searches returned it"""
+    key: str
+    kind: str
+    item: Dict[str, Any]
+    tokens: Set[str]
+    sources: Set[int] = field(default_factory=set)
+
+class CourseMediaAssigner:
+    """Collects media candidates for every module and assigns each item to one module"""
+
+    def __init__(self, images_per_module: int = 1, videos_per_module: int = 1):
+        self.capacity = {"images": images_per_module, "videos": videos_per_module}
+        self.candidates: Dict[str, MediaCandidate] = {}
+        self.module_terms: Dict[int, Set[str]] = {}
+        self.assignments: Dict[int, Dict[str, List[Dict[str, Any]]]] = {}
+        self.assigned_keys: Set[str] = set()
+
+    def add_module(self, module_index: int, module_info: Dict[str, Any], keywords_data: Optional[Dict] = None):
+        """Register a module and the terms its media should match"""
+        text = " ".join([
+            module_info.get("title", ""),
+            " ".join(module_info.get("subtopics", [])),
+            " ".join(module_info.get("objectives", []))
+        ])
+        terms = tokenize(text)
+        for keyword in (keywords_data or {}).get("image_keywords", []) + (keywords_data or {}).get("video_keywords", []):
+            terms |= tokenize(keyword)
+        self.module_terms[module_index] = terms
+        self.assignments.setdefault(module_index, {"images": [], "videos": []})
+
+    def add_candidates(self, module_index: int, kind: str, items: List[Dict[str, Any]]) -> int:
+        """Add search results found for a module; returns the number of new unique items"""
+        added = 0
+        for item in items:
+            if not item.get("url"):
+                continue
+            key = media_key(item, kind)
+            candidate = self.candidates.get(key)
+            if candidate is None:
+                text = " ".join(str(item.get(f, "")) for f in ("title", "context", "description", "channel"))
+                candidate = MediaCandidate(key=key, kind=kind, item=item, tokens=tokenize(text))
+                self.candidates[key] = candidate
+                added += 1
+            candidate.sources.add(module_index)
+        return added
+
+    def score(self, candidate: MediaCandidate, module_index: int) -> float:
+        """Relevance of a candidate to a module"""
+        terms = self.module_terms.get(module_index, set())
+        overlap = len(candidate.tokens & terms) / (len(terms) or 1)
+        # Results returned by the module's own searches get a head start so
+        # ties go to the module that asked for them.
+        return overlap + (0.5 if module_index in candidate.sources else 0.0)
+
+    def remaining(self, module_index: int, kind: str) -> int:
+        return self.capacity[kind] - len(self.assignments[module_index][kind])
+
+    def assign(self) -> Dict[int, Dict[str, List[Dict[str, Any]]]]:
+        """Global greedy matching of unassigned candidates to modules with free slots"""
+        pairs = []
+        for candidate in self.candidates.values():
+            if candidate.key in self.assigned_keys:
+                continue
+            for module_index in self.module_terms:
+                if self.remaining(module_index, candidate.kind) <= 0:
+                    continue
+                score = self.score(candidate, module_index)
+                if score > 0:
+                    pairs.append((score, module_index, candidate.key))
+
+        pairs.sort(key=lambda p: (-p[0], p[1], p[2]))
+        for _, module_index, key in pairs:
+            candidate = self.candidates[key]
+            if key in self.assigned_keys or self.remaining(module_index, candidate.kind) <= 0:
+                continue
+            self.assignments[module_index][candidate.kind].append(candidate.item)
+            self.assigned_keys.add(key)
+
+        return self.assignments
+
+    def shortfall(self) -> Dict[int, Dict[str, int]]:
+        """Modules still missing media, with the number of free slots per kind"""
+        short = {}
+        for module_index in self.module_terms:
+            missing = {kind: self.remaining(module_index, kind) for kind in MEDIA_KINDS}
+            if any(missing.values()):
+                short[module_index] = missing
+        return short
+
+    def get_stats(self) -> Dict[str, Any]:
+        duplicates = sum(len(c.sources) - 1 for c in self.candidates.values())
+        return {
+            "unique_candidates": len(self.candidates),
+            "duplicate_hits": duplicates,
+            "assigned": len(self.assigned_keys),
+            "short_modules": len(self.shortfall())
+        }
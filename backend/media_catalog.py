@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Local media catalog backend for offline image and video search.
+
+Curated images and videos are imported from JSON or CSV into a SQLite
+database with an FTS5 index (or an in-memory inverted index when the SQLite
+build has no FTS5). ImageSearchTool and YouTubeSearchTool query it instead
+of the Google APIs when MEDIA_BACKEND=local.
+"""
+import csv
+import json
+import re
+import sqlite3
+import threading
+import argparse
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+KINDS = ("image", "video")
+
+# Fields returned for each kind, matching the Google-backed tool output
+IMAGE_FIELDS = ("url", "title", "context", "thumbnail", "size")
+VIDEO_FIELDS = ("title", "url", "channel", "description", "published", "duration", "views")
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+def _normalize_kind(kind: str) -> str:
+    kind = (kind or "").lower().rstrip("s")
+    if kind not in KINDS:
+        raise ValueError(f"Unknown media kind: {kind}")
+    return kind
+
+class LocalMediaCatalog:
+    """SQLite-backed catalog of curated media with full-text search"""
+
+    def __init__(self, db_path: str = "media_catalog.db"):
+        self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.has_fts5 = self._fts5_available()
+        self._index: Optional[Dict[str, set]] = None
+        self._create_schema()
+
+    def _fts5_available(self) -> bool:
+        try:
+            self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)")
+            self.conn.execute("DROP TABLE temp._fts5_probe")
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def _create_schema(self):
+        with self._lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS media (
+                    id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    title TEXT NOT NULL DEFAULT '',
+                    description TEXT NOT NULL DEFAULT '',
+                    tags TEXT NOT NULL DEFAULT '',
+                    data TEXT NOT NULL,
+                    UNIQUE(kind, url)
+                )
+            """)
+            if self.has_fts5:
+                self.conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS media_fts USING fts5(
+                        title, description, tags,
+                        content='media', content_rowid='id'
+                    )
+                """)
+
+    def add(self, kind: str, item: Dict[str, Any]) -> bool:
+        """Insert or replace a single catalog entry"""
+        kind = _normalize_kind(kind)
+        url = item.get("url", "").strip()
+        if not url:
+            return False
+
+        tags = item.get("tags", "")
+        if isinstance(tags, list):
+            tags = " ".join(tags)
+        description = item.get("description") or item.get("context", "")
+        fields = IMAGE_FIELDS if kind == "image" else VIDEO_FIELDS
+        data = {f: item.get(f, "") for f in fields}
+        if kind == "image":
+            data["context"] = data["context"] or description
+        else:
+            data["description"] = description
+
+        with self._lock, self.conn:
+            existing = self.conn.execute("SELECT id, title, description, tags FROM media WHERE kind = ? AND url = ?", (kind, url)).fetchone()
+            if existing and self.has_fts5:
+                self.conn.execute(
+                    "INSERT INTO media_fts(media_fts, rowid, title, description, tags) VALUES('delete', ?, ?, ?, ?)",
+                    (existing["id"], existing["title"], existing["description"], existing["tags"])
+                )
+            cursor = self.conn.execute(
+                """INSERT INTO media(kind, url, title, description, tags, data) VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(kind, url) DO UPDATE SET title=excluded.title, description=excluded.description,
+                   tags=excluded.tags, data=excluded.data""",
+                (kind, url, item.get("title", ""), description, tags, json.dumps(data))
+            )
+            row_id = existing["id"] if existing else cursor.lastrowid
+            if self.has_fts5:
+                self.conn.execute(
+                    "INSERT INTO media_fts(rowid, title, description, tags) VALUES (?, ?, ?, ?)",
+                    (row_id, item.get("title", ""), description, tags)
+                )
+        self._index = None
+        return True
+
+    def import_file(self, path: str) -> Dict[str, int]:
+        """Import a JSON or CSV file of curated media
+
+        JSON may be {"images": [...], "videos": [...]} or a list of objects with
+        a "kind" field. CSV needs a header row with at least kind, url and title.
+        """
+        path = Path(path)
+        counts = {"image": 0, "video": 0}
+
+        if path.suffix.lower() == ".csv":
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = [(row.get("kind", ""), row) for row in csv.DictReader(f)]
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                rows = [("image", item) for item in data.get("images", [])]
+                rows += [("video", item) for item in data.get("videos", [])]
+            else:
+                rows = [(item.get("kind", ""), item) for item in data]
+
+        for kind, item in rows:
+            try:
+                if self.add(kind, item):
+                    counts[_normalize_kind(kind)] += 1
+            except ValueError as e:
+                print(f"Skipping catalog entry {item.get('url', '')}: {e}")
+
+        return counts
+
+    def _build_index(self) -> Dict[str, set]:
+        """Inverted index used when FTS5 is not available"""
+        index: Dict[str, set] = {}
+        for row in self.conn.execute("SELECT id, title, description, tags FROM media"):
+            for token in set(_tokens(f"{row['title']} {row['description']} {row['tags']}")):
+                index.setdefault(token, set()).add(row["id"])
+        return index
+
+    def search(self, kind: str, query: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """Return up to `limit` catalog entries of the given kind ranked by relevance"""
+        kind = _normalize_kind(kind)
+        tokens = _tokens(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            if self.has_fts5:
+                match = " OR ".join(f'"{t}"' for t in tokens)
+                rows = self.conn.execute(
+                    """SELECT media.data FROM media_fts JOIN media ON media.id = media_fts.rowid
+                       WHERE media_fts MATCH ? AND media.kind = ?
+                       ORDER BY bm25(media_fts, 10.0, 2.0, 5.0) LIMIT ?""",
+                    (match, kind, limit)
+                ).fetchall()
+                return [json.loads(row["data"]) for row in rows]
+
+            if self._index is None:
+                self._index = self._build_index()
+            scores: Dict[int, int] = {}
+            for token in tokens:
+                for row_id in self._index.get(token, ()):
+                    scores[row_id] = scores.get(row_id, 0) + 1
+            if not scores:
+                return []
+            # Scores go through a temp table so the kind filter and ranking are
+            # one JOIN, however many ids matched (no bound-variable limit)
+            with self.conn:
+                self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS media_scores (id INTEGER PRIMARY KEY, score INTEGER NOT NULL)")
+                self.conn.execute("DELETE FROM temp.media_scores")
+                self.conn.executemany("INSERT INTO temp.media_scores(id, score) VALUES (?, ?)", scores.items())
+                rows = self.conn.execute(
+                    """SELECT media.data FROM temp.media_scores AS s JOIN media ON media.id = s.id
+                       WHERE media.kind = ? ORDER BY s.score DESC, s.id LIMIT ?""",
+                    (kind, limit)
+                ).fetchall()
+                self.conn.execute("DELETE FROM temp.media_scores")
+            return [json.loads(row["data"]) for row in rows]
+
+    def count(self) -> Dict[str, int]:
+        counts = {kind: 0 for kind in KINDS}
+        with self._lock:
+            for row in self.conn.execute("SELECT kind, COUNT(*) AS n FROM media GROUP BY kind"):
+                counts[row["kind"]] = row["n"]
+        return counts
+
+# Global catalog instance (opened on first use)
+_catalog: Optional[LocalMediaCatalog] = None
+_catalog_lock = threading.Lock()
+
+def get_media_catalog() -> LocalMediaCatalog:
+    """Get the configured local media catalog"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                from config import get_config
+                _catalog = LocalMediaCatalog(get_config().media_catalog_path)
+    return _catalog
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local media catalog")
+    parser.add_argument("--db", default=None, help="Catalog database path (defaults to MEDIA_CATALOG_PATH)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Import curated media from JSON or CSV")
+    import_parser.add_argument("files", nargs="+")
+
+    search_parser = subparsers.add_parser("search", help="Search the catalog")
+    search_parser.add_argument("kind", choices=KINDS)
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=5)
+
+    args = parser.parse_args()
+    catalog = LocalMediaCatalog(args.db) if args.db else get_media_catalog()
+
+    if args.command == "import":
+        for file in args.files:
+            counts = catalog.import_file(file)
+            print(f"✅ Imported {counts['image']} images and {counts['video']} videos from {file}")
+        print(f"📚 Catalog now holds: {catalog.count()}")
+    else:
+        print(json.dumps(catalog.search(args.kind, args.query, args.limit), indent=2))
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Migration script to normalize existing course files.
+This script cleans every markdown module under course_content (root and
+topic folders) the same way new modules are cleaned when saved, and writes
+the sidecar metadata record next to each one.
+"""
+
+import argparse
+from pathlib import Path
+
+from content_normalizer import normalize_file
+
+def normalize_courses(dry_run=False):
+    """Normalize all course files and write their metadata sidecars"""
+    course_dir = Path("course_content")
+    
+    if not course_dir.exists():
+        print(f"Error: Course directory '{course_dir}' not found")
+        return {"status": "error", "message": "Course directory not found"}
+    
+    md_files = sorted(list(course_dir.glob("*.md")) + list(course_dir.glob("*/*.md")))
+    print(f"Found {len(md_files)} markdown files")
+    
+    changed = 0
+    for md_file in md_files:
+        try:
+            if normalize_file(md_file, dry_run=dry_run):
+                changed += 1
+                print(f"{'Would normalize' if dry_run else 'Normalized'} '{md_file.relative_to(course_dir)}'")
+        except Exception as e:
+            print(f"  ✗ Failed to normalize '{md_file}': {e}")
+    
+    print(f"\n{changed} of {len(md_files)} files {'need' if dry_run else 'were'} normalized")
+    
+    return {
+        "status": "dry_run" if dry_run else "success",
+        "message": f"Normalized {changed} of {len(md_files)} files",
+        "normalized": changed
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize course files and write metadata sidecars")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would be done without making changes")
+    args = parser.parse_args()
+    
+    result = normalize_courses(dry_run=args.dry_run)
+    
+    if args.dry_run:
+        print("\nThis was a dry run. Run without --dry-run to normalize the files.")
@@ -19,6 +19,11 @@ from enhanced_llm import EnhancedLLM
 from config import get_config
 from error_handler import handle_error
 from api_client import call_ai_api
+from http_pool import get_media_client
+from media_catalog import get_media_catalog
+from content_normalizer import normalize_markdown, build_metadata, write_sidecar, write_precompressed
+from course_writer import get_course_writer
+from llm_json import JSONExtractionError, extract_course_structure
 
 # Tool Classes (keeping the existing ones but with better error handling)
 class ImageSearchInput(BaseModel):
@@ -28,7 +33,7 @@ class ImageSearchInput(BaseModel):
 
 class ImageSearchTool(BaseTool):
     name: str = "image_search_tool"
-    description: str = "Search for relevant images using Google Custom Search API"
+    description: str = "Search for relevant images using Google Custom Search API or the local media catalog"
     args_schema: Type[BaseModel] = ImageSearchInput
 
     def _run(self, query: str, num_results: int = 1) -> str:
@@ -39,6 +44,12 @@ class ImageSearchTool(BaseTool):
             if not config.is_media_search_enabled():
                 return "Image search is not configured. Please set GOOGLE_API_KEY and SEARCH_ENGINE_ID."
             
+            if config.get_media_backend("image") == "local":
+                results = get_media_catalog().search("image", query, num_results)
+                if not results:
+                    return f"No images found for query: {query}"
+                return json.dumps(results, indent=2)
+            
             url = "https://www.googleapis.com/customsearch/v1"
             params = {
                 'key': config.google_api_key,
@@ -51,7 +62,7 @@ class ImageSearchTool(BaseTool):
                 'imgSize': 'large'
             }
 
-            response = requests.get(url, params=params, timeout=10)
+            response = get_media_client().get(url, params=params)
             response.raise_for_status()
 
             data = response.json()
@@ -84,7 +95,7 @@ class YouTubeSearchInput(BaseModel):
 
 class YouTubeSearchTool(BaseTool):
     name: str = "youtube_search_tool"
-    description: str = "Search for relevant YouTube videos using YouTube Data API"
+    description: str = "Search for relevant YouTube videos using YouTube Data API or the local media catalog"
     args_schema: Type[BaseModel] = YouTubeSearchInput
 
     def _run(self, query: str, num_results: int = 1) -> str:
@@ -95,6 +106,12 @@ class YouTubeSearchTool(BaseTool):
             if not config.is_youtube_search_enabled():
                 return "YouTube search is not configured. Please set YOUTUBE_API_KEY."
 
+            if config.get_media_backend("video") == "local":
+                results = get_media_catalog().search("video", query, num_results)
+                if not results:
+                    return f"No videos found for query: {query}"
+                return json.dumps(results, indent=2)
+
             url = "https://www.googleapis.com/youtube/v3/search"
             params = {
                 'part': 'snippet',
@@ -107,7 +124,7 @@ class YouTubeSearchTool(BaseTool):
                 'videoDefinition': 'high'
             }
 
-            response = requests.get(url, params=params, timeout=10)
+            response = get_media_client().get(url, params=params)
             response.raise_for_status()
 
             data = response.json()
@@ -124,7 +141,7 @@ class YouTubeSearchTool(BaseTool):
                 'key': config.youtube_api_key
             }
 
-            details_response = requests.get(details_url, params=details_params, timeout=10)
+            details_response = get_media_client().get(details_url, params=details_params)
             details_response.raise_for_status()
             details_data = details_response.json()
 
@@ -282,13 +299,30 @@ class EnhancedCourseCreationSystem:
             agent=agent
         )
 
-    def save_content_to_file(self, filename: str, content: str):
-        """Save content to markdown file"""
+    def prepare_content(self, content: str) -> str:
+        """Module content as it is stored: image links proxied (when enabled) and normalized"""
+        if self.config.image_proxy_rewrite:
+            from image_proxy import get_image_proxy
+            content = get_image_proxy().rewrite_markdown(content, self.config.image_proxy_base_url)
+        
+        # Normalize once here so readers can serve the stored bytes as-is
+        return normalize_markdown(content)
+
+    def content_saved(self, filename: str, content: str):
+        """Write a saved module's sidecar and precompressed copies"""
         file_path = self.course_directory / filename
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        write_sidecar(file_path, build_metadata(content, filename))
+        write_precompressed(file_path, content.encode('utf-8'))
         print(f"✅ Saved: {filename}")
 
+    def save_content_to_file(self, filename: str, content: str):
+        """Save content to markdown file (returns once the write is durable)"""
+        content = self.prepare_content(content)
+        # Crash-safe, batched write; stored content-addressed so the previous
+        # version stays in the file's history
+        get_course_writer().write(self.course_directory / filename, content.encode('utf-8'))
+        self.content_saved(filename, content)
+
     def create_default_structure(self, course_topic: str) -> Dict:
         """Create a default course structure if JSON parsing fails"""
         base_name = course_topic.lower().replace(' ', '_').replace('-', '_')
@@ -352,13 +386,11 @@ class EnhancedCourseCreationSystem:
                     print("Using default structure...")
                     course_structure = self.create_default_structure(course_topic)
                 else:
-                    json_match = re.search(r'\{.*\}', raw_output, re.DOTALL)
-                    if json_match:
-                        json_str = json_match.group()
-                        course_structure = json.loads(json_str)
+                    try:
+                        course_structure = extract_course_structure(raw_output)
                         print(f"✅ Parsed course structure: {len(course_structure.get('modules', []))} modules")
-                    else:
-                        print("⚠️ Using default structure")
+                    except JSONExtractionError as e:
+                        print(f"⚠️ Using default structure, course structure could not be parsed: {e}")
                         course_structure = self.create_default_structure(course_topic)
                         
             except Exception as e:
@@ -0,0 +1,376 @@
+"""
+Per-session progress event log with replay.
+
+Every progress event published for a session gets the next sequence number
+and is kept in a bounded ring buffer, so a client that connects late or
+reconnects can ask for everything after the last seq it saw. With a spill
+directory configured, events are also appended to <session_id>.jsonl there,
+which lets replays reach past the ring buffer and survive the log being
+evicted from memory. Only the worker that numbers an event spills it;
+events relayed from other workers (see progress_relay.py) are kept in
+memory only.
+
+Live delivery goes through subscriptions: each subscriber (a WebSocket, an
+SSE stream) has its own bounded queue that publishing never waits on. When
+a queue is full, queued progress ticks are merged away to make room;
+only if it is full of events that must not be dropped is the subscriber
+cut off, and it can then resume from its last seq.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+# Events a subscriber must receive; anything else is a progress tick that a
+# later tick supersedes. "gap" is not logged: it tells live subscribers that
+# relayed events went missing (see SessionEventLog.ingest).
+DURABLE_STAGES = ("structure", "module_complete", "module_enhanced", "complete", "error", "gap")
+
+def is_progress_tick(event: Dict[str, Any]) -> bool:
+    return event.get("stage") not in DURABLE_STAGES
+
+def is_final_event(event: Dict[str, Any]) -> bool:
+    """The last event of a session: completion, or an error marked final
+    (per-module errors are not, generation carries on after them)"""
+    return event.get("stage") == "complete" or bool(event.get("final"))
+
+class EventSubscription:
+    """One subscriber's bounded outbound queue, drained by its sender task"""
+
+    def __init__(self, session_id: str, max_queue: int = 64, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.session_id = session_id
+        self.max_queue = max_queue
+        self.queue: deque = deque()
+        self.delivered = 0
+        self.coalesced = 0
+        self.closed = False
+        self.overflowed = False
+        self._lock = threading.Lock()
+        self._loop = loop or asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+
+    def _wake(self):
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._ready.set()
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._ready.set)
+
+    def put(self, event: Dict[str, Any]):
+        """Queue an event without blocking"""
+        with self._lock:
+            if self.closed:
+                return
+            if len(self.queue) < self.max_queue:
+                self.queue.append(event)
+            elif not self._coalesce(event):
+                self.overflowed = True
+                self.closed = True
+        self._wake()
+
+    def _coalesce(self, event: Dict[str, Any]) -> bool:
+        """Make room in a full queue by dropping the oldest queued tick"""
+        for index, queued in enumerate(self.queue):
+            if is_progress_tick(queued):
+                del self.queue[index]
+                self.queue.append(event)
+                self.coalesced += 1
+                return True
+        if is_progress_tick(event):
+            # Nothing to merge with; the next tick carries newer progress anyway
+            self.coalesced += 1
+            return True
+        return False
+
+    def replace(self, events: List[Dict[str, Any]]):
+        """Swap the queued events for a replay (not bounded by max_queue)"""
+        with self._lock:
+            self.queue.clear()
+            self.queue.extend(events)
+        self._wake()
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """Next event, or None once the subscription is closed and drained"""
+        while True:
+            with self._lock:
+                if self.queue:
+                    self.delivered += 1
+                    return self.queue.popleft()
+                if self.closed:
+                    return None
+                self._ready.clear()
+            await self._ready.wait()
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+        self._wake()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queued": len(self.queue),
+                "max_queue": self.max_queue,
+                "delivered": self.delivered,
+                "coalesced": self.coalesced,
+                "overflowed": self.overflowed
+            }
+
+class SessionEventLog:
+    """Sequence-numbered events of one session: ring buffer plus optional spill file"""
+
+    def __init__(self, session_id: str, capacity: int = 256, spill_path: Optional[Path] = None):
+        self.session_id = session_id
+        self.events: deque = deque(maxlen=capacity)
+        self.spill_path = spill_path
+        self.last_seq = 0
+        self.closed = False
+        self.updated_at = time.time()
+        self.subscribers: List[EventSubscription] = []
+        self.gaps = 0
+        self._lock = threading.Lock()
+        if spill_path is not None and spill_path.exists():
+            self._load_spill()
+
+    def _load_spill(self):
+        """Refill the ring buffer (and the seq counter) from the spill file"""
+        for event in self._read_spill(0):
+            self.events.append(event)
+            self.last_seq = event["seq"]
+            self.closed = is_final_event(event)
+
+    def _read_spill(self, after_seq: int) -> List[Dict[str, Any]]:
+        events = []
+        try:
+            with open(self.spill_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash
+                        continue
+                    if event.get("seq", 0) > after_seq:
+                        events.append(event)
+        except FileNotFoundError:
+            pass
+        return events
+
+    def _store(self, event: Dict[str, Any], spill: bool = True):
+        """Buffer, spill and fan out an event (caller holds the lock)"""
+        self.last_seq = event["seq"]
+        self.events.append(event)
+        self.updated_at = time.time()
+        if is_final_event(event):
+            self.closed = True
+        if spill and self.spill_path is not None:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(event) + "\n")
+        for subscription in self.subscribers:
+            subscription.put(event)
+
+    def append(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Stamp the event with the next seq and store it"""
+        with self._lock:
+            event = dict(event, seq=self.last_seq + 1)
+            self._store(event)
+            return event
+
+    def ingest(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Store an event numbered by another worker
+
+        The numbering worker has already spilled it, so it is not spilled
+        again here. If events before it are missing (a lost datagram), they
+        are first backfilled from the spill file when there is one; a gap
+        that remains is announced to live subscribers with a "gap" event.
+        An event relayed without its data ("truncated") is read back from
+        the spill file too. Returns the events stored, backfilled ones
+        first (none if the event was already seen).
+        """
+        with self._lock:
+            seq = event.get("seq", 0)
+            if seq <= self.last_seq:
+                return []
+            stored = []
+            if seq > self.last_seq + 1 or event.get("truncated"):
+                stored.extend(self._backfill(seq, include=bool(event.get("truncated"))))
+            if seq > self.last_seq:
+                self._store(event, spill=False)
+                stored.append(event)
+            return stored
+
+    def _backfill(self, seq: int, include: bool = False) -> List[Dict[str, Any]]:
+        """Fill in events before seq (and seq itself if include) from the spill file,
+        announcing a gap that remains (caller holds the lock)"""
+        stored = []
+        if self.spill_path is not None:
+            for missed in self._read_spill(self.last_seq):
+                if missed["seq"] > seq or (missed["seq"] == seq and not include):
+                    break
+                if missed["seq"] == self.last_seq + 1:
+                    self._store(missed, spill=False)
+                    stored.append(missed)
+        if seq > self.last_seq + 1:
+            self.gaps += 1
+            notice = {
+                "session_id": self.session_id,
+                "stage": "gap",
+                # The last seq delivered before the gap, so resuming from it is safe
+                "seq": self.last_seq,
+                "missing": [self.last_seq + 1, seq - 1],
+                "message": f"Events {self.last_seq + 1}-{seq - 1} were lost; reload the session state"
+            }
+            for subscription in self.subscribers:
+                subscription.put(notice)
+        return stored
+
+    def _since(self, after_seq: int) -> List[Dict[str, Any]]:
+        oldest = self.events[0]["seq"] if self.events else self.last_seq + 1
+        if after_seq + 1 >= oldest or self.spill_path is None:
+            return [event for event in self.events if event["seq"] > after_seq]
+        # Part of the range has left the ring buffer; the spill file has all of it
+        return self._read_spill(after_seq)
+
+    def since(self, after_seq: int = 0) -> List[Dict[str, Any]]:
+        """Events with seq > after_seq, oldest first"""
+        with self._lock:
+            return self._since(after_seq)
+
+    def subscribe(self, subscription: EventSubscription, after_seq: int = 0):
+        """Queue the backlog after after_seq, then live events, with no gap between them"""
+        with self._lock:
+            subscription.replace(self._since(after_seq))
+            self.subscribers.append(subscription)
+
+    def rewind(self, subscription: EventSubscription, after_seq: int):
+        """Restart a subscription's stream from after_seq"""
+        with self._lock:
+            subscription.replace(self._since(after_seq))
+
+    def unsubscribe(self, subscription: EventSubscription):
+        with self._lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "last_seq": self.last_seq,
+                "buffered": len(self.events),
+                "oldest_seq": self.events[0]["seq"] if self.events else None,
+                "closed": self.closed,
+                "subscribers": len(self.subscribers),
+                "gaps": self.gaps
+            }
+
+class ProgressEventBus:
+    """Event logs for recent sessions, least recently updated evicted first"""
+
+    def __init__(self, capacity: int = 256, max_sessions: int = 200, spill_dir: Optional[str] = None):
+        self.capacity = capacity
+        self.max_sessions = max_sessions
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._logs: "OrderedDict[str, SessionEventLog]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _spill_path(self, session_id: str) -> Optional[Path]:
+        if self.spill_dir is None:
+            return None
+        return self.spill_dir / f"{session_id}.jsonl"
+
+    def get_log(self, session_id: str, create: bool = True) -> Optional[SessionEventLog]:
+        """The session's log; evicted logs are reloaded from their spill file"""
+        with self._lock:
+            log = self._logs.get(session_id)
+            if log is not None:
+                self._logs.move_to_end(session_id)
+                return log
+            spill_path = self._spill_path(session_id)
+            if not create and (spill_path is None or not spill_path.exists()):
+                return None
+            log = SessionEventLog(session_id, self.capacity, spill_path)
+            self._logs[session_id] = log
+            if len(self._logs) > self.max_sessions:
+                # Sessions someone is still listening to are kept
+                idle = [sid for sid, other in self._logs.items() if not other.subscribers and sid != session_id]
+                for sid in idle[:len(self._logs) - self.max_sessions]:
+                    del self._logs[sid]
+            return log
+
+    def publish(self, session_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Append an event to the session's log and return it with its seq"""
+        return self.get_log(session_id).append(event)
+
+    def ingest(self, session_id: str, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Add an event relayed from another worker, keeping its seq; returns the events stored"""
+        return self.get_log(session_id).ingest(event)
+
+    def replay(self, session_id: str, after_seq: int = 0) -> List[Dict[str, Any]]:
+        """Events a client that last saw after_seq has missed"""
+        log = self.get_log(session_id, create=False)
+        return log.since(after_seq) if log else []
+
+    def subscribe(self, session_id: str, after_seq: int = 0, max_queue: int = 64,
+                  loop: Optional[asyncio.AbstractEventLoop] = None) -> EventSubscription:
+        """New subscription fed with the backlog after after_seq, then live events
+
+        Called on the event loop that will consume it, or from a worker
+        thread (the backlog may be read from the spill file) with that loop
+        passed in.
+        """
+        subscription = EventSubscription(session_id, max_queue, loop)
+        self.get_log(session_id).subscribe(subscription, after_seq)
+        return subscription
+
+    def rewind(self, subscription: EventSubscription, after_seq: int):
+        self.get_log(subscription.session_id).rewind(subscription, after_seq)
+
+    def is_finished(self, session_id: str, after_seq: int = 0) -> bool:
+        """True if the session has ended and nothing after after_seq remains"""
+        log = self.get_log(session_id, create=False)
+        return log is not None and log.closed and log.last_seq <= after_seq
+
+    def unsubscribe(self, subscription: EventSubscription):
+        subscription.close()
+        log = self.get_log(subscription.session_id, create=False)
+        if log is not None:
+            log.unsubscribe(subscription)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            logs = list(self._logs.values())
+        return {
+            "sessions": len(logs),
+            "max_sessions": self.max_sessions,
+            "buffer_capacity": self.capacity,
+            "buffered_events": sum(len(log.events) for log in logs),
+            "subscribers": sum(len(log.subscribers) for log in logs),
+            "relay_gaps": sum(log.gaps for log in logs),
+            "spill_dir": str(self.spill_dir) if self.spill_dir else None
+        }
+
+# Global event bus instance
+_event_bus: Optional[ProgressEventBus] = None
+_event_bus_lock = threading.Lock()
+
+def get_event_bus() -> ProgressEventBus:
+    """Get the shared progress event bus (sized from PROGRESS_BUFFER_SIZE)"""
+    global _event_bus
+    if _event_bus is None:
+        with _event_bus_lock:
+            if _event_bus is None:
+                from config import get_config
+                config = get_config()
+                _event_bus = ProgressEventBus(
+                    config.progress_buffer_size,
+                    config.progress_max_sessions,
+                    config.progress_spill_dir or None
+                )
+    return _event_bus
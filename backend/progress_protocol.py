@@ -0,0 +1,117 @@
+"""
+Wire formats for progress events.
+
+Events are logged by reference: module_complete carries the module's
+filename, content hash, size, timing and versioned /raw URL, never its
+markdown. How an event goes over the wire is chosen per connection:
+
+- v1 (default): the original format; module_complete gets its content
+  filled back in from the catalog (or the blob store for older versions).
+- v2: references only, None fields and the session id dropped, and the
+  structure event reduced to module numbers, titles and filenames (the
+  full structure is in course.json). Content is fetched from raw_url.
+
+Either protocol can be sent as JSON text frames (default) or msgpack
+binary frames when the msgpack package is installed. Server-Sent Events and
+long-poll responses use the same protocols, always as JSON.
+"""
+import json
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+PROTOCOLS = ("v1", "v2")
+ENCODINGS = ("json", "msgpack")
+
+def load_module_content(topic_folder: str, filename: str, content_hash: Optional[str]) -> Optional[str]:
+    """Markdown of the module version a module_complete event refers to (blocking)"""
+    from course_catalog import get_course_catalog
+    from blob_store import get_blob_store
+
+    catalog = get_course_catalog()
+    entry = catalog.get(topic_folder, filename)
+    if entry and (content_hash is None or entry.content_hash == content_hash):
+        return catalog.read_content(entry)
+    if content_hash:
+        try:
+            return get_blob_store().read_version(content_hash).decode("utf-8")
+        except FileNotFoundError:
+            pass
+    return catalog.read_content(entry) if entry else None
+
+def needs_content(event: Dict[str, Any]) -> bool:
+    data = event.get("data") or {}
+    return event.get("stage") == "module_complete" and "filename" in data and "content" not in data
+
+def expand_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """v1 form: module_complete with its content (blocking)"""
+    if not needs_content(event):
+        return event
+    data = event["data"]
+    content = load_module_content(data.get("topic_folder"), data["filename"], data.get("content_hash"))
+    return dict(event, data=dict(data, content=content))
+
+def _compact_structure(course_structure: Dict[str, Any]) -> Dict[str, Any]:
+    modules = course_structure.get("modules", [])
+    return {
+        "total_modules": len(modules),
+        "modules": [
+            {"number": number, "title": module.get("title"), "filename": module.get("filename")}
+            for number, module in enumerate(modules, 1)
+        ]
+    }
+
+def compact_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """v2 form: references only, without None fields or the session id"""
+    compact = {key: value for key, value in event.items() if value is not None and key != "session_id"}
+    data = compact.get("data")
+    if isinstance(data, dict):
+        data = {key: value for key, value in data.items() if key != "content"}
+        if "course_structure" in data:
+            data["course_structure"] = _compact_structure(data["course_structure"])
+        compact["data"] = data
+    return compact
+
+def format_sse(event: Dict[str, Any], payload: str) -> str:
+    """One Server-Sent Events message; the seq is its id, for Last-Event-ID resume"""
+    lines = [f"id: {event['seq']}", f"event: {event.get('stage', 'message')}"]
+    lines.extend(f"data: {line}" for line in payload.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+@dataclass
+class ProgressProtocol:
+    """Format negotiated by one connection"""
+    version: str = "v1"
+    encoding: str = "json"
+
+    @classmethod
+    def negotiate(cls, protocol: Optional[str] = None, encoding: Optional[str] = None) -> "ProgressProtocol":
+        """Validate the requested format; raises ValueError if it can't be served"""
+        protocol = protocol or "v1"
+        encoding = encoding or "json"
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"Unknown protocol '{protocol}' (use one of: {', '.join(PROTOCOLS)})")
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding '{encoding}' (use one of: {', '.join(ENCODINGS)})")
+        if encoding == "msgpack" and msgpack is None:
+            raise ValueError("msgpack encoding is not available on this server")
+        return cls(protocol, encoding)
+
+    def needs_io(self, event: Dict[str, Any]) -> bool:
+        """True if rendering this event may read module content from disk"""
+        return self.version == "v1" and needs_content(event)
+
+    def prepare(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """The event as this protocol presents it (blocking for v1 module events)"""
+        return expand_event(event) if self.version == "v1" else compact_event(event)
+
+    def render(self, event: Dict[str, Any]) -> Union[str, bytes]:
+        """The frame payload for an event (blocking for v1 module events)"""
+        event = self.prepare(event)
+        if self.encoding == "msgpack":
+            return msgpack.packb(event, use_bin_type=True)
+        return json.dumps(event)
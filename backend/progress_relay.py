@@ -0,0 +1,204 @@
+"""
+Cross-worker relay for progress events.
+
+With several uvicorn workers, a session's WebSocket (or SSE stream) may be
+held by a different worker than the one generating the course. Each worker
+binds a Unix datagram socket in a shared directory; every event a worker
+publishes is sent as one datagram to the other sockets there, and events
+received from peers are added to the local event log with their original
+seq, so local subscribers see them like any other event. No broker is
+involved: the directory listing is the membership list, and sockets of
+workers that have exited are removed on the first failed send.
+
+Datagrams a peer can't take yet (its receive buffer is full) are queued
+per peer and retried in order, so a busy worker still gets every event,
+including the final one. An event too big for one datagram is sent
+without its data, keeping the peer's seq numbers and end-of-session
+detection intact; the peer fills it in from the shared spill file when
+there is one (see SessionEventLog.ingest).
+"""
+import asyncio
+import json
+import os
+import socket
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Any, List, Optional
+
+from progress_events import get_event_bus
+
+# Largest datagram sent; bigger events are relayed without their data
+MAX_DATAGRAM = 60 * 1024
+# Datagrams queued per peer while its receive buffer is full
+MAX_BACKLOG = 1024
+RETRY_INTERVAL = 0.05
+
+class ProgressRelay:
+    """Broadcasts this worker's progress events to peers and ingests theirs"""
+
+    def __init__(self, relay_dir: str):
+        self.relay_dir = Path(relay_dir)
+        self.pid = os.getpid()
+        self.path = self.relay_dir / f"{self.pid}.sock"
+        self.sock: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._peers: List[Path] = []
+        self._peers_mtime = None
+        self._lock = threading.Lock()
+        self._backlog: Dict[Path, Deque[bytes]] = {}
+        self._retry_scheduled = False
+        self._stats = {"sent": 0, "received": 0, "retried": 0, "dropped": 0, "oversized": 0, "stale_peers": 0}
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.relay_dir.mkdir(parents=True, exist_ok=True)
+        self.path.unlink(missing_ok=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(str(self.path))
+        self.sock.setblocking(False)
+        self._loop = loop
+        loop.add_reader(self.sock.fileno(), self._on_readable)
+        print(f"📡 Progress relay listening on {self.path}")
+
+    def stop(self):
+        if self.sock is None:
+            return
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+        self.sock = None
+        self.path.unlink(missing_ok=True)
+
+    def _peer_paths(self) -> List[Path]:
+        """Other workers' sockets, re-listed only when the directory changes"""
+        try:
+            mtime = self.relay_dir.stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if mtime != self._peers_mtime:
+            self._peers = [p for p in self.relay_dir.glob("*.sock") if p != self.path]
+            self._peers_mtime = mtime
+        return self._peers
+
+    def _encode(self, session_id: str, event: Dict[str, Any]) -> bytes:
+        message = json.dumps({"origin": self.pid, "session_id": session_id, "event": event}).encode("utf-8")
+        if len(message) > MAX_DATAGRAM:
+            self._stats["oversized"] += 1
+            stub = {key: value for key, value in event.items() if key != "data"}
+            stub["truncated"] = True
+            message = json.dumps({"origin": self.pid, "session_id": session_id, "event": stub}).encode("utf-8")
+        return message
+
+    def _send(self, peer: Path, message: bytes) -> Optional[bool]:
+        """True if sent, False if the peer is busy, None if it has exited (caller holds the lock)"""
+        try:
+            self.sock.sendto(message, str(peer))
+            self._stats["sent"] += 1
+            return True
+        except (ConnectionRefusedError, FileNotFoundError):
+            # That worker has exited
+            peer.unlink(missing_ok=True)
+            self._peers_mtime = None
+            self._backlog.pop(peer, None)
+            self._stats["stale_peers"] += 1
+            return None
+        except BlockingIOError:
+            return False
+
+    def _queue(self, peer: Path, message: bytes):
+        """Hold a datagram for a busy peer (caller holds the lock)"""
+        backlog = self._backlog.setdefault(peer, deque())
+        if len(backlog) >= MAX_BACKLOG:
+            # The peer sees a gap in seq and backfills or announces it
+            backlog.popleft()
+            self._stats["dropped"] += 1
+        backlog.append(message)
+        if not self._retry_scheduled and self._loop is not None and not self._loop.is_closed():
+            self._retry_scheduled = True
+            self._loop.call_soon_threadsafe(self._loop.call_later, RETRY_INTERVAL, self._retry)
+
+    def broadcast(self, session_id: str, event: Dict[str, Any]):
+        """Send an event to every other worker without waiting on any of them"""
+        if self.sock is None:
+            return
+        message = self._encode(session_id, event)
+        with self._lock:
+            for peer in list(self._peer_paths()):
+                # Behind queued datagrams, so each peer gets events in order
+                if self._backlog.get(peer) or self._send(peer, message) is False:
+                    self._queue(peer, message)
+
+    def _retry(self):
+        """Send queued datagrams to peers that have room again"""
+        with self._lock:
+            self._retry_scheduled = False
+            if self.sock is None:
+                return
+            for peer, backlog in list(self._backlog.items()):
+                while backlog:
+                    sent = self._send(peer, backlog[0])
+                    if not sent:
+                        break
+                    backlog.popleft()
+                    self._stats["retried"] += 1
+                if not backlog:
+                    self._backlog.pop(peer, None)
+            if self._backlog and not self._retry_scheduled:
+                self._retry_scheduled = True
+                self._loop.call_later(RETRY_INTERVAL, self._retry)
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self.sock.recv(MAX_DATAGRAM)
+            except (BlockingIOError, OSError):
+                return
+            try:
+                message = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+            if message.get("origin") == self.pid:
+                continue
+            self._stats["received"] += 1
+            self.ingest(message["session_id"], message["event"])
+
+    def ingest(self, session_id: str, event: Dict[str, Any]):
+        from session_store import get_session_store
+
+        for stored in get_event_bus().ingest(session_id, event):
+            get_session_store().record_event(session_id, stored, relayed=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["backlog"] = sum(len(backlog) for backlog in self._backlog.values())
+        stats.update({"socket": str(self.path), "peers": len(self._peer_paths())})
+        return stats
+
+# Global relay instance (None unless PROGRESS_RELAY is enabled)
+_progress_relay: Optional[ProgressRelay] = None
+
+def start_progress_relay(loop: asyncio.AbstractEventLoop) -> Optional[ProgressRelay]:
+    """Bind this worker's relay socket when PROGRESS_RELAY=true"""
+    global _progress_relay
+    from config import get_config
+
+    config = get_config()
+    if not config.progress_relay or _progress_relay is not None:
+        return _progress_relay
+    if not hasattr(socket, "AF_UNIX"):
+        print("⚠️ Progress relay needs Unix domain sockets; running without it")
+        return None
+    relay = ProgressRelay(config.progress_relay_dir)
+    relay.start(loop)
+    _progress_relay = relay
+    return relay
+
+def get_progress_relay() -> Optional[ProgressRelay]:
+    return _progress_relay
+
+def stop_progress_relay():
+    global _progress_relay
+    if _progress_relay is not None:
+        _progress_relay.stop()
+        _progress_relay = None
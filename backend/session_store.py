@@ -0,0 +1,314 @@
+"""
+Course creation sessions: bounded in memory, optionally persisted to SQLite.
+
+Each session is one record kept current from its progress events (stage,
+per-module status and timings, completed modules), so reading a session is
+a single lookup and copy. Records are ordered by last update; finished
+sessions idle longer than the TTL are dropped first, and beyond
+max_sessions the least recently updated finished sessions are dropped.
+Unfinished sessions are never evicted for size (only after twice the TTL
+without an update), so a running course keeps its record.
+
+With the sqlite backend every non-tick update is written through, so
+sessions survive restarts and are visible to other worker processes.
+Expired rows are deleted at startup and then every prune_interval seconds
+by a background thread (see start()).
+"""
+import copy
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+from progress_events import is_progress_tick
+
+FINISHED_STATUSES = ("completed", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions(updated_at);
+"""
+
+def _module_records(course_structure: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "number": number,
+            "filename": module.get("filename", f"module_{number:02d}.md"),
+            "title": module.get("title", f"Module {number}"),
+            "status": "pending"
+        }
+        for number, module in enumerate(course_structure.get("modules", []), 1)
+    ]
+
+class SessionStore:
+    """Thread-safe, size- and TTL-bounded session records"""
+
+    def __init__(self, ttl: float = 86400, max_sessions: int = 500, db_path: Optional[str] = None,
+                 prune_interval: float = 3600):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.prune_interval = prune_interval
+        self._stop = threading.Event()
+        self._pruner: Optional[threading.Thread] = None
+        self.pruned = 0
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.evicted = 0
+        self.conn = None
+        if db_path:
+            self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            with self._lock, self.conn:
+                self.conn.executescript(SCHEMA)
+            self.prune()
+
+    # Persistence
+
+    def _persist(self, record: Dict[str, Any]):
+        if self.conn is None:
+            return
+        with self.conn:
+            self.conn.execute(
+                """INSERT INTO sessions(session_id, status, data, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(session_id) DO UPDATE SET status=excluded.status, data=excluded.data,
+                   updated_at=excluded.updated_at""",
+                (record["session_id"], record["status"], json.dumps(record), record["updated_at"])
+            )
+
+    def _load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        if self.conn is None:
+            return None
+        row = self.conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Eviction
+
+    def _expired(self, record: Dict[str, Any], now: float) -> bool:
+        idle = now - record["updated_at"]
+        # Unfinished sessions get longer, in case they are merely slow
+        return idle > (self.ttl if record["status"] in FINISHED_STATUSES else self.ttl * 2)
+
+    def _evict(self):
+        now = time.time()
+        expired = [sid for sid, record in self._sessions.items() if self._expired(record, now)]
+        excess = len(self._sessions) - len(expired) - self.max_sessions
+        if excess > 0:
+            # Oldest first; sessions still running are kept whatever the count
+            finished = (sid for sid, record in self._sessions.items()
+                        if record["status"] in FINISHED_STATUSES and not self._expired(record, now))
+            expired.extend(sid for _, sid in zip(range(excess), finished))
+        for session_id in expired:
+            del self._sessions[session_id]
+        self.evicted += len(expired)
+
+    def prune(self) -> int:
+        """Drop expired sessions from memory and from the database"""
+        with self._lock:
+            self._evict()
+            if self.conn is None:
+                return 0
+            with self.conn:
+                cursor = self.conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl * 2,))
+            self.pruned += cursor.rowcount
+            return cursor.rowcount
+
+    def start(self):
+        """Prune every prune_interval seconds in a background thread"""
+        if self._pruner is not None or self.prune_interval <= 0:
+            return
+        self._stop.clear()
+        self._pruner = threading.Thread(target=self._prune_loop, name="session-store-pruner", daemon=True)
+        self._pruner.start()
+
+    def stop(self):
+        self._stop.set()
+        self._pruner = None
+
+    def _prune_loop(self):
+        while not self._stop.wait(self.prune_interval):
+            try:
+                self.prune()
+            except Exception as e:
+                print(f"⚠️ Session store prune failed: {e}")
+
+    # Updates
+
+    @staticmethod
+    def _new_record(session_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        record = {
+            "session_id": session_id,
+            "status": "starting",
+            "stage": None,
+            "progress": 0,
+            "message": "",
+            "current_module": None,
+            "total_modules": None,
+            "topic_folder": None,
+            "created_at": now,
+            "updated_at": now,
+            "completed_modules": [],
+            "modules": [],
+            "timings": {},
+            "last_seq": 0
+        }
+        record.update(fields)
+        return record
+
+    def create(self, session_id: str, **fields) -> Dict[str, Any]:
+        record = self._new_record(session_id, fields)
+        with self._lock:
+            self._sessions[session_id] = record
+            self._evict()
+            self._persist(record)
+            return copy.deepcopy(record)
+
+    def _get_record(self, session_id: str) -> Optional[Dict[str, Any]]:
+        record = self._sessions.get(session_id)
+        if record is None:
+            record = self._load(session_id)
+            # Another worker may still be updating an unfinished session, so
+            # only finished ones are cached here
+            if record is not None and record["status"] in FINISHED_STATUSES:
+                self._sessions[session_id] = record
+                self._sessions.move_to_end(session_id, last=False)
+        return record
+
+    def _writable_record(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The in-memory record to update, reloaded from the database if it was evicted"""
+        record = self._sessions.get(session_id)
+        if record is None:
+            record = self._load(session_id)
+            if record is not None:
+                self._sessions[session_id] = record
+        return record
+
+    def update(self, session_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """Set top-level fields of a session (e.g. status)"""
+        with self._lock:
+            record = self._writable_record(session_id)
+            if record is None:
+                return None
+            record.update(fields)
+            record["updated_at"] = time.time()
+            self._sessions.move_to_end(session_id)
+            self._persist(record)
+            return record
+
+    def record_event(self, session_id: str, event: Dict[str, Any], relayed: bool = False):
+        """Fold a progress event into the session's snapshot
+
+        relayed events come from the worker running the session (see
+        progress_relay.py): they build an in-memory record here if needed
+        and are never written to the database, which that worker owns.
+        """
+        with self._lock:
+            record = self._sessions.get(session_id) if relayed else self._writable_record(session_id)
+            if record is None:
+                if not relayed:
+                    return
+                record = self._sessions[session_id] = self._new_record(session_id, {"relayed": True})
+                self._evict()
+            now = event.get("timestamp") or time.time()
+            stage = event.get("stage")
+            data = event.get("data") or {}
+            number = event.get("current_module")
+            record.update({
+                "stage": stage,
+                "progress": event.get("progress", record["progress"]),
+                "message": event.get("message", ""),
+                "current_module": number,
+                "total_modules": event.get("total_modules") or record["total_modules"],
+                "last_seq": event.get("seq", record["last_seq"]),
+                "updated_at": time.time()
+            })
+            status = record["status"]
+            if status == "starting":
+                record["status"] = "running"
+            record["timings"].setdefault(stage, round(now - record["created_at"], 3))
+
+            modules = record["modules"]
+            module = modules[number - 1] if number and 0 < number <= len(modules) else None
+            if stage == "structure" and "course_structure" in data:
+                record["modules"] = _module_records(data["course_structure"])
+                record["total_modules"] = len(record["modules"])
+            elif stage == "processing" and module is not None:
+                module.update({"status": "generating", "started_at": now})
+            elif stage == "module_complete":
+                record["topic_folder"] = data.get("topic_folder", record["topic_folder"])
+                if module is not None:
+                    module.update({
+                        "status": "completed",
+                        "completed_at": now,
+                        "duration_seconds": round(now - module.get("started_at", now), 3)
+                    })
+                    module.update({key: data[key] for key in ("content_hash", "size", "raw_url") if key in data})
+                filename = data.get("filename")
+                if filename and filename not in record["completed_modules"]:
+                    record["completed_modules"].append(filename)
+            elif stage == "error":
+                if event.get("final"):
+                    record["status"] = "failed"
+                elif module is not None:
+                    module.update({"status": "failed", "error": event.get("message", ""), "completed_at": now})
+            elif stage == "complete":
+                record["status"] = "completed"
+                record["topic_folder"] = data.get("topic_folder", record["topic_folder"])
+                record["timings"]["total_seconds"] = round(now - record["created_at"], 3)
+
+            self._sessions.move_to_end(session_id)
+            # Ticks stay in memory; everything else is written through
+            if not relayed and (not is_progress_tick(event) or record["status"] != status):
+                self._persist(record)
+
+    # Reads
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """A copy of the session's current snapshot, or None"""
+        with self._lock:
+            record = self._get_record(session_id)
+            return copy.deepcopy(record) if record is not None else None
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return self._get_record(session_id) is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            statuses: Dict[str, int] = {}
+            for record in self._sessions.values():
+                statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+            return {
+                "backend": "sqlite" if self.conn is not None else "memory",
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl,
+                "evicted": self.evicted,
+                "pruned": self.pruned,
+                "by_status": statuses
+            }
+
+# Global session store instance
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    """Get the shared session store (SESSION_STORE_BACKEND=memory or sqlite)"""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                from config import get_config
+                config = get_config()
+                db_path = config.session_db_path if config.session_store_backend == "sqlite" else None
+                _session_store = SessionStore(config.session_ttl, config.session_max, db_path,
+                                              config.session_prune_interval)
+    return _session_store
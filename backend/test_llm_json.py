@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test JSON extraction from model replies
+"""
+import os
+from pathlib import Path
+
+def test_keyword_spec():
+    """Keyword replies need at least one non-empty keyword list"""
+    
+    # Change to backend directory
+    script_dir = Path(__file__).parent
+    os.chdir(script_dir)
+    
+    from llm_json import JSONExtractionError, KeywordSpec, extract_json
+    
+    print("🧪 Testing KeywordSpec validation")
+    print("=" * 50)
+    
+    rejected = [
+        '{"foo": 1}',
+        '{"image_keywords": []}',
+        '{"video_keywords": []}',
+        '{"image_keywords": [], "video_keywords": []}',
+    ]
+    accepted = [
+        '{"image_keywords": ["python loops"]}',
+        '{"video_keywords": ["python loops tutorial"]}',
+        'Here you go:\n```json\n{"image_keywords": ["a"], "video_keywords": ["b"],}\n```',
+    ]
+    
+    passed = True
+    for text in rejected:
+        try:
+            extract_json(text, KeywordSpec)
+            print(f"❌ Accepted: {text}")
+            passed = False
+        except JSONExtractionError as e:
+            print(f"✅ Rejected: {text} ({e})")
+    for text in accepted:
+        try:
+            print(f"✅ Accepted: {extract_json(text, KeywordSpec)}")
+        except JSONExtractionError as e:
+            print(f"❌ Rejected: {text} ({e})")
+            passed = False
+    
+    assert passed, "KeywordSpec validation is wrong"
+
+def test_unterminated_string():
+    """A lone quote after a stray "{" in prose doesn't hide the JSON after it"""
+    
+    # Change to backend directory
+    script_dir = Path(__file__).parent
+    os.chdir(script_dir)
+    
+    from llm_json import extract_course_structure
+    
+    print("🧪 Testing recovery from an unterminated string")
+    print("=" * 50)
+    
+    texts = [
+        'prose { with "quote. {"modules":[{"title":"Intro"}]}',
+        'a { b "c { d "e {"modules":[{"title":"Intro"}]} f',
+        'prose { with "quote.\n```json\n{"modules":[{"title":"Intro"}]}\n```',
+    ]
+    for text in texts:
+        structure = extract_course_structure(text)
+        print(f"✅ Extracted: {structure}")
+        assert structure["modules"][0]["title"] == "Intro"
+
+if __name__ == "__main__":
+    test_keyword_spec()
+    test_unterminated_string()